@@ -0,0 +1,108 @@
+"""Adaptive probe rate: sparse while a link is healthy, dense bursts while it degrades"""
+import time
+
+from probe_engine import STATUS_LATE, STATUS_DUPLICATE
+
+SPIKE_DEVIATIONS = 4    # An rtt above srtt + 4 * rttvar is a spike, the same bound TCP uses for its RTO
+SPIKE_MIN_MS = 5.0      # ...and it must also be at least this far above the smoothed rtt
+RTT_GAIN = 0.125        # Smoothing gains from RFC 6298
+RTTVAR_GAIN = 0.25
+BURST_HOLD = 10.0       # Seconds to stay at the burst rate after the last anomaly
+DECAY_FACTOR = 2.0      # Interval growth per healthy result while returning to the sparse rate
+BUDGET_WINDOW = 60.0    # Seconds of unused budget a target can save up for a burst
+
+
+class _RateState:
+    """Smoothed rtt, burst state and probe budget of one adaptive target"""
+    def __init__(self, target, now):
+        self.target = target
+        self.interval = target.interval
+        self.srtt = None
+        self.rttvar = 0.0
+        self.last_anomaly = None
+        self.tokens = target.budget * BUDGET_WINDOW
+        self.refilled_at = now
+        self.bursts = 0
+
+
+class AdaptiveRateController:
+    """Moves adaptive targets between their sparse interval and burst_interval.
+
+    A timeout, error or latency spike switches the target to its burst rate
+    at once so the event is well resolved. After BURST_HOLD seconds without
+    another anomaly the interval doubles with every healthy result until it
+    is back at the sparse rate. Every probe spends one token from a bucket
+    refilled at target.budget probes/s, and a target whose bucket is empty
+    stays sparse, so the rate summed over all targets can never exceed the
+    sum of their budgets for long.
+    """
+    def __init__(self):
+        self.engine = None
+        self._states = {}
+
+    def attach(self, engine):
+        self.engine = engine
+        engine.subscribe(self.update)
+
+    def stats(self, target):
+        """Current interval, remaining budget and burst count for target, or None if not adaptive"""
+        state = self._states.get(target)
+        if state is None:
+            return None
+        return {
+            "interval": state.interval,
+            "srtt": state.srtt,
+            "tokens": state.tokens,
+            "bursts": state.bursts,
+            "bursting": state.interval < state.target.interval
+        }
+
+    def update(self, result):
+        """Engine subscriber: adjust the probe rate of adaptive targets after every result"""
+        target = result.target
+        if not target.adaptive or result.status in (STATUS_LATE, STATUS_DUPLICATE):
+            return
+        now = time.monotonic()
+        state = self._states.get(target)
+        if state is None:
+            state = self._states[target] = _RateState(target, now)
+
+        capacity = target.budget * BUDGET_WINDOW
+        state.tokens = min(capacity, state.tokens + (now - state.refilled_at) * target.budget) - 1
+        state.refilled_at = now
+
+        anomaly = not result.ok or self._is_spike(state, result.rtt)
+        if result.ok:
+            self._update_rtt(state, result.rtt)
+        if anomaly:
+            state.last_anomaly = now
+
+        interval = self._next_interval(state, anomaly, now)
+        if interval != state.interval:
+            if interval < state.interval and state.interval == target.interval:
+                state.bursts += 1
+            state.interval = interval
+            self.engine.set_interval(target, interval)
+
+    def _is_spike(self, state, rtt):
+        if state.srtt is None:
+            return False
+        return rtt > state.srtt + max(SPIKE_DEVIATIONS * state.rttvar, SPIKE_MIN_MS)
+
+    def _update_rtt(self, state, rtt):
+        if state.srtt is None:
+            state.srtt = rtt
+            state.rttvar = rtt / 2
+        else:
+            state.rttvar += RTTVAR_GAIN * (abs(state.srtt - rtt) - state.rttvar)
+            state.srtt += RTT_GAIN * (rtt - state.srtt)
+
+    def _next_interval(self, state, anomaly, now):
+        target = state.target
+        if state.tokens <= 0:
+            return target.interval  # Budget spent, back to the sparse rate until it refills
+        if anomaly:
+            return target.burst_interval
+        if now - (state.last_anomaly or 0.0) < BURST_HOLD:
+            return state.interval
+        return min(target.interval, state.interval * DECAY_FACTOR)
@@ -0,0 +1,263 @@
+"""Recurrence rules for alarms: weekday masks, repeat intervals, one-shot dates and cron expressions.
+
+Every rule answers one question: the first time it fires strictly after a
+given moment. The answer is worked out from the calendar fields (skipping
+whole months, days and hours that cannot match) rather than by stepping
+minute by minute. That keeps the alarm scheduler's heap cheap to maintain
+with thousands of rules.
+
+Rules are evaluated on the wall clock of a timezone. A time skipped by a
+DST change (02:30 when clocks jump from 02:00 to 03:00) rings as many
+minutes after the jump as it was past the skipped hour, i.e. at 03:30. A
+time that occurs twice when clocks go back rings only the first time.
+"""
+import bisect
+import functools
+from datetime import date, datetime, timedelta
+
+try:
+    import zoneinfo
+except ImportError:  # Python 3.8
+    zoneinfo = None
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")  # Index is datetime.weekday()
+CRON_MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+CRON_WEEKDAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")  # Cron counts from Sunday = 0 (7 also works)
+MAX_SEARCH_DAYS = 5 * 366  # A cron rule with no match this far ahead (e.g. 30 February) never fires
+MAX_REPEATED_STEPS = 1500  # Wall times tried to get past an hour that occurs twice, one per minute of a day
+
+
+@functools.lru_cache(maxsize=64)
+def get_timezone(name):
+    """tzinfo for an IANA name such as "Asia/Baku"; None means the system's local time.
+
+    zoneinfo is used where it has the zone, pytz otherwise. Empty names and
+    "local" give None, as does any name when neither is available. Lookups
+    are cached, so callers can ask every time they need one.
+    """
+    if not name or name == "local":
+        return None
+    if zoneinfo is not None:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass  # Windows without the tzdata package, or an unknown name
+    if pytz is not None:
+        try:
+            return pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            pass
+    elif zoneinfo is None:
+        print(f"Warning: 'pytz' library not found. Using local time instead of {name}.")
+        return None
+    raise ValueError(f"Unknown timezone {name!r}.")
+
+
+def wall_time(timestamp, tz=None):
+    """Naive wall clock datetime in tz (None: local time) at a unix time"""
+    if tz is None:
+        return datetime.fromtimestamp(timestamp)
+    return datetime.fromtimestamp(timestamp, tz).replace(tzinfo=None)
+
+
+def wall_timestamp(wall, tz=None):
+    """Unix time of a naive wall clock datetime in tz, moving skipped times forward and taking repeated ones once"""
+    if pytz is None or not isinstance(tz, pytz.BaseTzInfo):
+        # Local time and zoneinfo resolve gaps and repeats this way with fold=0
+        return (wall if tz is None else wall.replace(tzinfo=tz)).timestamp()
+    try:
+        return tz.localize(wall, is_dst=None).timestamp()
+    except pytz.NonExistentTimeError:
+        return tz.localize(wall, is_dst=False).timestamp()  # Offset from before the jump: 02:30 becomes 03:30
+    except pytz.AmbiguousTimeError:
+        return tz.localize(wall, is_dst=True).timestamp()  # The first of the two
+
+
+def next_rule_time(next_wall, after, tz=None):
+    """Unix time of the first wall time from next_wall(wall) that falls strictly after `after`.
+
+    next_wall gives the rule's first wall time strictly after a wall time,
+    or None. Inside an hour that occurs twice, earlier candidates map to the
+    first pass and are skipped until one lies after `after`.
+    """
+    wall = wall_time(after, tz)
+    for _ in range(MAX_REPEATED_STEPS):
+        wall = next_wall(wall)
+        if wall is None:
+            return None
+        timestamp = wall_timestamp(wall, tz)
+        if timestamp > after:
+            return timestamp
+    return None
+
+
+def parse_days(days):
+    """Weekday numbers (Monday = 0) or names as a frozenset; None or all seven days mean every day"""
+    if days is None:
+        return None
+    parsed = set()
+    for day in days:
+        if isinstance(day, str):
+            if day.lower()[:3] not in WEEKDAYS:
+                raise ValueError(f"Invalid weekday {day!r} for alarm.")
+            day = WEEKDAYS.index(day.lower()[:3])
+        if not (isinstance(day, int) and 0 <= day <= 6):
+            raise ValueError(f"Invalid weekday {day!r} for alarm.")
+        parsed.add(day)
+    if not parsed:
+        raise ValueError("An alarm needs at least one weekday.")
+    return None if len(parsed) == 7 else frozenset(parsed)
+
+
+def format_days(days):
+    """Short text for a weekday set, e.g. "Mon-Fri" or "Sat,Sun"; empty for every day"""
+    if days is None:
+        return ""
+    days = sorted(days)
+    if len(days) > 2 and days == list(range(days[0], days[-1] + 1)):
+        return f"{WEEKDAYS[days[0]].title()}-{WEEKDAYS[days[-1]].title()}"
+    return ",".join(WEEKDAYS[day].title() for day in days)
+
+
+def parse_date(value):
+    """datetime.date from an ISO "YYYY-MM-DD" string (or a date), for one-shot alarms"""
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {value!r} for alarm, expected YYYY-MM-DD.")
+
+
+def next_daily_time(after, hour, minute, days=None, interval=None, on_date=None, tz=None):
+    """Unix time of the first ring strictly after `after` of an hour:minute alarm in tz.
+
+    days limits it to some weekdays, interval (minutes) repeats it from
+    hour:minute until the end of each day, and on_date makes it ring on that
+    date only. Returns None once a one-shot alarm has passed.
+    """
+    return next_rule_time(lambda wall: _next_daily_wall(wall, hour, minute, days, interval, on_date), after, tz)
+
+
+def _next_daily_wall(now, hour, minute, days, interval, on_date):
+    if on_date is not None:
+        return _first_ring(on_date, hour, minute, interval, now) if on_date >= now.date() else None
+    day = now.date()
+    for _ in range(8):  # Today plus every weekday once
+        if days is None or day.weekday() in days:
+            fire = _first_ring(day, hour, minute, interval, now)
+            if fire is not None:
+                return fire
+        day += timedelta(days=1)
+    return None
+
+
+def _first_ring(day, hour, minute, interval, now):
+    """First ring on day after now (or None), at hour:minute and every interval minutes after it"""
+    start = datetime(day.year, day.month, day.day, hour, minute)
+    if start > now:
+        return start
+    if not interval:
+        return None
+    step = timedelta(minutes=interval)
+    fire = start + step * ((now - start) // step + 1)
+    return fire if fire.date() == day else None
+
+
+def _cron_field(text, low, high, names=None):
+    """Set of values in [low, high] matched by one cron field: *, a, a-b, */n, a-b/n and commas"""
+    values = set()
+    for part in text.lower().split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            first, last = low, high
+        else:
+            first, _, last = part.partition("-")
+            first = _cron_value(first, low, high, names)
+            last = _cron_value(last, low, high, names) if last else (high if step else first)
+        try:
+            step = int(step) if step else 1
+        except ValueError:
+            step = 0
+        if step < 1 or first > last:
+            raise ValueError(f"Invalid cron field {text!r}.")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+def _cron_value(text, low, high, names):
+    if names and text in names:
+        return names.index(text) + (1 if names is CRON_MONTHS else 0)
+    try:
+        value = int(text)
+    except ValueError:
+        raise ValueError(f"Invalid cron value {text!r}.")
+    if not low <= value <= high:
+        raise ValueError(f"Cron value {value} is outside {low}-{high}.")
+    return value
+
+
+class CronRule:
+    """Standard five-field cron expression: minute hour day-of-month month day-of-week.
+
+    As in cron, when both the day of month and the day of week are
+    restricted, a day matching either one fires.
+    """
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} needs 5 fields.")
+        self.expression = " ".join(fields)
+        self.minutes = sorted(_cron_field(fields[0], 0, 59))
+        self.hours = sorted(_cron_field(fields[1], 0, 23))
+        self.month_days = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12, CRON_MONTHS)
+        self.weekdays = {(day - 1) % 7 for day in _cron_field(fields[4], 0, 7, CRON_WEEKDAYS)}  # To Monday = 0
+        self.any_month_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def matches_day(self, day):
+        if day.month not in self.months:
+            return False
+        if self.any_month_day or self.any_weekday:
+            return day.day in self.month_days and day.weekday() in self.weekdays
+        return day.day in self.month_days or day.weekday() in self.weekdays
+
+    def next_time(self, after, tz=None):
+        """Unix time of the first matching minute in tz strictly after `after`, or None"""
+        return next_rule_time(self.next_wall, after, tz)
+
+    def next_wall(self, now):
+        """First matching wall time strictly after the naive datetime now, or None"""
+        now = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = now.date()
+        end = day + timedelta(days=MAX_SEARCH_DAYS)
+        while day < end:
+            if day.month not in self.months:
+                day = date(day.year + day.month // 12, day.month % 12 + 1, 1)  # Skip to the next month
+                continue
+            if self.matches_day(day):
+                fire = self._first_minute(day, now)
+                if fire is not None:
+                    return fire
+            day += timedelta(days=1)
+        return None
+
+    def _first_minute(self, day, now):
+        earliest = (now.hour, now.minute) if day == now.date() else (0, 0)
+        for hour in self.hours[bisect.bisect_left(self.hours, earliest[0]):]:
+            first = bisect.bisect_left(self.minutes, earliest[1]) if hour == earliest[0] else 0
+            if first < len(self.minutes):
+                return datetime(day.year, day.month, day.day, hour, self.minutes[first])
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_cron(expression):
+    """CronRule for an expression; alarms sharing a rule share the parsed object"""
+    return CronRule(expression)
@@ -0,0 +1,294 @@
+"""Decode-once audio playback for alert and alarm sounds.
+
+Each sound file is decoded once, converted to the engine's single output
+format (16-bit stereo at OUTPUT_RATE) and kept in memory. One long-lived
+worker thread writes the PCM to a sink that stays open: ALSA through
+pyalsaaudio, else an aplay/pacat-style player process fed raw PCM on stdin,
+else winsound on Windows. Playing a sound therefore reads nothing from disk
+and starts no process.
+"""
+import io
+import shutil
+import subprocess
+import threading
+import time
+import wave
+
+import numpy as np
+
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+OUTPUT_RATE = 44100
+OUTPUT_CHANNELS = 2
+CHUNK_FRAMES = OUTPUT_RATE // 20  # 50 ms per write, so a stopped loop goes quiet quickly
+FRAME_BYTES = 2 * OUTPUT_CHANNELS
+PLAYER_EXIT_TIMEOUT = 2.0  # Seconds a player process gets to drain and exit on close before it is killed
+# Player processes that read raw S16_LE stereo PCM from stdin, tried in order
+PCM_PLAYERS = (
+    ("aplay", "-q", "-t", "raw", "-f", "S16_LE", "-c", str(OUTPUT_CHANNELS), "-r", str(OUTPUT_RATE), "-"),
+    ("pacat", "--playback", "--raw", "--format=s16le", f"--channels={OUTPUT_CHANNELS}", f"--rate={OUTPUT_RATE}"),
+)
+
+
+class Sound:
+    """A decoded sound: PCM in the output format, ready to write"""
+    __slots__ = ("path", "pcm", "_wav")
+
+    def __init__(self, path, pcm):
+        self.path = path
+        self.pcm = pcm
+        self._wav = None
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (FRAME_BYTES * OUTPUT_RATE)
+
+    @property
+    def wav(self):
+        """The PCM as an in-memory WAV file, for players that only take whole files"""
+        if self._wav is None:
+            data = io.BytesIO()
+            with wave.open(data, "wb") as f:
+                f.setnchannels(OUTPUT_CHANNELS)
+                f.setsampwidth(2)
+                f.setframerate(OUTPUT_RATE)
+                f.writeframes(self.pcm)
+            self._wav = data.getvalue()
+        return self._wav
+
+
+def decode_sound(path):
+    """Read a PCM WAV file and convert it to 16-bit stereo at OUTPUT_RATE.
+
+    Raises OSError, wave.Error or EOFError if the file cannot be read.
+    """
+    with wave.open(path, "rb") as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.int32) - 128) << 8
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.int32)
+    elif width == 3:
+        padded = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = (padded[:, 0].astype(np.int32) | padded[:, 1].astype(np.int32) << 8 |
+                   padded[:, 2].astype(np.int8).astype(np.int32) << 16) >> 8
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4") >> 16
+    else:
+        raise wave.Error(f"unsupported sample width {width}")
+    frames = samples[:len(samples) // channels * channels].reshape(-1, channels).astype(np.float64)
+    frames = np.repeat(frames, OUTPUT_CHANNELS, axis=1) if channels == 1 else frames[:, :OUTPUT_CHANNELS]
+    if rate != OUTPUT_RATE and len(frames):
+        # Linear interpolation is plenty for short alert sounds
+        positions = np.arange(int(len(frames) * OUTPUT_RATE / rate)) * (rate / OUTPUT_RATE)
+        frames = np.column_stack([np.interp(positions, np.arange(len(frames)), frames[:, channel])
+                                  for channel in range(OUTPUT_CHANNELS)])
+    pcm = np.clip(np.rint(frames), -32768, 32767).astype("<i2").tobytes()
+    return Sound(path, pcm)
+
+
+class AlsaSink:
+    """Writes to the default ALSA device, opened once through pyalsaaudio"""
+    def __init__(self, device="default"):
+        self._pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, device=device, channels=OUTPUT_CHANNELS,
+                                  rate=OUTPUT_RATE, format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=CHUNK_FRAMES)
+
+    def play(self, sound, stop):
+        for start in range(0, len(sound.pcm), CHUNK_FRAMES * FRAME_BYTES):
+            if stop.is_set():
+                return
+            self._pcm.write(sound.pcm[start:start + CHUNK_FRAMES * FRAME_BYTES])
+
+    def close(self):
+        self._pcm.close()
+
+
+class PipeSink:
+    """Feeds raw PCM to one long-running player process such as aplay, restarting it if it exits"""
+    def __init__(self, command):
+        self.command = command
+        self._process = None
+        self._start()
+
+    def _start(self):
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL)
+
+    def play(self, sound, stop):
+        for start in range(0, len(sound.pcm), CHUNK_FRAMES * FRAME_BYTES):
+            if stop.is_set():
+                return
+            try:
+                self._process.stdin.write(sound.pcm[start:start + CHUNK_FRAMES * FRAME_BYTES])
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                print(f"Audio player {self.command[0]} stopped ({e}). Restarting it.")
+                self._start()
+                return
+
+    def close(self):
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(PLAYER_EXIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+class WinsoundSink:
+    """Plays each sound from memory with winsound; a playing sound runs to its end"""
+    def play(self, sound, stop):
+        if not stop.is_set():
+            winsound.PlaySound(sound.wav, winsound.SND_MEMORY)
+
+    def close(self):
+        pass
+
+
+def create_sink():
+    """First output that works here: ALSA, a PCM player process, then winsound; None if there is none"""
+    if alsaaudio is not None:
+        try:
+            return AlsaSink()
+        except alsaaudio.ALSAAudioError as e:
+            print(f"ALSA output unavailable ({e}).")
+    for command in PCM_PLAYERS:
+        if shutil.which(command[0]):
+            try:
+                return PipeSink(command)
+            except OSError as e:
+                print(f"Audio player {command[0]} unavailable ({e}).")
+    if winsound is not None:
+        return WinsoundSink()
+    print("Warning: no audio output found (install pyalsaaudio or aplay). Sounds are disabled.")
+    return None
+
+
+class AudioEngine:
+    """Plays decoded sounds by name on one worker thread.
+
+    load() decodes a file ahead of time; play() only records a request, so
+    it never blocks the caller. Requests wait with at most one entry per
+    loaded sound, which is what bounds the queue: asking again for a sound
+    that is already waiting, or that started less than `spacing` seconds
+    ago, is coalesced into it, and sounds that are not loaded are refused.
+    The most urgent request (lowest priority number) plays first and cuts
+    short a less urgent sound that is playing. A looping sound repeats
+    until stop_loop() and is not cut short.
+    """
+    def __init__(self, sink=None):
+        self.sink = sink if sink is not None else create_sink()
+        self.coalesced = 0  # Requests merged into a waiting or recent one
+        self._sounds = {}   # Name -> Sound
+        self._pending = {}  # Name -> (priority, sequence, loop)
+        self._last_started = {}  # Name -> time.monotonic() when it last started playing
+        self._sequence = 0
+        self._playing_priority = None
+        self._condition = threading.Condition()
+        self._preempt = threading.Event()
+        self._stop_loop = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self._thread.start()
+
+    def load(self, name, path):
+        """Decode path as sound name, replacing any previous one; returns False if it cannot be read"""
+        try:
+            self._sounds[name] = decode_sound(path)
+            return True
+        except (OSError, wave.Error, EOFError) as e:
+            print(f"Error loading sound {path}: {e}")
+            self._sounds.pop(name, None)
+            return False
+
+    def loaded(self, name):
+        return name in self._sounds
+
+    def play(self, name, loop=False, priority=0, spacing=0.0):
+        """Request sound name; returns False if it is not loaded or the request was coalesced.
+
+        With loop set it repeats until stop_loop(). spacing is the least
+        time in seconds between two starts of this sound.
+        """
+        with self._condition:
+            if name not in self._sounds:
+                return False
+            if loop:
+                self._stop_loop.clear()
+            if name in self._pending:
+                self.coalesced += 1
+                return False
+            last = self._last_started.get(name)
+            if spacing and last is not None and time.monotonic() - last < spacing:
+                self.coalesced += 1
+                return False
+            self._sequence += 1
+            self._pending[name] = (priority, self._sequence, loop)
+            if self._playing_priority is not None and priority < self._playing_priority:
+                self._preempt.set()
+            self._condition.notify()
+            return True
+
+    def stop_loop(self):
+        """Stop a looping sound that is playing or waiting"""
+        self._stop_loop.set()
+
+    def close(self):
+        """Stop the worker and release the output"""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify()
+        self._stop_loop.set()
+        self._preempt.set()
+        self._thread.join()
+        if self.sink is not None:
+            self.sink.close()
+
+    def _next(self):
+        """Wait for and take the most urgent request: (name, priority, loop), or None once closed"""
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            name = min(self._pending, key=lambda pending: self._pending[pending][:2])
+            priority, _, loop = self._pending.pop(name)
+            self._last_started[name] = time.monotonic()
+            self._playing_priority = None if loop else priority
+            self._preempt.clear()
+            return name, priority, loop
+
+    def _run(self):
+        while True:
+            request = self._next()
+            if request is None:
+                return
+            name, priority, loop = request
+            sound = self._sounds.get(name)
+            if sound is None or self.sink is None:
+                continue
+            try:
+                if not loop:
+                    self.sink.play(sound, self._preempt)
+                    continue
+                while not self._stop_loop.is_set():
+                    self.sink.play(sound, self._stop_loop)
+            except Exception as e:
+                print(f"Error playing sound: {e}")
+            finally:
+                with self._condition:
+                    self._playing_priority = None
+
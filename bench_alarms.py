@@ -0,0 +1,158 @@
+"""Benchmark of alarm loading, scheduling and firing with many rule-based alarms.
+
+Usage: python bench_alarms.py [--alarms 5000] [--days 7] [--timezone Europe/Berlin] [--year-alarms 100]
+
+Alarms are a mix of daily, weekday, repeating, one-shot and cron rules, as
+they would be read from managed_alarms. Firing runs the scheduler through
+the given number of days by jumping from deadline to deadline, without
+sleeping, and reports the cost of each ring.
+
+The scheduler's own run() loop is then driven through a whole year on a
+SimulatedClock in a timezone with DST. Every daily alarm must ring exactly
+once per day, on time, at its wall clock time (an hour later on the day a
+skipped hour swallows it). The expected instants are worked out from the
+zone's UTC offsets rather than by the scheduler's own conversion, and
+alarms at 01:30, 02:30 and 03:30 are added so the clock changes are
+always exercised; any violation is listed and the exit code is 1.
+"""
+import argparse
+import calendar
+import collections
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from alarm_rules import get_timezone, wall_time, wall_timestamp
+from monitor_core import Alarm, AlarmMonitor, SimulatedClock
+
+CRON_RULES = ("*/15 9-17 * * mon-fri", "0 */2 * * *", "30 6 1,15 * *", "0 22 * * sat,sun", "5 4 * * 0")
+
+
+def generate_alarms(count, seed=1):
+    """managed_alarms entries, one in five of each kind"""
+    rng = random.Random(seed)
+    today = date.today()
+    alarms = []
+    for index in range(count):
+        data = {"hour": rng.randrange(24), "minute": rng.randrange(60), "enabled": True, "name": f"Alarm {index}"}
+        kind = index % 5
+        if kind == 1:
+            data["days"] = sorted(rng.sample(range(7), rng.randint(1, 6)))
+        elif kind == 2:
+            data["interval"] = rng.choice((15, 30, 45, 90, 120))
+        elif kind == 3:
+            data["date"] = (today + timedelta(days=rng.randrange(14))).isoformat()
+        elif kind == 4:
+            data["cron"] = rng.choice(CRON_RULES)
+        alarms.append(data)
+    return alarms
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the alarm scheduler.")
+    parser.add_argument("--alarms", type=int, default=5000, help="number of alarms")
+    parser.add_argument("--days", type=float, default=7, help="simulated days of firing")
+    parser.add_argument("--timezone", default="Europe/Berlin", help="timezone of the simulated year")
+    parser.add_argument("--year-alarms", type=int, default=100, help="alarms run through the simulated year")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    entries = generate_alarms(args.alarms)
+
+    began = time.perf_counter()
+    alarms = [Alarm.from_dict(data) for data in entries]
+    loaded = time.perf_counter() - began
+
+    rings = []
+    monitor = AlarmMonitor([], rings.append)
+    now = time.time()
+    began = time.perf_counter()
+    monitor.schedule(alarms, now)
+    scheduled = time.perf_counter() - began
+    print(f"{args.alarms} alarms: loaded in {loaded * 1000:.1f} ms, scheduled in {scheduled * 1000:.1f} ms")
+
+    # Jump straight to each deadline, as run() would wake for it
+    end = now + args.days * 86400
+    latencies = []
+    deadline = monitor.next_deadline
+    while deadline is not None and deadline < end:
+        began = time.perf_counter()
+        deadline = monitor.check(deadline)
+        latencies.append((time.perf_counter() - began) * 1e6)
+    alarms_rung = sum(len(due) for due in rings)
+    if latencies:
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        print(f"{args.days:g} simulated days: {len(latencies)} wakeups rang {alarms_rung} alarms in "
+              f"{sum(latencies) / 1e6:.2f} s; per wakeup median {statistics.median(latencies):.0f} us, "
+              f"p99 {p99:.0f} us, max {latencies[-1]:.0f} us")
+    # Daily alarms in the small hours, where DST changes usually happen, on top of the random ones
+    night = [Alarm(hour, 30, name=f"Night {hour:02d}:30") for hour in (1, 2, 3)]
+    return 1 if simulate_year(alarms[:args.year_alarms] + night, args.timezone) else 0
+
+
+def simulate_year(alarms, timezone):
+    """Run AlarmMonitor.run() through next year on a SimulatedClock; returns the number of errors found"""
+    tz = get_timezone(timezone)
+    year = date.today().year + 1
+    days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+    start = wall_timestamp(datetime(year, 1, 1), tz)
+    clock = SimulatedClock(start, wall_timestamp(datetime(year + 1, 1, 1), tz))
+    rings = []
+    monitor = AlarmMonitor(alarms, lambda due: rings.extend((clock.time(), alarm) for alarm in due), timezone, clock)
+    clock.on_end = monitor.stop
+
+    began = time.perf_counter()
+    monitor.run()
+    elapsed = time.perf_counter() - began
+    print(f"Simulated year {year} in {timezone}: {len(alarms)} alarms rang {len(rings)} times in {elapsed:.2f} s")
+
+    # Plain daily alarms are checked against instants worked out from UTC offsets, not from the scheduler's code
+    daily = [alarm for alarm in alarms if alarm.days is None and not (alarm.interval or alarm.on_date or alarm.cron)]
+    rung = collections.defaultdict(list)  # (alarm, wall date) -> ring times
+    for when, alarm in rings:
+        rung[id(alarm), wall_time(when, tz).date()].append(when)
+    errors = []
+    for alarm in daily:
+        for day in range(days):
+            wall = datetime(year, 1, 1, alarm.hour, alarm.minute) + timedelta(days=day)
+            expected = expected_instant(wall, tz)
+            times = rung[id(alarm), wall.date()]
+            if len(times) != 1 or abs(times[0] - expected) > 0.001:
+                errors.append(f"{alarm} on {wall.date()}: expected {wall_time(expected, tz)}, "
+                              f"rang at {[str(wall_time(when, tz)) for when in times]}")
+    for error in errors[:20]:
+        print(error)
+    changes = [day for day in range(days)
+               if utc_offset(start + day * 86400, tz) != utc_offset(start + (day + 1) * 86400, tz)]
+    print(f"{len(daily)} daily alarms checked over {days} days, {len(changes)} of them with a clock change: "
+          f"{len(errors)} errors")
+    return len(errors)
+
+
+def utc_offset(timestamp, tz):
+    """Seconds the wall clock in tz (None: local time) is ahead of UTC at a unix time"""
+    moment = datetime.fromtimestamp(timestamp, tz) if tz is not None else datetime.fromtimestamp(timestamp).astimezone()
+    return moment.utcoffset().total_seconds()
+
+
+def expected_instant(wall, tz):
+    """Unix time an alarm set for the naive wall time should ring, from the UTC offsets a day either side.
+
+    A wall time that shows up under both offsets rings at the first; one
+    that shows up under neither lies in a skipped hour and rings under the
+    offset from before the jump, i.e. as far past the jump as it was into
+    the gap.
+    """
+    as_utc = calendar.timegm(wall.timetuple())
+    offsets = [utc_offset(as_utc - 86400, tz), utc_offset(as_utc + 86400, tz)]
+    shown = [as_utc - offset for offset in offsets if wall_time(as_utc - offset, tz) == wall]
+    return min(shown) if shown else as_utc - offsets[0]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Benchmark of the SQLite history backend: insert throughput and range-query latency.
+
+Usage: python bench_history.py [--rows 10000000] [--targets 10] [--batch 1000] [--queries 50] [--dir DIR]
+
+Rows are synthetic 1 Hz results spread over the targets and inserted in
+batches the size SqliteWriter commits. Queries fetch one target's rows for
+a random one-hour range, as the graph and exports do.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlite_store import SqliteStore, connect, insert_probe_rows, DB_FILE
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite history backend.")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="probe rows to insert")
+    parser.add_argument("--targets", type=int, default=10, help="targets the rows are spread over")
+    parser.add_argument("--batch", type=int, default=1000, help="rows per committed batch")
+    parser.add_argument("--queries", type=int, default=50, help="range queries to time")
+    parser.add_argument("--range", type=float, default=3600, help="seconds covered by each range query")
+    parser.add_argument("--dir", help="directory for the database (default: a temporary one, removed afterwards)")
+    return parser.parse_args(argv)
+
+
+def generate_batch(first_row, count, targets, start):
+    """(target, ts, rtt, status, code) rows; every target is probed once per second"""
+    rows = []
+    for row in range(first_row, first_row + count):
+        lost = row % 97 == 0
+        rows.append((row % targets + 1, start + row // targets, None if lost else 10.0 + row % 13,
+                     1 if lost else 0, None))
+    return rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    directory = args.dir or tempfile.mkdtemp(prefix="gping-bench-")
+    os.makedirs(directory, exist_ok=True)
+    try:
+        conn = connect(os.path.join(directory, DB_FILE))
+        conn.executemany("INSERT OR IGNORE INTO targets (id, key, name, host, kind) VALUES (?, ?, ?, ?, 'icmp')",
+                         [(i, f"icmp:bench{i}", f"bench{i}", f"192.0.2.{i}") for i in range(1, args.targets + 1)])
+        start = time.time() - args.rows // args.targets
+
+        insert_time = 0.0
+        for first_row in range(0, args.rows, args.batch):
+            rows = generate_batch(first_row, min(args.batch, args.rows - first_row), args.targets, start)
+            began = time.perf_counter()
+            insert_probe_rows(conn, rows)
+            insert_time += time.perf_counter() - began
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        size = os.path.getsize(os.path.join(directory, DB_FILE))
+        print(f"Inserted {args.rows} rows in {insert_time:.1f} s: {args.rows / insert_time:,.0f} rows/s "
+              f"(batches of {args.batch}), database {size / 1e6:.0f} MB")
+
+        store = SqliteStore(directory)
+        span = args.rows // args.targets
+        latencies = []
+        returned = 0
+        rng = random.Random(1)
+        for _ in range(args.queries):
+            query_start = start + rng.uniform(0, max(0, span - args.range))
+            target = rng.randint(1, args.targets)
+            began = time.perf_counter()
+            returned += len(store.read(query_start, query_start + args.range, [target]))
+            latencies.append((time.perf_counter() - began) * 1000)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"{args.queries} range queries of {args.range:.0f} s ({returned / args.queries:.0f} rows each): "
+              f"median {statistics.median(latencies):.1f} ms, p95 {p95:.1f} ms, max {latencies[-1]:.1f} ms")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""DNS query latency backend: real UDP queries from one reusable socket per family"""
+import random
+import socket
+import struct
+import time
+
+from probe_engine import ProbeBackend, AddressResolver
+
+DNS_PORT = 53
+QTYPE_A = 1
+QCLASS_IN = 1
+FLAG_QR = 0x8000
+FLAG_RD = 0x0100
+HEADER = struct.Struct("!HHHHHH")  # id, flags, qdcount, ancount, nscount, arcount
+
+RCODE_NAMES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+ANSWERED_RCODES = (0, 3)  # The resolver did its job, even if the name does not exist
+DEFAULT_QUERY_NAMES = ["example.com"]
+
+
+def rcode_name(rcode):
+    return RCODE_NAMES.get(rcode, f"RCODE{rcode}")
+
+
+def split_host_port(server):
+    """Split "host:port" (or "[v6]:port") into (host, port), defaulting to port 53"""
+    if server.startswith("["):
+        host, _, port = server[1:].partition("]:")
+        return host.rstrip("]"), int(port or DNS_PORT)
+    if server.count(":") == 1:
+        host, port = server.split(":")
+        return host, int(port)
+    return server, DNS_PORT
+
+
+def encode_question(name, qtype=QTYPE_A):
+    """Encode the question section for name"""
+    labels = b""
+    for label in name.strip(".").split("."):
+        encoded = label.encode("idna")
+        if not 0 < len(encoded) < 64:
+            raise ValueError(f"Invalid DNS name: {name}")
+        labels += bytes([len(encoded)]) + encoded
+    return labels + b"\0" + struct.pack("!HH", qtype, QCLASS_IN)
+
+
+def build_query(query_id, question):
+    """Build a recursive query packet carrying an encoded question"""
+    return HEADER.pack(query_id, FLAG_RD, 1, 0, 0, 0) + question
+
+
+def parse_response(packet):
+    """Return (id, rcode, question bytes) for a DNS response, or None if it is not one"""
+    if len(packet) < HEADER.size:
+        return None
+    query_id, flags, qdcount, _, _, _ = HEADER.unpack_from(packet)
+    if not flags & FLAG_QR or qdcount != 1:
+        return None
+    end = HEADER.size
+    while end < len(packet) and packet[end] != 0:
+        end += packet[end] + 1
+    end += 5  # Root label, qtype, qclass
+    if end > len(packet):
+        return None
+    return query_id, flags & 0x000F, packet[HEADER.size:end]
+
+
+class DnsProbeBackend(ProbeBackend):
+    """Measures resolver latency with real queries for kind="dns" targets.
+
+    The target host is the DNS server; query names rotate through
+    target.queries. Replies are matched by query ID, server address and the
+    echoed question, so many queries can share one socket without a resolver
+    library in between. The rcode is reported as ProbeResult.code; SERVFAIL,
+    REFUSED and other non-answers count as failures with their latency kept.
+    """
+    kind = "dns"
+
+    def __init__(self):
+        super().__init__()
+        self._sockets = {}
+        self._resolver = None
+        self._in_flight = {}    # (family, query id) -> (target, seq, server address, question)
+        self._query_ids = {}    # (target, seq) -> (family, query id)
+        self._name_index = {}   # target -> next query name to use
+        self._questions = {}    # name -> encoded A question, built once
+        self._random = random.Random()
+
+    def attach(self, engine):
+        super().attach(engine)
+        self._resolver = AddressResolver(engine, self._lookup)
+
+    def _socket_for(self, family):
+        sock = self._sockets.get(family)
+        if sock is None:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            self._sockets[family] = sock
+            self.engine.register_fd(sock, lambda: self._read(sock, family))
+        return sock
+
+    @staticmethod
+    def _lookup(host, flags):
+        family, _, _, _, sockaddr = socket.getaddrinfo(*split_host_port(host), type=socket.SOCK_DGRAM, flags=flags)[0]
+        return family, sockaddr
+
+    def _question(self, target):
+        names = target.queries or DEFAULT_QUERY_NAMES
+        index = self._name_index.get(target, 0) % len(names)
+        self._name_index[target] = index + 1
+        question = self._questions.get(names[index])
+        if question is None:
+            question = self._questions[names[index]] = encode_question(names[index])
+        return question
+
+    def _allocate_id(self, family):
+        for _ in range(16):
+            query_id = self._random.getrandbits(16)
+            if (family, query_id) not in self._in_flight:
+                return query_id
+        raise OSError("No free DNS query IDs.")
+
+    def add_target(self, target):
+        self._resolver.resolve(target)
+
+    def ready(self, target):
+        return self._resolver.ready(target)
+
+    def remove_target(self, target):
+        self._resolver.forget(target)
+        self._name_index.pop(target, None)
+        for key, entry in list(self._in_flight.items()):
+            if entry[0] is target:
+                del self._in_flight[key]
+                del self._query_ids[(target, entry[1])]
+
+    def send(self, target, seq):
+        family, sockaddr = self._resolver.address(target)
+        sock = self._socket_for(family)
+        question = self._question(target)
+        query_id = self._allocate_id(family)
+        try:
+            sock.sendto(build_query(query_id, question), sockaddr)
+        except OSError:
+            self._resolver.resolve(target)  # Look it up again in the background, the route may have changed
+            raise
+        self._in_flight[(family, query_id)] = (target, seq, sockaddr[0], question)
+        self._query_ids[(target, seq)] = (family, query_id)
+
+    def cancel(self, target, seq):
+        key = self._query_ids.pop((target, seq), None)
+        if key is not None:
+            self._in_flight.pop(key, None)
+
+    def _read(self, sock, family):
+        while True:
+            try:
+                packet, source = sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # e.g. a port unreachable error queued for the socket
+            received_at = time.monotonic()
+            parsed = parse_response(packet)
+            if parsed is None:
+                continue
+            query_id, rcode, question = parsed
+            entry = self._in_flight.get((family, query_id))
+            if entry is None or entry[2] != source[0] or entry[3].lower() != question.lower():
+                continue
+            self.engine.reply(entry[0], entry[1], received_at=received_at, code=rcode,
+                              failed=rcode not in ANSWERED_RCODES)
+
+    def close(self):
+        self._resolver.close()
+        for sock in self._sockets.values():
+            self.engine.unregister_fd(sock)
+            sock.close()
+        self._sockets.clear()
@@ -0,0 +1,43 @@
+"""View clipping and peak-preserving downsampling of graph curves"""
+import numpy as np
+
+
+def visible_slice(times, start, end):
+    """Index range [first, last) of sorted times inside [start, end], plus one sample either side.
+
+    The extra samples let the curve run to the edges of the view instead of
+    stopping at the last visible point.
+    """
+    first = max(0, int(np.searchsorted(times, start, side="left")) - 1)
+    last = min(len(times), int(np.searchsorted(times, end, side="right")) + 1)
+    return first, last
+
+
+def peak_downsample(times, values, start, end, buckets):
+    """Reduce a curve over [start, end] to its minimum and maximum in each of `buckets` time slots.
+
+    times must be sorted. Each slot keeps its two extreme samples in time
+    order, so spikes and drops survive however many samples share a pixel.
+    NaN marks a gap: a slot holding nothing but NaN keeps one NaN so that
+    connect="finite" still breaks the line there. Curves that already have
+    no more than two points per slot are returned unchanged.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= 2 * buckets or end <= start:
+        return times, values
+    slots = np.clip(((times - start) * (buckets / (end - start))).astype(np.int64), -1, buckets)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(slots)) + 1))
+    positions = np.arange(len(values))
+    finite = ~np.isnan(values)
+    low = np.minimum.reduceat(np.where(finite, values, np.inf), starts)
+    high = np.maximum.reduceat(np.where(finite, values, -np.inf), starts)
+    group = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))
+    # First position in each slot holding its minimum / maximum
+    first_low = np.minimum.reduceat(np.where(finite & (values == low[group]), positions, len(values)), starts)
+    first_high = np.minimum.reduceat(np.where(finite & (values == high[group]), positions, len(values)), starts)
+    gap = np.isinf(low)
+    first_low[gap] = first_high[gap] = starts[gap]
+    keep = np.sort(np.concatenate((first_low, first_high)))
+    keep = keep[np.concatenate(([True], np.diff(keep) > 0))]
+    return times[keep], values[keep]
@@ -0,0 +1,196 @@
+"""Headless monitor: runs the ping, alerting and alarm engines without Qt.
+
+Usage: python headless.py [--config config.json] [--log FILE] [--format text|jsonl]
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from probe_engine import ProbeTarget, STATUS_LATE, STATUS_DUPLICATE
+from path_probe import PathMonitor, DEFAULT_MAX_HOPS
+from sample_store import DEFAULT_RETENTION_DAYS
+from sqlite_store import create_history_writer, BACKENDS
+from monitor_core import (
+    Alarm, AlarmMonitor, ConnectionTracker, SoundManager, create_probe_engine, load_config_file,
+    ERROR_SOUND_FILE, ALARM_SOUND_FILE, DEFAULT_SOUND_REPEAT_INTERVAL, DEFAULT_TIMEZONE
+)
+
+
+class ResultLogger:
+    """Writes one line per probe result and alert to a stream"""
+    def __init__(self, stream, fmt="text"):
+        self.stream = stream
+        self.fmt = fmt
+        self._lock = threading.Lock()  # Alarm lines come from the alarm thread
+
+    def write(self, event, timestamp, **fields):
+        if self.fmt == "jsonl":
+            line = json.dumps({"event": event, "ts": round(timestamp, 6), **fields})
+        else:
+            when = datetime.fromtimestamp(timestamp).isoformat(sep=" ", timespec="milliseconds")
+            line = f"{when} {event.upper():<6} " + " ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+        with self._lock:
+            self.stream.write(line + "\n")
+
+    def result(self, result):
+        rtt = round(result.rtt, 3) if result.rtt is not None else None
+        self.write("probe", result.timestamp, target=result.target.name, status=result.status, rtt_ms=rtt,
+                   code=result.code, source=result.source)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the DNS ping and alarm monitor without a GUI.")
+    parser.add_argument("--config", default="config.json", help="settings file shared with the desktop app")
+    parser.add_argument("--log", help="append results to this file instead of stdout")
+    parser.add_argument("--format", choices=("text", "jsonl"), default="text", help="output line format")
+    parser.add_argument("--quiet", action="store_true", help="only log alerts and alarms, not every probe")
+    parser.add_argument("--no-sound", action="store_true", help="do not play error or alarm sounds")
+    parser.add_argument("--no-alarms", action="store_true", help="do not run the alarm scheduler")
+    parser.add_argument("--history", help="record every probe result in this directory (default: history_dir "
+                                          "from the config)")
+    parser.add_argument("--no-history", action="store_true", help="do not record probe results on disk")
+    parser.add_argument("--history-backend", choices=BACKENDS,
+                        help="history storage format (default: history_backend from the config, else segments)")
+    parser.add_argument("--alarm-seconds", type=float, default=60,
+                        help="how long an alarm sound rings, since there is no stop button")
+    return parser.parse_args(argv)
+
+
+def build_targets(config):
+    """Primary DNS server target plus the extra ping_targets from config"""
+    interval = config.get("ping_interval", 1)
+    timeout = config.get("ping_timeout", 1)
+    adaptive = {"adaptive": config.get("ping_adaptive", False), "burst_interval": config.get("ping_burst_interval"),
+                "budget": config.get("ping_budget")}
+    targets = [ProbeTarget(config.get("dns_server", "8.8.8.8"), interval, timeout,
+                           pipeline=config.get("ping_pipeline", False), **adaptive)]
+    if config.get("dns_probe_names"):
+        targets.append(ProbeTarget(targets[0].host, interval, timeout, f"DNS {targets[0].host}", kind="dns",
+                                   pipeline=targets[0].pipeline, queries=config["dns_probe_names"], **adaptive))
+    for data in config.get("ping_targets", []):
+        try:
+            targets.append(ProbeTarget.from_dict(data, interval, timeout))
+        except (KeyError, ValueError) as e:
+            print(f"Skipping invalid ping target {data}: {e}", file=sys.stderr)
+    return targets
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = load_config_file(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Error loading config: {e}", file=sys.stderr)
+        return 1
+
+    if args.log:
+        stream = open(args.log, "a", buffering=1, encoding="utf-8")
+    else:
+        stream = sys.stdout
+        stream.reconfigure(line_buffering=True)
+    logger = ResultLogger(stream, args.format)
+
+    sound_manager = None
+    if not args.no_sound:
+        sound_manager = SoundManager()
+        sound_manager.error_sound = config.get("error_sound_file", ERROR_SOUND_FILE)
+        sound_manager.alarm_sound = config.get("alarm_sound_file", ALARM_SOUND_FILE)
+        sound_manager.repeat_interval = config.get("sound_repeat_interval", DEFAULT_SOUND_REPEAT_INTERVAL)
+
+    targets = build_targets(config)
+    tracker = ConnectionTracker(targets)
+    alerting = set()
+    path_monitor = None
+    if config.get("path_probe"):
+        path_monitor = PathMonitor(targets[0].host, targets[0].interval, targets[0].timeout,
+                                   config.get("path_max_hops", DEFAULT_MAX_HOPS), targets[0].pipeline)
+
+    def on_result(result):
+        if result.status in (STATUS_LATE, STATUS_DUPLICATE):
+            if not args.quiet:
+                logger.result(result)
+            return
+        if path_monitor and path_monitor.update(result):
+            if not args.quiet:
+                logger.result(result)
+            return  # Silent routers are normal, hops never raise alerts themselves
+        since_success, alert = tracker.update(result)
+        if not args.quiet:
+            logger.result(result)
+        target = result.target
+        if alert:
+            if target not in alerting:
+                alerting.add(target)
+                logger.write("alert", result.timestamp, target=target.name, down_for_s=round(since_success, 1))
+                if path_monitor and target is targets[0]:
+                    logger.write("path", result.timestamp, target=path_monitor.name, hops=path_monitor.summary())
+            if sound_manager:
+                sound_manager.play("error")
+        elif result.ok and target in alerting:
+            alerting.discard(target)
+            logger.write("ok", result.timestamp, target=target.name, rtt_ms=round(result.rtt, 3))
+
+    engine = create_probe_engine()
+    engine.subscribe(on_result)
+    for target in targets:
+        engine.add_target(target)
+    if path_monitor and not path_monitor.attach(engine):
+        path_monitor = None
+
+    history = None
+    history_dir = args.history or config.get("history_dir", "history")
+    if history_dir and not args.no_history:
+        history = create_history_writer(history_dir, args.history_backend or config.get("history_backend", "segments"),
+                                        config.get("history_retention_days", DEFAULT_RETENTION_DAYS))
+        engine.subscribe(history.add)
+        history.start()
+
+    alarm_monitor = None
+    if not args.no_alarms:
+        alarms = []
+        for data in config.get("managed_alarms", []):
+            try:
+                alarms.append(Alarm.from_dict(data))
+            except ValueError as e:
+                print(f"Skipping invalid alarm {data}: {e}", file=sys.stderr)
+
+        def on_ring(due):
+            logger.write("alarm", time.time(), name=", ".join(alarm.name for alarm in due) or None)
+            if sound_manager:
+                sound_manager.play("alarm")
+                threading.Timer(args.alarm_seconds, sound_manager.stop_alarm).start()
+
+        try:
+            alarm_monitor = AlarmMonitor(alarms, on_ring, timezone=config.get("timezone", DEFAULT_TIMEZONE))
+        except ValueError as e:
+            print(f"{e} Alarms follow local time.", file=sys.stderr)
+            alarm_monitor = AlarmMonitor(alarms, on_ring)
+        threading.Thread(target=alarm_monitor.run, name="alarms", daemon=True).start()
+
+    def request_stop(signum, frame):
+        engine.stop()
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    try:
+        engine.run()
+    finally:
+        if history:
+            history.close()
+        if alarm_monitor:
+            alarm_monitor.stop()
+        if sound_manager:
+            sound_manager.close()
+        if stream is not sys.stdout:
+            stream.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
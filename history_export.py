@@ -0,0 +1,159 @@
+"""Export recorded probe history as CSV, JSON Lines or Parquet.
+
+Usage: python history_export.py [--history DIR] [--format csv|jsonl|parquet] [--from TIME] [--to TIME]
+                                [--target NAME ...] [--output FILE]
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from sample_store import STATUSES, NO_CODE
+from sqlite_store import open_history
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ("timestamp", "time", "target", "host", "kind", "ttl", "status", "rtt_ms", "code")
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def resolve_targets(store, names):
+    """Target ids recorded under any of these names, hosts or keys; None (all targets) if names is empty"""
+    if not names:
+        return None
+    ids = set()
+    for name in names:
+        found = store.target_ids(name)
+        if not found:
+            raise ValueError(f"No recorded target named {name}.")
+        ids.update(found)
+    return sorted(ids)
+
+
+def record_columns(records, targets):
+    """Dict of COLUMNS for an array of store records; targets is the store's targets().
+
+    Lost probes have rtt_ms None and results without a protocol code have code None.
+    """
+    entries = [targets.get(int(target_id), {}) for target_id in records["target"]]
+    rtts = records["rtt"].astype(np.float64)
+    return {
+        "timestamp": records["timestamp"].tolist(),
+        "time": [datetime.fromtimestamp(ts).astimezone().isoformat(timespec="milliseconds")
+                 for ts in records["timestamp"].tolist()],
+        "target": [entry.get("name") for entry in entries],
+        "host": [entry.get("host") for entry in entries],
+        "kind": [entry.get("kind") for entry in entries],
+        "ttl": [entry.get("ttl") for entry in entries],
+        "status": [STATUSES[status] if status < len(STATUSES) else None for status in records["status"].tolist()],
+        "rtt_ms": [None if np.isnan(rtt) else round(rtt, 3) for rtt in rtts.tolist()],
+        "code": [None if code == NO_CODE else code for code in records["code"].tolist()]
+    }
+
+
+def iter_columns(store, start=None, end=None, names=None):
+    """Yield record_columns() for each chunk of history matching the filters"""
+    targets = store.targets()
+    for records in store.query(start, end, resolve_targets(store, names)):
+        yield record_columns(records, targets)
+
+
+def write_csv(chunks, stream):
+    writer = csv.writer(stream)
+    writer.writerow(COLUMNS)
+    count = 0
+    for columns in chunks:
+        rows = zip(*(columns[name] for name in COLUMNS))
+        writer.writerows(["" if value is None else value for value in row] for row in rows)
+        count += len(columns["timestamp"])
+    return count
+
+
+def write_jsonl(chunks, stream):
+    count = 0
+    for columns in chunks:
+        for row in zip(*(columns[name] for name in COLUMNS)):
+            stream.write(json.dumps(dict(zip(COLUMNS, row))) + "\n")
+        count += len(columns["timestamp"])
+    return count
+
+
+def write_parquet(chunks, path):
+    """Write each chunk as a row group of a Parquet file; needs pyarrow"""
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs the 'pyarrow' library (pip install pyarrow).")
+    schema = pyarrow.schema([
+        ("timestamp", pyarrow.float64()), ("time", pyarrow.string()), ("target", pyarrow.string()),
+        ("host", pyarrow.string()), ("kind", pyarrow.string()), ("ttl", pyarrow.int16()),
+        ("status", pyarrow.string()), ("rtt_ms", pyarrow.float32()), ("code", pyarrow.uint8())
+    ])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for columns in chunks:
+            writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+            count += len(columns["timestamp"])
+    return count
+
+
+def export(store, fmt, output, start=None, end=None, names=None):
+    """Stream matching history to output (a text stream, or a path for parquet); returns the row count"""
+    chunks = iter_columns(store, start, end, names)
+    if fmt == "csv":
+        return write_csv(chunks, output)
+    if fmt == "jsonl":
+        return write_jsonl(chunks, output)
+    if fmt == "parquet":
+        return write_parquet(chunks, output)
+    raise ValueError(f"Unknown export format {fmt}.")
+
+
+def parse_time(value):
+    """Unix seconds or an ISO 8601 date/time (local time unless it has an offset)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export recorded probe history.")
+    parser.add_argument("--history", default="history", help="history directory written by the monitor")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="output format")
+    parser.add_argument("--from", dest="start", type=parse_time, help="first time to include (ISO or unix seconds)")
+    parser.add_argument("--to", dest="end", type=parse_time, help="export up to this time (ISO or unix seconds)")
+    parser.add_argument("--target", action="append", help="only this target name or host; can be repeated")
+    parser.add_argument("--output", help="write to this file instead of stdout (required for parquet)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.format == "parquet" and not args.output:
+        print("Parquet export needs --output.", file=sys.stderr)
+        return 2
+    store = open_history(args.history)
+    try:
+        if args.format == "parquet":
+            count = export(store, args.format, args.output, args.start, args.end, args.target)
+        elif args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as f:
+                count = export(store, args.format, f, args.start, args.end, args.target)
+        else:
+            count = export(store, args.format, sys.stdout, args.start, args.end, args.target)
+    except (ValueError, RuntimeError, OSError, sqlite3.Error) as e:
+        print(f"Error exporting history: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {count} results.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""Level-of-detail tiles of recorded probe history, loaded in the background for the zoomable graph.
+
+History is cut into tiles of TILE_BUCKETS buckets at one of several bucket
+widths. The graph asks for the tiles covering its visible range at the
+coarsest width that still gives about one bucket per pixel, so a month
+costs as few tiles as ten minutes. Missing tiles are loaded by a
+background thread, newest request first, and kept in an LRU cache.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+from probe_engine import STATUS_LATE, STATUS_DUPLICATE
+from sample_store import STATUS_INDEX, SEGMENT_SLACK
+from latency_stats import SKETCH_BINS, sketch_bin, sketch_quantiles
+
+TILE_WIDTHS = (1, 10, 60, 600, 3600)  # Bucket seconds of each level of detail
+TILE_BUCKETS = 600
+MAX_TILES = 256               # Tiles kept in memory, about 25 KB each
+MAX_PENDING = 64              # Queued loads beyond this are dropped, oldest first
+TILE_REFRESH = 10.0           # Seconds before a tile that may still be receiving results is loaded again
+PREFETCH_TILES = 1            # Tiles either side of the visible range loaded ahead of panning
+EXACT_MEDIAN_SAMPLES = 1 << 19  # Answered probes per tile kept for exact medians, 8 MB; past this, sketches
+
+
+def tile_width(span, pixels):
+    """Finest TILE_WIDTHS entry that shows span seconds in at most about one bucket per pixel"""
+    for width in TILE_WIDTHS:
+        if span / width <= pixels:
+            return width
+    return TILE_WIDTHS[-1]
+
+
+class Tile:
+    """Per-bucket probe count, losses and min/median/max/mean RTT of one target over one tile"""
+    __slots__ = ("start", "width", "count", "lost", "min", "median", "max", "mean", "loaded_at")
+
+    def __init__(self, start, width):
+        self.start = start
+        self.width = width
+        self.count = np.zeros(TILE_BUCKETS, dtype=np.uint32)
+        self.lost = np.zeros(TILE_BUCKETS, dtype=np.uint32)
+        self.min = np.full(TILE_BUCKETS, np.nan)
+        self.median = np.full(TILE_BUCKETS, np.nan)
+        self.max = np.full(TILE_BUCKETS, np.nan)
+        self.mean = np.full(TILE_BUCKETS, np.nan)
+        self.loaded_at = time.time()
+
+    @property
+    def end(self):
+        return self.start + self.width * TILE_BUCKETS
+
+    @property
+    def stale(self):
+        """True if results for this tile may still have arrived since it was loaded"""
+        return self.end + SEGMENT_SLACK > self.loaded_at and time.time() - self.loaded_at > TILE_REFRESH
+
+
+def load_tile(store, target_ids, width, index):
+    """Build tile number index at bucket width from a SampleStore or SqliteStore.
+
+    Each chunk the store yields is folded into the buckets as it arrives,
+    so memory does not grow with the tile's span. Medians are exact while
+    the tile holds up to EXACT_MEDIAN_SAMPLES answered probes; busier tiles
+    take them from per-bucket latency sketches, within a few percent.
+    """
+    tile = Tile(index * width * TILE_BUCKETS, width)
+    answered = []  # (buckets, rtts) of each chunk, until there are too many for exact medians
+    kept = 0
+    total = np.zeros(TILE_BUCKETS)
+    sketch = np.zeros(TILE_BUCKETS * SKETCH_BINS, dtype=np.int64)
+    skipped = [STATUS_INDEX[STATUS_LATE], STATUS_INDEX[STATUS_DUPLICATE]]
+    for records in store.query(tile.start, tile.end, target_ids):
+        records = records[~np.isin(records["status"], skipped)]  # Already counted as a timeout or success
+        buckets = np.clip(((records["timestamp"] - tile.start) // width).astype(np.int64), 0, TILE_BUCKETS - 1)
+        rtts = records["rtt"].astype(np.float64)
+        tile.count += np.bincount(buckets, minlength=TILE_BUCKETS).astype(np.uint32)
+        lost = np.isnan(rtts)
+        tile.lost += np.bincount(buckets[lost], minlength=TILE_BUCKETS).astype(np.uint32)
+        buckets, rtts = buckets[~lost], rtts[~lost]
+        np.fmin.at(tile.min, buckets, rtts)
+        np.fmax.at(tile.max, buckets, rtts)
+        total += np.bincount(buckets, weights=rtts, minlength=TILE_BUCKETS)
+        sketch += np.bincount(buckets * SKETCH_BINS + sketch_bin(rtts), minlength=len(sketch))
+        kept += len(rtts)
+        if answered is not None:
+            answered.append((buckets, rtts))
+            if kept > EXACT_MEDIAN_SAMPLES:
+                answered = None  # Too many to keep: medians come from the sketches
+    received = tile.count.astype(np.int64) - tile.lost
+    filled = received > 0
+    tile.mean[filled] = total[filled] / received[filled]
+    if answered:
+        buckets = np.concatenate([chunk[0] for chunk in answered])
+        rtts = np.concatenate([chunk[1] for chunk in answered])
+        # Sort by bucket, then RTT: each bucket's median sits at a fixed offset in its run
+        order = np.lexsort((rtts, buckets))
+        buckets, rtts = buckets[order], rtts[order]
+        first, counts = np.unique(buckets, return_index=True, return_counts=True)[1:]
+        tile.median[filled] = (rtts[first + (counts - 1) // 2] + rtts[first + counts // 2]) / 2
+    elif answered is None:
+        medians = sketch_quantiles(sketch.reshape(TILE_BUCKETS, SKETCH_BINS)[filled], (0.5,))[:, 0]
+        tile.median[filled] = np.clip(medians, tile.min[filled], tile.max[filled])
+    return tile
+
+
+class TileCache:
+    """LRU cache of history tiles per target, filled by a background loader thread.
+
+    series() never waits for the disk: it returns whatever is cached and
+    queues the rest. `version` goes up every time a tile arrives, so the
+    caller can tell when drawing again would show more.
+    """
+    def __init__(self, store, max_tiles=MAX_TILES):
+        self.store = store
+        self.max_tiles = max_tiles
+        self.version = 0
+        self._tiles = collections.OrderedDict()    # (target key, width, index) -> Tile, least recently used first
+        self._pending = collections.OrderedDict()  # Same keys, most recent request last
+        self._target_ids = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="history-tiles", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def series(self, key, start, end, width):
+        """Concatenated bucket arrays of target key over [start, end) from the cached tiles.
+
+        Keys: time (bucket centre), count, loss (percent), min, median, max
+        and mean; empty buckets are NaN so lines break there. Tiles not yet
+        cached are queued, along with PREFETCH_TILES either side.
+        """
+        span = width * TILE_BUCKETS
+        first, last = int(start // span), int(end // span)
+        tiles = []
+        with self._condition:
+            for index in range(first, last + 1):
+                tile = self._tiles.get((key, width, index))
+                if tile is not None:
+                    self._tiles.move_to_end((key, width, index))
+                    tiles.append(tile)
+                if tile is None or tile.stale:
+                    self._request((key, width, index))
+            for offset in range(1, PREFETCH_TILES + 1):
+                for index in (first - offset, last + offset):
+                    if (key, width, index) not in self._tiles:
+                        self._request((key, width, index), prefetch=True)
+            self._condition.notify()
+        names = ("count", "lost", "min", "median", "max", "mean")
+        if not tiles:
+            return {"time": np.empty(0), "loss": np.empty(0), **{name: np.empty(0) for name in names}}
+        data = {name: np.concatenate([getattr(tile, name) for tile in tiles]) for name in names}
+        data["time"] = np.concatenate([tile.start + (np.arange(TILE_BUCKETS) + 0.5) * width for tile in tiles])
+        visible = (data["time"] >= start - width) & (data["time"] < end + width)
+        data = {name: values[visible] for name, values in data.items()}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            data["loss"] = np.where(data["count"] > 0, 100.0 * data["lost"] / data["count"], np.nan)
+        return data
+
+    def _request(self, tile_key, prefetch=False):
+        if tile_key in self._pending:
+            if prefetch:
+                return  # A visible tile asked for earlier keeps its priority
+            self._pending.move_to_end(tile_key)
+            return
+        self._pending[tile_key] = True
+        if prefetch:
+            self._pending.move_to_end(tile_key, last=False)
+        while len(self._pending) > MAX_PENDING:
+            self._pending.popitem(last=False)
+
+    def _ids(self, key):
+        """Store ids of target key, reloading the store's target list when the key is new"""
+        if key not in self._target_ids:
+            self._target_ids = {entry["key"]: entry["id"] for entry in self.store.targets().values()}
+        return self._target_ids.get(key)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                tile_key, _ = self._pending.popitem()  # Newest request first: what is on screen now
+            key, width, index = tile_key
+            try:
+                target_id = self._ids(key)
+                tile = load_tile(self.store, [target_id], width, index) if target_id is not None else \
+                    Tile(index * width * TILE_BUCKETS, width)
+            except Exception as e:
+                print(f"Error loading probe history for the graph: {e}")
+                continue
+            with self._condition:
+                self._tiles[tile_key] = tile
+                self._tiles.move_to_end(tile_key)
+                while len(self._tiles) > self.max_tiles:
+                    self._tiles.popitem(last=False)
+                self.version += 1
@@ -0,0 +1,214 @@
+"""Persistent ICMP echo backend sharing one socket per address family"""
+import os
+import socket
+import struct
+import time
+
+from probe_engine import ProbeBackend, AddressResolver
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+ICMP_DEST_UNREACHABLE = 3
+ICMP_TIME_EXCEEDED = 11
+ICMPV6_DEST_UNREACHABLE = 1
+ICMPV6_TIME_EXCEEDED = 3
+
+PAYLOAD = b"gping-probe-payload-0123456789abcdefghijklmnopqrstuvwxyz"  # 56 bytes like ping(8)
+HEADER = struct.Struct("!BBHHH")  # type, code, checksum, identifier, sequence
+
+
+def checksum(data):
+    """Internet checksum (RFC 1071) of data"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier, sequence, payload=PAYLOAD, family=socket.AF_INET):
+    """Build an ICMP (or ICMPv6) echo request packet"""
+    icmp_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+    header = HEADER.pack(icmp_type, 0, 0, identifier, sequence)
+    # The kernel fills in the ICMPv6 checksum since it covers the pseudo-header
+    csum = checksum(header + payload) if family == socket.AF_INET else 0
+    return HEADER.pack(icmp_type, 0, csum, identifier, sequence) + payload
+
+
+def parse_icmp(packet, family=socket.AF_INET):
+    """Return (type, code, identifier, sequence, icmp message) for a received packet.
+
+    Raw IPv4 sockets (and datagram sockets on macOS) hand back the IP header
+    too, so it is stripped when present.
+    """
+    if family == socket.AF_INET and len(packet) >= 20 and packet[0] >> 4 == 4:
+        packet = packet[(packet[0] & 0x0F) * 4:]
+    if len(packet) < HEADER.size:
+        return None
+    icmp_type, code, _, identifier, sequence = HEADER.unpack_from(packet)
+    return icmp_type, code, identifier, sequence, packet
+
+
+def parse_quoted_echo(message, family=socket.AF_INET):
+    """Return (identifier, sequence, destination) of the echo request quoted in an ICMP error, or None"""
+    quoted = message[HEADER.size:]
+    if family == socket.AF_INET:
+        if len(quoted) < 20 or quoted[0] >> 4 != 4:
+            return None
+        destination = socket.inet_ntop(family, quoted[16:20])
+        quoted = quoted[(quoted[0] & 0x0F) * 4:]
+        request_type = ICMP_ECHO_REQUEST
+    else:
+        # Our probes carry no extension headers, so the fixed header is all there is
+        if len(quoted) < 40:
+            return None
+        destination = socket.inet_ntop(family, quoted[24:40])
+        quoted = quoted[40:]
+        request_type = ICMPV6_ECHO_REQUEST
+    if len(quoted) < HEADER.size:
+        return None
+    icmp_type, _, _, identifier, sequence = HEADER.unpack_from(quoted)
+    if icmp_type != request_type:
+        return None
+    return identifier, sequence, destination
+
+
+class _IcmpSocket:
+    """One ICMP socket and the identifier the kernel or we put on its packets"""
+    def __init__(self, family, identifier=None):
+        proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        try:
+            # Unprivileged "ping" socket: the kernel owns the identifier and only
+            # delivers replies addressed to this socket
+            self.sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+            self.raw = False
+        except OSError:
+            self.sock = socket.socket(family, socket.SOCK_RAW, proto)
+            self.raw = True
+        self.sock.setblocking(False)
+        self.family = family
+        self.reply_type = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY
+        if self.raw:
+            self.identifier = (os.getpid() if identifier is None else identifier) & 0xFFFF
+        else:
+            self.sock.bind(("", 0) if family == socket.AF_INET else ("::", 0))
+            self.identifier = self.sock.getsockname()[1] & 0xFFFF
+
+    def close(self):
+        self.sock.close()
+
+
+class IcmpSocketBackend(ProbeBackend):
+    """Sends echo requests for every target over one reusable socket per family.
+
+    Replies are matched on (identifier, sequence) plus the source address.
+    Sequence numbers on the wire are allocated by the backend so targets
+    sharing a socket never collide. Raises OSError when neither datagram nor
+    raw ICMP sockets are permitted.
+    """
+    kind = "icmp"
+
+    def __init__(self):
+        super().__init__()
+        self._sockets = {socket.AF_INET: self._new_socket(socket.AF_INET)}
+        self._resolver = None
+        self._in_flight = {}   # (family, wire seq) -> (target, seq, address)
+        self._wire_keys = {}   # (target, seq) -> (family, wire seq)
+        self._wire_seq = 0
+
+    def attach(self, engine):
+        super().attach(engine)
+        self._resolver = AddressResolver(engine, self._lookup)
+        for icmp_sock in self._sockets.values():
+            self._register(icmp_sock)
+
+    def _new_socket(self, family):
+        return _IcmpSocket(family)
+
+    def _register(self, icmp_sock):
+        self.engine.register_fd(icmp_sock.sock, lambda: self._read(icmp_sock))
+
+    def _socket_for(self, family):
+        icmp_sock = self._sockets.get(family)
+        if icmp_sock is None:
+            icmp_sock = self._new_socket(family)
+            self._sockets[family] = icmp_sock
+            self._register(icmp_sock)
+        return icmp_sock
+
+    @staticmethod
+    def _lookup(host, flags):
+        family, _, _, _, sockaddr = socket.getaddrinfo(host, None, type=socket.SOCK_DGRAM, flags=flags)[0]
+        return family, sockaddr
+
+    def _resolve(self, target):
+        return self._resolver.address(target)
+
+    def add_target(self, target):
+        self._resolver.resolve(target)
+
+    def ready(self, target):
+        return self._resolver.ready(target)
+
+    def remove_target(self, target):
+        self._resolver.forget(target)
+        for key, entry in list(self._in_flight.items()):
+            if entry[0] is target:
+                del self._in_flight[key]
+                del self._wire_keys[(target, entry[1])]
+
+    def send(self, target, seq):
+        family, sockaddr = self._resolve(target)
+        icmp_sock = self._socket_for(family)
+        wire_seq = self._allocate_wire_seq(family)
+        packet = build_echo_request(icmp_sock.identifier, wire_seq, family=family)
+        try:
+            icmp_sock.sock.sendto(packet, sockaddr)
+        except OSError:
+            self._resolver.resolve(target)  # Look it up again in the background, the route may have changed
+            raise
+        self._in_flight[(family, wire_seq)] = (target, seq, sockaddr[0])
+        self._wire_keys[(target, seq)] = (family, wire_seq)
+
+    def _allocate_wire_seq(self, family):
+        """Next wire sequence number not still mapped to an earlier probe, which may yet get a late reply"""
+        for _ in range(0x10000):
+            wire_seq = self._wire_seq
+            self._wire_seq = (wire_seq + 1) & 0xFFFF
+            if (family, wire_seq) not in self._in_flight:
+                return wire_seq
+        raise OSError("No free ICMP sequence numbers.")
+
+    def cancel(self, target, seq):
+        key = self._wire_keys.pop((target, seq), None)
+        if key is not None:
+            self._in_flight.pop(key, None)
+
+    def _read(self, icmp_sock):
+        while True:
+            try:
+                packet, source = icmp_sock.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            received_at = time.monotonic()
+            parsed = parse_icmp(packet, icmp_sock.family)
+            if parsed is None:
+                continue
+            icmp_type, _, identifier, wire_seq, _ = parsed
+            if icmp_type != icmp_sock.reply_type or identifier != icmp_sock.identifier:
+                continue
+            entry = self._in_flight.get((icmp_sock.family, wire_seq))
+            if entry is None or entry[2] != source[0]:
+                continue
+            # The mapping stays until cancel() so late and duplicate replies still match
+            self.engine.reply(entry[0], entry[1], received_at=received_at)
+
+    def close(self):
+        self._resolver.close()
+        for icmp_sock in self._sockets.values():
+            self.engine.unregister_fd(icmp_sock.sock)
+            icmp_sock.close()
+        self._sockets.clear()
@@ -0,0 +1,148 @@
+"""Bounded-memory, mergeable latency statistics: percentiles, jitter and loss"""
+import math
+
+import numpy as np
+
+# Percentile sketch: log-spaced RTT bins, each 8% wider than the last, so a
+# percentile read back from a sketch is within about 4% of the exact value
+SKETCH_GAMMA = 1.08
+SKETCH_MIN_MS = 0.05
+SKETCH_MAX_MS = 120000.0
+SKETCH_BINS = math.ceil(math.log(SKETCH_MAX_MS / SKETCH_MIN_MS) / math.log(SKETCH_GAMMA)) + 1
+_LOG_GAMMA = math.log(SKETCH_GAMMA)
+SKETCH_VALUES = SKETCH_MIN_MS * SKETCH_GAMMA ** (np.arange(SKETCH_BINS) + 0.5)  # Representative RTT per bin
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+JITTER_GAIN = 1 / 16  # RFC 3550 section 6.4.1
+
+
+def sketch_bin(rtt):
+    """Sketch bin index for an rtt in ms (scalar or array)"""
+    bins = np.floor(np.log(np.maximum(rtt, SKETCH_MIN_MS) / SKETCH_MIN_MS) / _LOG_GAMMA)
+    return np.minimum(bins, SKETCH_BINS - 1).astype(np.int64)
+
+
+def sketch_quantiles(sketches, quantiles):
+    """Approximate quantiles (0..1) of each row of a 2-D array of sketch counts; NaN for empty rows"""
+    sketches = np.atleast_2d(sketches)
+    cumulative = np.cumsum(sketches, axis=1)
+    totals = cumulative[:, -1]
+    result = np.full((len(sketches), len(quantiles)), np.nan)
+    filled = totals > 0
+    for column, quantile in enumerate(quantiles):
+        ranks = np.maximum(1, np.ceil(quantile * totals[filled]))
+        bins = (cumulative[filled] < ranks[:, None]).sum(axis=1)
+        result[filled, column] = SKETCH_VALUES[np.minimum(bins, SKETCH_BINS - 1)]
+    return result
+
+
+class JitterEstimator:
+    """RFC 3550 interarrival jitter applied to consecutive RTTs of one target.
+
+    D is the change in RTT between two answered probes and the estimate moves
+    1/16 of the way towards |D| with every sample.
+    """
+    def __init__(self):
+        self.jitter = 0.0
+        self.last_rtt = None
+
+    def update(self, rtt):
+        """Feed an answered probe's rtt; return |D| for it, or None for the first sample"""
+        last, self.last_rtt = self.last_rtt, rtt
+        if last is None:
+            return None
+        delta = abs(rtt - last)
+        self.jitter += JITTER_GAIN * (delta - self.jitter)
+        return delta
+
+
+class LatencyStats:
+    """Loss, RTT percentiles and jitter over any set of samples, in constant memory.
+
+    Everything is kept as sums and a fixed-size sketch, so stats of separate
+    time windows or separate targets merge exactly by adding them up.
+    Jitter here is the mean |D| over the samples (the quantity RFC 3550
+    smooths), which, unlike the smoothed value, merges without loss.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.lost = 0
+        self.rtt_sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.delta_sum = 0.0
+        self.delta_count = 0
+        self.sketch = np.zeros(SKETCH_BINS, dtype=np.uint64)
+
+    def add(self, rtt, delta=None):
+        """Count one probe; rtt None means it was lost, delta is its |D| from a JitterEstimator"""
+        self.sent += 1
+        if rtt is None:
+            self.lost += 1
+            return
+        self.rtt_sum += rtt
+        self.min = min(self.min, rtt)
+        self.max = max(self.max, rtt)
+        self.sketch[sketch_bin(rtt)] += 1
+        if delta is not None:
+            self.delta_sum += delta
+            self.delta_count += 1
+
+    def merge(self, other):
+        """Add other's samples to these stats and return self"""
+        self.sent += other.sent
+        self.lost += other.lost
+        self.rtt_sum += other.rtt_sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.delta_sum += other.delta_sum
+        self.delta_count += other.delta_count
+        self.sketch += other.sketch
+        return self
+
+    @staticmethod
+    def merged(stats):
+        """New LatencyStats combining an iterable of them, e.g. several windows or targets"""
+        total = LatencyStats()
+        for item in stats:
+            total.merge(item)
+        return total
+
+    @property
+    def received(self):
+        return self.sent - self.lost
+
+    @property
+    def loss(self):
+        """Lost probes in percent"""
+        return 100.0 * self.lost / self.sent if self.sent else 0.0
+
+    @property
+    def mean(self):
+        return self.rtt_sum / self.received if self.received else None
+
+    @property
+    def jitter(self):
+        return self.delta_sum / self.delta_count if self.delta_count else None
+
+    def quantile(self, quantile):
+        """Approximate RTT quantile (0..1) in ms, or None without answered probes"""
+        return self.quantiles((quantile,))[0]
+
+    def quantiles(self, quantiles=DEFAULT_QUANTILES):
+        if not self.received:
+            return [None] * len(quantiles)
+        return [float(value) for value in sketch_quantiles(self.sketch, quantiles)[0]]
+
+    def to_dict(self, quantiles=DEFAULT_QUANTILES):
+        data = {
+            "sent": self.sent,
+            "loss": round(self.loss, 2),
+            "mean": self.mean,
+            "min": self.min if self.received else None,
+            "max": self.max if self.received else None,
+            "jitter": self.jitter
+        }
+        for quantile, value in zip(quantiles, self.quantiles(quantiles)):
+            data[f"p{round(quantile * 100)}"] = value
+        return data
@@ -1,18 +1,28 @@
 import sys
 import time
-import threading
-import platform
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import json
-import re
-import subprocess
 import socket
-import pytz
+import threading
 import numpy as np
 from geopy.geocoders import Nominatim
 import requests
 from classic_speedometer import ClassicSpeedometer
+from probe_engine import ProbeTarget, ResultQueue, MIN_PROBE_INTERVAL, STATUS_LATE, STATUS_DUPLICATE
+from dns_probe import rcode_name
+from path_probe import PathMonitor, DEFAULT_MAX_HOPS
+from ring_buffer import RingBuffer
+from downsample import visible_slice, peak_downsample
+from history_tiles import TileCache, tile_width
+from sample_store import DEFAULT_RETENTION_DAYS, target_key
+from sqlite_store import create_history_writer, open_history
+from rollups import RollupManager
+from alarm_rules import get_timezone
+from monitor_core import (
+    Alarm, AlarmMonitor, ConnectionTracker, SoundManager, create_probe_engine,
+    ERROR_SOUND_FILE, ALARM_SOUND_FILE, DEFAULT_SOUND_REPEAT_INTERVAL, DEFAULT_TIMEZONE
+)
 
 # PyQt5 imports
 from PyQt5.QtWidgets import (
@@ -20,25 +30,18 @@ from PyQt5.QtWidgets import (
     QLineEdit, QPushButton, QListWidget, QMessageBox, QFrame,
     QGridLayout, QScrollArea, QSizePolicy, QFileDialog,
     QInputDialog, QMenu, QAction, QMenuBar, QSystemTrayIcon,
-    QDialog, QFormLayout, QComboBox, QSpinBox, QListWidgetItem,
-    QCheckBox, QTimeEdit, QGraphicsDropShadowEffect
+    QDialog, QFormLayout, QComboBox, QSpinBox, QDoubleSpinBox, QListWidgetItem,
+    QCheckBox, QTimeEdit, QGraphicsDropShadowEffect, QListView, QStyledItemDelegate, QStyle, QGraphicsPathItem
+)
+from PyQt5.QtCore import (
+    QTimer, Qt, pyqtSignal, QThread, QTime, QPropertyAnimation, QEasingCurve, QAbstractListModel, QModelIndex, QSize,
+    QRectF
+)
+from PyQt5.QtGui import (
+    QFont, QPalette, QColor, QIcon, QCursor, QLinearGradient, QGradient, QPainter, QBrush, QPainterPath
 )
-from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QObject, QThread, QTime, QPropertyAnimation, QEasingCurve
-from PyQt5.QtGui import QFont, QPalette, QColor, QIcon, QCursor, QLinearGradient, QGradient, QPainter, QBrush
 import pyqtgraph as pg  # For graphing
 
-# Conditional imports for platform-specific features
-try:
-    import winsound
-except ImportError:
-    winsound = None
-
-try:
-    import ping3
-except ImportError:
-    ping3 = None
-    print("Warning: 'ping3' library not found. Falling back to subprocess ping.")
-
 try:
     import speedtest
 except ImportError:
@@ -50,11 +53,31 @@ except ImportError:
 DNS_SERVER = "8.8.8.8"
 PING_TIMEOUT = 1
 PING_INTERVAL = 1
-ERROR_SOUND_FILE = "error.wav"
-ALARM_SOUND_FILE = "alarm.wav"
+PING_PIPELINE = False  # Keep sending on schedule while earlier probes still wait for replies
+PING_ADAPTIVE = False  # Probe every PING_INTERVAL while healthy, every PING_BURST_INTERVAL while degraded
+PING_BURST_INTERVAL = None  # Defaults to a tenth of PING_INTERVAL
+PING_BUDGET = None  # Average probes/s the burst may use per target; defaults to twice the normal rate
+DNS_PROBE_NAMES = []  # Names resolved through DNS_SERVER to measure lookup latency; empty disables it
+PING_TARGETS = []  # Extra targets probed alongside DNS_SERVER, as ProbeTarget dicts
+PATH_PROBE = False  # Probe every hop towards DNS_SERVER (mtr-style) and graph each hop
+PATH_MAX_HOPS = DEFAULT_MAX_HOPS
 dark_mode = True
 english_language = True  # Default to English
 CONFIG_FILE = "config.json"
+UI_REFRESH_MS = 33  # Probe results are handed to the UI in one batch per frame
+GRAPH_REFRESH_MS = 100  # The graph is redrawn at this fixed rate, however fast samples arrive
+GRAPH_HISTORY_POINTS = 60  # Samples kept per graph curve
+PING_LOG_RETENTION = 10000  # Rows kept in the ping log; older ones are dropped
+GRAPH_SPANS = [0, 600, 3600, 86400, 7 * 86400, 30 * 86400]  # Graph ranges in seconds; 0 shows live samples
+GRAPH_MODES = ["line", "envelope", "heatmap"]  # Envelope and heatmap are drawn from rollups
+ROLLUP_LIVE_SPAN = 600  # Range shown by the envelope and heatmap modes while the graph is on "Live"
+HEATMAP_ROWS = 100  # Latency rows of the heatmap image
+LATENCY_STATS_WINDOW = 60  # Seconds summarised by the percentile/jitter/loss line in the ping panel
+HISTORY_DIR = "history"  # Every probe result is recorded here for later analysis; empty disables it
+HISTORY_RETENTION_DAYS = DEFAULT_RETENTION_DAYS
+HISTORY_BACKEND = "segments"  # "segments" (binary segment files) or "sqlite" (one WAL-mode database)
+SOUND_REPEAT_INTERVAL = DEFAULT_SOUND_REPEAT_INTERVAL  # Least seconds between two error sounds
+TIMEZONE = DEFAULT_TIMEZONE  # IANA zone of the clock and of alarms without their own; "local" uses the system's
 
 # --- Text Resources ---
 TEXTS = {
@@ -65,14 +88,26 @@ TEXTS = {
         "ping_interval": "Ping Interval (s):",
         "ping_timeout": "Ping Timeout (s):",
         "language": "Language:",
+        "timezone": "Timezone:",
+        "invalid_timezone": "Unknown timezone. Use a name like Europe/London, or \"local\".",
         "theme": "Theme:",
         "error_sound": "Error Sound:",
         "alarm_sound": "Alarm Sound:",
         "save": "Save",
         "browse": "Browse...",
         "ping_graph_title": "Ping Response Time (ms)",
+        "graph_live": "Live",
+        "span_minutes": "{} min",
+        "span_hours": "{} h",
+        "span_days": "{} days",
+        "graph_latest": "Latest",
+        "graph_mode_line": "Line",
+        "graph_mode_envelope": "Min/median/max",
+        "graph_mode_heatmap": "Heatmap",
         "ping_monitor_title": "DNS Ping Monitor",
         "searching": "Searching...",
+        "latency_stats": "p50 {} · p95 {} · p99 {} ms · Jitter {} ms · Loss {:.1f}%",
+        "latency_stats_empty": "p50 – · p95 – · p99 – · Jitter – · Loss –",
         "internet_good": "✓ Internet: Good",
         "internet_poor": "✗ Internet: Poor",
         "alarm_management": "ALARM MANAGEMENT",
@@ -92,6 +127,8 @@ TEXTS = {
         "new_alarm_prompt": "Enter alarm name:",
         "set_time_title": "Set Alarm Time",
         "select_time": "Select time:",
+        "repeat_days": "Repeat on:",
+        "weekdays_short": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
         "ok": "OK",
         "local_ip": "Local IP:",
         "public_ip": "Public IP:",
@@ -114,7 +151,9 @@ TEXTS = {
         "speed_test_error_title": "Speed Test Error",
         "speed_test_failed": "Speed test failed: {}",
         "ping_success": "✅ Ping successful → Response time: {:.1f} ms (Connection stable)",
-        "ping_failure": "❌ Failure detected: Didn't reply within {:.1f} seconds. Server unavailable."
+        "ping_failure": "❌ Failure detected: Didn't reply within {:.1f} seconds. Server unavailable.",
+        "dns_success": "✅ DNS answered → Resolution time: {:.1f} ms ({})",
+        "dns_error": "❌ DNS error: {} after {:.1f} ms"
     },
     "az": {
         "main_title": "🚀 DNS Ping & Siqnal Monitoru",
@@ -123,14 +162,26 @@ TEXTS = {
         "ping_interval": "Ping intervalı (s):",
         "ping_timeout": "Ping zaman aşımı (s):",
         "language": "Dil:",
+        "timezone": "Saat qurşağı:",
+        "invalid_timezone": "Naməlum saat qurşağı. Europe/London kimi ad və ya \"local\" yazın.",
         "theme": "Mövzu:",
         "error_sound": "Xəta səsi:",
         "alarm_sound": "Siqnal səsi:",
         "save": "Yadda saxla",
         "browse": "Göz at...",
         "ping_graph_title": "Ping cavab müddəti (ms)",
+        "graph_live": "Canlı",
+        "span_minutes": "{} dəq",
+        "span_hours": "{} saat",
+        "span_days": "{} gün",
+        "graph_latest": "Ən son",
+        "graph_mode_line": "Xətt",
+        "graph_mode_envelope": "Min/median/maks",
+        "graph_mode_heatmap": "İstilik xəritəsi",
         "ping_monitor_title": "DNS Ping Monitoru",
         "searching": "Axtarılır...",
+        "latency_stats": "p50 {} · p95 {} · p99 {} ms · Titrəmə {} ms · İtki {:.1f}%",
+        "latency_stats_empty": "p50 – · p95 – · p99 – · Titrəmə – · İtki –",
         "internet_good": "✓ İnternet: Yaxşı",
         "internet_poor": "✗ İnternet: Zəif",
         "alarm_management": "SİQNAL İDARƏETMƏSİ",
@@ -150,6 +201,8 @@ TEXTS = {
         "new_alarm_prompt": "Siqnal adını daxil edin:",
         "set_time_title": "Siqnal Vaxtını Təyin Et",
         "select_time": "Vaxtı seçin:",
+        "repeat_days": "Təkrar günləri:",
+        "weekdays_short": ["B.e", "Ç.a", "Ç", "C.a", "C", "Ş", "B"],
         "ok": "TAMAM",
         "local_ip": "Lokal IP:",
         "public_ip": "Xarici IP:",
@@ -172,12 +225,12 @@ TEXTS = {
         "speed_test_error_title": "Sürət Testi Xətası",
         "speed_test_failed": "Sürət testi uğursuz oldu: {}",
         "ping_success": "✅ Ping uğurlu → Cavab müddəti: {:.1f} ms (Bağlantı sabit)",
-        "ping_failure": "❌ Uğursuzluq aşkarlandı: {:.1f} saniyə ərzində cavab vermədi. Server əlçatan deyil."
+        "ping_failure": "❌ Uğursuzluq aşkarlandı: {:.1f} saniyə ərzində cavab vermədi. Server əlçatan deyil.",
+        "dns_success": "✅ DNS cavab verdi → Həll müddəti: {:.1f} ms ({})",
+        "dns_error": "❌ DNS xətası: {} ({:.1f} ms sonra)"
     }
 }
 
-# Store active alarms (timestamps)
-active_alarm_timestamps = []
 active_alarm_ringing = False
 
 # --- Modern Color Palette ---
@@ -220,131 +273,6 @@ COLORS = {
     }
 }
 
-class Alarm:
-    """Represents a single alarm with time, status and name"""
-    def __init__(self, hour, minute, enabled=True, name="Alarm"):
-        if not (0 <= hour <= 23 and 0 <= minute <= 59):
-            raise ValueError("Invalid hour or minute for alarm.")
-        self.hour = hour
-        self.minute = minute
-        self.enabled = enabled
-        self.name = name
-
-    def to_dict(self):
-        """Serialize alarm to dictionary for saving"""
-        return {
-            "hour": self.hour,
-            "minute": self.minute,
-            "enabled": self.enabled,
-            "name": self.name
-        }
-
-    @staticmethod
-    def from_dict(data):
-        """Create Alarm object from dictionary"""
-        return Alarm(data.get("hour", 0), data.get("minute", 0),
-                   data.get("enabled", True), data.get("name", "Alarm"))
-
-    def __eq__(self, other):
-        """Compare alarms by time and name"""
-        if not isinstance(other, Alarm):
-            return NotImplemented
-        return self.hour == other.hour and self.minute == other.minute and self.name == other.name
-
-    def __hash__(self):
-        """Hash for set operations"""
-        return hash((self.hour, self.minute, self.name))
-
-    def __str__(self):
-        """String representation for display"""
-        status = " (Enabled)" if self.enabled else " (Disabled)"
-        return f"{self.hour:02d}:{self.minute:02d} - {self.name}{status}"
-
-def ping_host(host, timeout=1):
-    """Ping a host and return response time in ms or None if failed"""
-    if ping3:
-        try:
-            response = ping3.ping(host, timeout=timeout, unit='ms')
-            if isinstance(response, (int, float)) and response > 0:
-                return response
-        except Exception:
-            pass
-
-    # Fallback to subprocess ping
-    try:
-        param = '-n' if platform.system().lower() == 'windows' else '-c'
-        timeout_param = '-w' if platform.system().lower() == 'windows' else '-W'
-        timeout_val = int(timeout * 1000) if platform.system().lower() == 'windows' else int(timeout)
-        command = ['ping', param, '1', timeout_param, str(timeout_val), host]
-
-        result = subprocess.run(command, capture_output=True, text=True, check=False)
-
-        if result.returncode == 0:
-            if platform.system().lower() == "windows":
-                match = re.search(r'time[=<](\d+\.?\d*)ms', result.stdout)
-            else:
-                match = re.search(r'time=(\d+\.?\d*)\s*ms', result.stdout)
-
-            if match:
-                return float(match.group(1))
-            return 1.0
-        else:
-            return None
-    except Exception:
-        return None
-
-class SoundManager(QObject):
-    """Handles playing sound effects in background threads"""
-    def __init__(self):
-        super().__init__()
-        self._error_sound = ERROR_SOUND_FILE
-        self._alarm_sound = ALARM_SOUND_FILE
-        self._stop_requested = threading.Event()
-        self._alarm_thread = None
-
-    @property
-    def error_sound(self): return self._error_sound
-    @error_sound.setter
-    def error_sound(self, value): self._error_sound = value
-
-    @property
-    def alarm_sound(self): return self._alarm_sound
-    @alarm_sound.setter
-    def alarm_sound(self, value): self._alarm_sound = value
-
-    def play(self, sound_type):
-        """Play sound asynchronously based on type"""
-        if sound_type == "error":
-            threading.Thread(target=self._play_sound, args=(self.error_sound, False), daemon=True).start()
-        elif sound_type == "alarm":
-            if not self._alarm_thread or not self._alarm_thread.is_alive():
-                self._stop_requested.clear()
-                self._alarm_thread = threading.Thread(target=self._play_sound, args=(self.alarm_sound, True), daemon=True)
-                self._alarm_thread.start()
-
-    def _play_sound(self, sound_file, loop=False):
-        """Internal sound playing logic"""
-        if platform.system().lower() == "windows" and winsound:
-            try:
-                if not os.path.exists(sound_file):
-                    winsound.PlaySound("SystemAsterisk", winsound.SND_ALIAS | winsound.SND_ASYNC)
-                    return
-
-                if loop:
-                    while not self._stop_requested.is_set():
-                        winsound.PlaySound(sound_file, winsound.SND_FILENAME)
-                        time.sleep(0.1)
-                else:
-                    winsound.PlaySound(sound_file, winsound.SND_FILENAME | winsound.SND_ASYNC)
-            except Exception as e:
-                print(f"Error playing sound: {e}")
-
-    def stop_alarm(self):
-        """Stop the looping alarm sound"""
-        self._stop_requested.set()
-        if platform.system().lower() == "windows" and winsound:
-            winsound.PlaySound(None, winsound.SND_PURGE)
-
 class SpeedTestThread(QThread):
     """Thread for running an internet speed test with real-time progress."""
     download_progress = pyqtSignal(float)
@@ -630,51 +558,234 @@ class SpeedTestDialog(QDialog):
 
 
 
+class PingRecord:
+    """Compact probe result queued for the UI; text is formatted only when displayed"""
+    __slots__ = ("result", "is_primary", "series", "since_success", "status_class")
+
+    def __init__(self, result, is_primary, series, since_success, status_class):
+        self.result = result
+        self.is_primary = is_primary
+        self.series = series                # Graph curve the sample belongs to ("ping", "dns", "hop") or None
+        self.since_success = since_success  # Seconds since the target last answered
+        self.status_class = status_class    # "status-good"/"status-error" for the status label, or None
+
+
+def format_ping_record(record):
+    """Localized ping list text for a PingRecord"""
+    lang = "en" if english_language else "az"
+    result = record.result
+    prefix = "" if record.is_primary else f"[{result.target.name}] "
+    if result.target.kind == "dns" and result.rtt is not None:
+        if result.ok:
+            return prefix + TEXTS[lang]["dns_success"].format(result.rtt, rcode_name(result.code))
+        return prefix + TEXTS[lang]["dns_error"].format(rcode_name(result.code), result.rtt)
+    if result.ok:
+        return prefix + TEXTS[lang]["ping_success"].format(result.rtt)
+    return prefix + TEXTS[lang]["ping_failure"].format(record.since_success)
+
+
+def envelope_path(times, low, high):
+    """Filled band between the low and high curves, broken wherever they are NaN"""
+    answered = ~(np.isnan(low) | np.isnan(high))
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], answered.astype(np.int8), [0]))))
+    xs, ys, connect = [], [], []
+    for first, last in zip(edges[::2], edges[1::2]):
+        # One closed outline per run: along the top, then back along the bottom
+        xs += [times[first:last], times[first:last][::-1]]
+        ys += [high[first:last], low[first:last][::-1]]
+        run_connect = np.ones(2 * (last - first), dtype=np.int8)
+        run_connect[-1] = 0
+        connect.append(run_connect)
+    if not xs:
+        return QPainterPath()
+    return pg.arrayToQPath(np.concatenate(xs), np.concatenate(ys), connect=np.concatenate(connect))
+
+
+class PingLogModel(QAbstractListModel):
+    """The newest `capacity` PingRecords, oldest first, in a fixed-size ring.
+
+    Rows are never formatted here ahead of time; the view only asks for the
+    ones it shows, so memory and scrolling cost stay flat however long the
+    app runs.
+    """
+    def __init__(self, capacity, parent=None):
+        super().__init__(parent)
+        self.capacity = max(1, capacity)
+        self._records = [None] * self.capacity
+        self._start = 0  # Ring slot of row 0
+        self._size = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._size
+
+    def record(self, row):
+        return self._records[(self._start + row) % self.capacity]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return format_ping_record(self.record(index.row()))
+        if role == Qt.UserRole:
+            return self.record(index.row())
+        return None
+
+    def append(self, records):
+        """Add a batch of PingRecords, dropping the oldest rows beyond capacity; returns how many were dropped"""
+        records = records[-self.capacity:]
+        if not records:
+            return 0
+        dropped = max(0, self._size + len(records) - self.capacity)
+        if dropped:
+            self.beginRemoveRows(QModelIndex(), 0, dropped - 1)
+            for row in range(dropped):
+                self._records[(self._start + row) % self.capacity] = None
+            self._start = (self._start + dropped) % self.capacity
+            self._size -= dropped
+            self.endRemoveRows()
+        self.beginInsertRows(QModelIndex(), self._size, self._size + len(records) - 1)
+        for record in records:
+            self._records[(self._start + self._size) % self.capacity] = record
+            self._size += 1
+        self.endInsertRows()
+        return dropped
+
+    def clear(self):
+        self.beginResetModel()
+        self._records = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+        self.endResetModel()
+
+
+class PingLogDelegate(QStyledItemDelegate):
+    """Paints a ping log row in the theme's success or error colors straight from its PingRecord"""
+    def paint(self, painter, option, index):
+        record = index.data(Qt.UserRole)
+        colors = COLORS['dark'] if dark_mode else COLORS['light']
+        if option.state & QStyle.State_Selected:
+            background, foreground = colors['accent_blue'], "white"
+        elif record.result.ok:
+            background, foreground = colors['success_bg'], colors['accent_green']
+        else:
+            background, foreground = colors['error_bg'], colors['accent_red']
+        if option.state & QStyle.State_MouseOver and not option.state & QStyle.State_Selected:
+            background = colors['hover']
+
+        rect = option.rect.adjusted(0, 2, 0, -2)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(background))
+        painter.drawRoundedRect(rect, 4, 4)
+        painter.setPen(QColor(foreground))
+        painter.setFont(option.font)
+        painter.drawText(rect.adjusted(8, 0, -8, 0), Qt.AlignVCenter | Qt.AlignLeft, format_ping_record(record))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(0, option.fontMetrics.height() + 20)
+
+
 class PingThread(QThread):
-    """Thread for continuous ping monitoring"""
-    update_signal = pyqtSignal(str, bool)  # Message, is_success
-    status_signal = pyqtSignal(str, str)   # Status message, CSS class
-    ping_result_signal = pyqtSignal(float) # Ping response time
+    """Thread running the probe engine for DNS_SERVER and any extra targets.
 
-    def __init__(self, sound_manager):
+    Results are queued as PingRecords on result_queue for the UI to collect
+    in batches; other consumers can subscribe to self.engine directly.
+    rollups outlives the thread, so restarting it keeps the rollups.
+    """
+    def __init__(self, sound_manager, result_queue, rollups):
         super().__init__()
         self.running = True
-        self.last_success_time = time.time()
         self.sound_manager = sound_manager
-        self.consecutive_errors = 0
-        self.max_errors_before_sound = 3
+        self.result_queue = result_queue
+        self.primary_target = ProbeTarget(DNS_SERVER, PING_INTERVAL, PING_TIMEOUT, pipeline=PING_PIPELINE,
+                                          adaptive=PING_ADAPTIVE, burst_interval=PING_BURST_INTERVAL,
+                                          budget=PING_BUDGET)
+        self.targets = [self.primary_target]
+        self.dns_target = None
+        if DNS_PROBE_NAMES:
+            self.dns_target = ProbeTarget(DNS_SERVER, PING_INTERVAL, PING_TIMEOUT, f"DNS {DNS_SERVER}", kind="dns",
+                                          pipeline=PING_PIPELINE, queries=DNS_PROBE_NAMES, adaptive=PING_ADAPTIVE,
+                                          burst_interval=PING_BURST_INTERVAL, budget=PING_BUDGET)
+            self.targets.append(self.dns_target)
+        for data in PING_TARGETS:
+            try:
+                self.targets.append(ProbeTarget.from_dict(data, PING_INTERVAL, PING_TIMEOUT))
+            except (KeyError, ValueError) as e:
+                print(f"Skipping invalid ping target {data}: {e}")
+        self.tracker = ConnectionTracker(self.targets, max_errors_before_alert=3)
+
+        self.engine = create_probe_engine()
+        self.engine.subscribe(self.handle_result)
+        for target in self.targets:
+            self.engine.add_target(target)
+
+        self.path_monitor = None
+        if PATH_PROBE:
+            self.path_monitor = PathMonitor(DNS_SERVER, PING_INTERVAL, PING_TIMEOUT, PATH_MAX_HOPS, PING_PIPELINE)
+            if not self.path_monitor.attach(self.engine):
+                self.path_monitor = None
+
+        self.history = None
+        if HISTORY_DIR:
+            self.history = create_history_writer(HISTORY_DIR, HISTORY_BACKEND, HISTORY_RETENTION_DAYS)
+            self.engine.subscribe(self.history.add)
+
+        self.rollups = rollups
+        for target in (self.primary_target, self.dns_target):
+            if target:
+                self.rollups.track(target)
+        self.engine.subscribe(self.rollups.update)
 
     def run(self):
         """Main ping loop"""
-        while self.running:
-            response = ping_host(DNS_SERVER, timeout=PING_TIMEOUT)
-            now_str = datetime.now().strftime('%H:%M:%S')
-            lang = "en" if english_language else "az"
+        if HISTORY_DIR:
+            # Probing starts straight away; older history fills in behind it
+            threading.Thread(target=self.backfill_rollups, args=(time.time(),), name="backfill", daemon=True).start()
+        if self.history:
+            self.history.start()
+        self.engine.run()
+
+    def backfill_rollups(self, end):
+        """Rebuild rollups of targets new to them from the history recorded before end"""
+        try:
+            self.rollups.backfill(open_history(HISTORY_DIR, HISTORY_BACKEND), end)
+        except Exception as e:
+            print(f"Error loading probe history: {e}")
+
+    def handle_result(self, result):
+        """Update error counters, play error sounds and queue the result for the UI"""
+        if result.status in (STATUS_LATE, STATUS_DUPLICATE):
+            return  # Already counted as a timeout or success; only other consumers care
+        if self.path_monitor and self.path_monitor.update(result):
+            # Hops only feed the graph; routers that never answer are normal, not an outage
+            if result.rtt is not None:
+                self.result_queue.put(PingRecord(result, False, "hop", None, None))
+            return
 
-            if response is not None:
-                self.consecutive_errors = 0
-                self.last_success_time = time.time()
-                msg = TEXTS[lang]["ping_success"].format(response)
-                status_msg = TEXTS[lang]["internet_good"]
-                self.status_signal.emit(status_msg, "status-good")
-                self.update_signal.emit(msg, True)
-                self.ping_result_signal.emit(response)
-            else:
-                self.consecutive_errors += 1
-                elapsed = time.time() - self.last_success_time
-                msg = TEXTS[lang]["ping_failure"].format(elapsed)
-                self.update_signal.emit(msg, False)
-                if self.consecutive_errors >= self.max_errors_before_sound:
-                    status_msg = TEXTS[lang]["internet_poor"]
-                    self.status_signal.emit(status_msg, "status-error")
-                    self.sound_manager.play("error")
+        is_primary = result.target is self.primary_target
+        status_class = None
+        since_success, alerting = self.tracker.update(result)
+
+        if result.ok:
+            if is_primary:
+                status_class = "status-good"
+        elif alerting:
+            if is_primary:
+                status_class = "status-error"
+            self.sound_manager.play("error")
 
-            time.sleep(PING_INTERVAL)
+        series = "ping" if is_primary else "dns" if result.target is self.dns_target else None
+        self.result_queue.put(PingRecord(result, is_primary, series, since_success, status_class))
 
     def stop(self):
         """Stop the ping thread"""
         self.running = False
+        self.engine.stop()
         self.wait()
+        if self.history:
+            self.history.close()
 
 class AlarmThread(QThread):
     """Thread for monitoring and triggering alarms"""
@@ -684,34 +795,24 @@ class AlarmThread(QThread):
         super().__init__()
         self.running = True
         self.sound_manager = sound_manager
-        self.triggered_today = set()  # Stores (hour, minute) of triggered alarms
+        self.monitor = AlarmMonitor([], self.ring)
 
     def run(self):
         """Main alarm monitoring loop"""
+        self.monitor.run()
+
+    def ring(self, alarms):
+        """Called by the monitor when alarms are due"""
         global active_alarm_ringing
-        while self.running:
-            now = datetime.now()
-            # Reset daily triggers at midnight
-            if now.hour == 0 and now.minute == 0 and self.triggered_today:
-                self.triggered_today.clear()
-
-            for alarm_timestamp in active_alarm_timestamps[:]:
-                alarm_time = datetime.fromtimestamp(alarm_timestamp)
-
-                if now.hour == alarm_time.hour and \
-                   now.minute == alarm_time.minute and \
-                   (alarm_time.hour, alarm_time.minute) not in self.triggered_today:
-
-                    active_alarm_ringing = True
-                    self.triggered_today.add((alarm_time.hour, alarm_time.minute))
-                    alarm_msg = TEXTS["en" if english_language else "az"]["alarm_ringing"]
-                    self.alarm_signal.emit(alarm_msg)
-                    self.sound_manager.play("alarm")
-            time.sleep(1)
+        active_alarm_ringing = True
+        alarm_msg = TEXTS["en" if english_language else "az"]["alarm_ringing"]
+        self.alarm_signal.emit(alarm_msg)
+        self.sound_manager.play("alarm")
 
     def stop(self):
         """Stop the alarm thread"""
         self.running = False
+        self.monitor.stop()
         self.wait()
 
 class SettingsDialog(QDialog):
@@ -738,8 +839,10 @@ class SettingsDialog(QDialog):
         layout.addRow(QLabel(TEXTS["en" if english_language else "az"]["dns_server"]), self.dns_input)
 
         # Ping Interval
-        self.ping_interval_spin = QSpinBox()
-        self.ping_interval_spin.setRange(1, 60)
+        self.ping_interval_spin = QDoubleSpinBox()
+        self.ping_interval_spin.setDecimals(2)
+        self.ping_interval_spin.setRange(MIN_PROBE_INTERVAL, 60)
+        self.ping_interval_spin.setSingleStep(0.1)
         self.ping_interval_spin.setValue(PING_INTERVAL)
         self.ping_interval_spin.setProperty("class", "input-field")
         layout.addRow(QLabel(TEXTS["en" if english_language else "az"]["ping_interval"]), self.ping_interval_spin)
@@ -759,6 +862,12 @@ class SettingsDialog(QDialog):
         self.language_combo.setProperty("class", "input-field")
         layout.addRow(QLabel(TEXTS["en" if english_language else "az"]["language"]), self.language_combo)
 
+        # Timezone of the clock and alarms
+        self.timezone_input = QLineEdit(TIMEZONE)
+        self.timezone_input.setPlaceholderText("local")
+        self.timezone_input.setProperty("class", "input-field")
+        layout.addRow(QLabel(TEXTS["en" if english_language else "az"]["timezone"]), self.timezone_input)
+
         # Theme
         self.theme_combo = QComboBox()
         self.theme_combo.addItem("Light", False)
@@ -882,7 +991,15 @@ class SettingsDialog(QDialog):
 
     def save_settings(self):
         """Save settings and emit changed signal"""
-        global DNS_SERVER, PING_INTERVAL, PING_TIMEOUT, dark_mode, english_language
+        global DNS_SERVER, PING_INTERVAL, PING_TIMEOUT, TIMEZONE, dark_mode, english_language
+        timezone = self.timezone_input.text().strip() or "local"
+        try:
+            get_timezone(timezone)
+        except ValueError:
+            QMessageBox.warning(self, TEXTS["en" if english_language else "az"]["settings_title"],
+                                TEXTS["en" if english_language else "az"]["invalid_timezone"])
+            return
+        TIMEZONE = timezone
         DNS_SERVER = self.dns_input.text() or "8.8.8.8"
         PING_INTERVAL = self.ping_interval_spin.value()
         PING_TIMEOUT = self.ping_timeout_spin.value()
@@ -905,13 +1022,28 @@ class PingApp(QWidget):
         self.managed_alarms = []
         self.load_config()
 
-        self.ping_thread = PingThread(self.sound_manager)
+        self.ping_queue = ResultQueue()
+        self.rollups = RollupManager(key_func=target_key)  # 1 s / 1 min / 1 h rollups behind the longer graph ranges
+        self.ping_thread = PingThread(self.sound_manager, self.ping_queue, self.rollups)
         self.alarm_thread = AlarmThread(self.sound_manager)
 
-        # Data for graphing
-        self.ping_data = []
-        self.time_data = []
-        self.max_data_points = 60
+        # Data for graphing: fixed-size ring buffers of unix times and ms
+        self.max_data_points = GRAPH_HISTORY_POINTS
+        self.graph_span = 0  # Selected entry of GRAPH_SPANS
+        self.graph_mode = "line"  # Selected entry of GRAPH_MODES
+        self.last_rollup_draw = 0.0
+        self.graph_dirty = False  # New samples since the last live redraw
+        self.graph_follow = True  # False while the user has panned or zoomed the graph away from the latest data
+        self.browse_dirty = False  # The visible range changed since the last browse redraw
+        self.history_tiles = None  # TileCache over the recorded history, created when the user first browses
+        self.history_tiles_source = None
+        self.drawn_tiles_version = -1
+        self.last_stats_update = 0.0
+        self.ping_data = RingBuffer(self.max_data_points)
+        self.time_data = RingBuffer(self.max_data_points)
+        self.dns_data = RingBuffer(self.max_data_points)
+        self.dns_time_data = RingBuffer(self.max_data_points)
+        self.hop_series = {}  # ttl -> {"plot", "data", "time"} for path probing, created as hops answer
 
         self.init_ui()
         self.init_threads_and_timers()
@@ -1067,19 +1199,57 @@ class PingApp(QWidget):
         layout.setContentsMargins(15, 15, 15, 15)
         layout.setSpacing(15)
 
+        title_layout = QHBoxLayout()
         self.graph_title = QLabel(TEXTS["en" if english_language else "az"]["ping_graph_title"])
         self.graph_title.setFont(QFont("Segoe UI", 14, QFont.Bold))
         self.graph_title.setAlignment(Qt.AlignCenter)
         self.graph_title.setProperty("class", "panel-title")
-        layout.addWidget(self.graph_title)
-
-        self.graphWidget = pg.PlotWidget()
+        title_layout.addWidget(self.graph_title, 1)
+
+        # Longer ranges are drawn from rollups, so they cost the same as the live view
+        self.graph_span_combo = QComboBox()
+        self.graph_span_combo.addItems([self.graph_span_label(span) for span in GRAPH_SPANS])
+        self.graph_span_combo.currentIndexChanged.connect(self.change_graph_span)
+        title_layout.addWidget(self.graph_span_combo)
+        self.graph_mode_combo = QComboBox()
+        self.graph_mode_combo.addItems([TEXTS["en" if english_language else "az"][f"graph_mode_{mode}"]
+                                        for mode in GRAPH_MODES])
+        self.graph_mode_combo.currentIndexChanged.connect(self.change_graph_mode)
+        title_layout.addWidget(self.graph_mode_combo)
+        # Shown while the user browses history; jumps back to the selected range
+        self.graph_latest_btn = QPushButton(TEXTS["en" if english_language else "az"]["graph_latest"])
+        self.graph_latest_btn.clicked.connect(self.follow_latest)
+        self.graph_latest_btn.setVisible(False)
+        title_layout.addWidget(self.graph_latest_btn)
+        layout.addLayout(title_layout)
+
+        self.graphWidget = pg.PlotWidget(axisItems={'bottom': pg.DateAxisItem(orientation='bottom')})
         self.graphWidget.setBackground(COLORS['dark']['tertiary'] if dark_mode else COLORS['light']['tertiary'])
         self.plot = self.graphWidget.plot(pen=pg.mkPen(color=COLORS['dark']['accent_blue'] if dark_mode else COLORS['light']['accent_blue'], width=2))
+        self.dns_plot = self.graphWidget.plot(pen=pg.mkPen(color=COLORS['dark']['accent_orange'] if dark_mode else COLORS['light']['accent_orange'], width=2))
         self.graphWidget.setLabel('left', "Response Time (ms)")
         self.graphWidget.setLabel('bottom', "Time")
         self.graphWidget.showGrid(x=True, y=True)
         self.graphWidget.setYRange(0, 100)
+        # Drag and wheel pan and zoom through time; the Y axis follows the data
+        self.graphWidget.setMouseEnabled(x=True, y=False)
+        self.graphWidget.getViewBox().sigRangeChangedManually.connect(self.browse_graph)
+        if PATH_PROBE:
+            self.graphWidget.addLegend(offset=(-10, 10))
+
+        # Envelope mode: min-max band with the median on top
+        colors = COLORS['dark'] if dark_mode else COLORS['light']
+        self.envelope_fill = QGraphicsPathItem()
+        self.envelope_fill.setPen(pg.mkPen(None))
+        self.envelope_median = self.graphWidget.plot()
+        # Heatmap mode: share of each time column's probes per latency row
+        self.heatmap_image = pg.ImageItem(axisOrder="col-major")
+        self.heatmap_image.setLookupTable(self.heatmap_lookup_table())
+        self.heatmap_image.setZValue(-10)
+        for item in (self.envelope_fill, self.heatmap_image):
+            self.graphWidget.addItem(item)
+        self.style_graph_modes(colors)
+        self.show_graph_items()
 
         layout.addWidget(self.graphWidget)
         return panel
@@ -1103,13 +1273,24 @@ class PingApp(QWidget):
         self.connection_status.setFont(QFont("Segoe UI", 12))
         self.connection_status.setAlignment(Qt.AlignCenter)
 
-        self.ping_result_list = QListWidget()
+        self.latency_stats_label = QLabel(TEXTS["en" if english_language else "az"]["latency_stats_empty"])
+        self.latency_stats_label.setObjectName("LatencyStats")
+        self.latency_stats_label.setFont(QFont("Segoe UI", 10))
+        self.latency_stats_label.setAlignment(Qt.AlignCenter)
+
+        self.ping_log = PingLogModel(PING_LOG_RETENTION, self)
+        self.ping_result_list = QListView()
         self.ping_result_list.setObjectName("PingResultList")
         self.ping_result_list.setFont(QFont("Segoe UI", 10))  # Reduced font size for ping results
-        self.ping_result_list.setSpacing(4)
+        self.ping_result_list.setModel(self.ping_log)
+        self.ping_result_list.setItemDelegate(PingLogDelegate(self.ping_result_list))
+        self.ping_result_list.setUniformItemSizes(True)  # Row height is measured once, not per row
+        self.ping_result_list.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.ping_result_list.setMouseTracking(True)
 
         layout.addWidget(self.title_label)
         layout.addWidget(self.connection_status)
+        layout.addWidget(self.latency_stats_label)
         layout.addWidget(self.ping_result_list)
         return panel
 
@@ -1186,8 +1367,15 @@ class PingApp(QWidget):
                                 "The 'speedtest-cli' library is not installed.\nPlease install it via: pip install speedtest-cli")
             return
         dialog = SpeedTestDialog(self)
+        dialog.test_thread.test_finished.connect(self.record_speed_test)
         dialog.exec_()
 
+    def record_speed_test(self, download, upload):
+        """Keep finished speed tests in the probe history when its backend stores them"""
+        history = self.ping_thread.history
+        if hasattr(history, "add_speed_test"):
+            history.add_speed_test(download, upload)
+
 
     def init_threads_and_timers(self):
         """Initialize and start background threads and timers"""
@@ -1197,43 +1385,319 @@ class PingApp(QWidget):
         self.clock_timer.start(1000)
         self.update_clock()
 
-        # Ping thread signals
-        self.ping_thread.update_signal.connect(self.update_ping_display)
-        self.ping_thread.status_signal.connect(self.update_connection_status)
-        self.ping_thread.ping_result_signal.connect(self.update_ping_graph)
+        # Ping results are collected once per frame instead of one signal per probe
+        self.ping_refresh_timer = QTimer(self)
+        self.ping_refresh_timer.timeout.connect(self.flush_ping_results)
+        self.ping_refresh_timer.start(UI_REFRESH_MS)
+        self.graph_refresh_timer = QTimer(self)
+        self.graph_refresh_timer.timeout.connect(self.redraw_graph)
+        self.graph_refresh_timer.start(GRAPH_REFRESH_MS)
         self.ping_thread.start()
 
         # Alarm thread signals
         self.alarm_thread.alarm_signal.connect(self.on_alarm_ring)
         self.alarm_thread.start()
 
-    def update_ping_graph(self, response_time):
-        """Update ping response time graph with new data"""
-        now = time.time()
-
-        # Add new data point
-        self.ping_data.append(response_time)
-        self.time_data.append(now)
-
-        # Keep only recent data points
-        if len(self.ping_data) > self.max_data_points:
-            self.ping_data = self.ping_data[-self.max_data_points:]
-            self.time_data = self.time_data[-self.max_data_points:]
+    def flush_ping_results(self):
+        """Apply every probe result queued since the last frame in one go"""
+        records = self.ping_queue.drain()
+        if not records:
+            return
 
-        # Convert timestamps to relative seconds
-        if len(self.time_data) > 0:
-            relative_times = [t - self.time_data[0] for t in self.time_data]
+        status_class = None
+        samples = {"ping": [], "dns": []}
+        hop_samples = {}
+        rows = []
+        for record in records:
+            result = record.result
+            if record.series == "hop":
+                hop_samples.setdefault(result.target.ttl, []).append((result.timestamp, result.rtt, result.source))
+                continue
+            rows.append(record)
+            if record.is_primary and record.status_class:
+                status_class = record.status_class
+            if record.series and result.ok:
+                samples[record.series].append((result.timestamp, result.rtt))
+        scrollbar = self.ping_result_list.verticalScrollBar()
+        following = scrollbar.value() >= scrollbar.maximum()
+        dropped = self.ping_log.append(rows)
+        if following:
+            self.ping_result_list.scrollToBottom()
+        elif dropped:
+            # Keep the rows being read in place while the oldest ones are dropped above them
+            scrollbar.setValue(scrollbar.value() - dropped * self.ping_result_list.sizeHintForRow(0))
+
+        if status_class:
+            lang = "en" if english_language else "az"
+            status_key = "internet_good" if status_class == "status-good" else "internet_poor"
+            self.update_connection_status(TEXTS[lang][status_key], status_class)
+        if time.time() - self.last_stats_update >= 1.0:
+            self.update_latency_stats()
+        if samples["ping"] or samples["dns"] or hop_samples:
+            self.update_ping_graph(samples["ping"], samples["dns"], hop_samples)
+
+    def update_latency_stats(self):
+        """Show p50/p95/p99, jitter and loss of the primary target over the last LATENCY_STATS_WINDOW seconds"""
+        self.last_stats_update = time.time()
+        texts = TEXTS["en" if english_language else "az"]
+        stats = self.ping_thread.rollups.summary(self.ping_thread.primary_target, LATENCY_STATS_WINDOW)
+        if not stats.sent:
+            self.latency_stats_label.setText(texts["latency_stats_empty"])
+            return
+        values = [f"{value:.1f}" if value is not None else "–" for value in stats.quantiles() + [stats.jitter]]
+        self.latency_stats_label.setText(texts["latency_stats"].format(*values, stats.loss))
+
+    def add_hop_series(self, ttl, address):
+        """Create the graph curve for one hop of the path to DNS_SERVER"""
+        pen = pg.mkPen(color=pg.intColor(ttl - 1, hues=min(PATH_MAX_HOPS, 12)), width=1)
+        series = {"plot": self.graphWidget.plot(pen=pen, name=f"{ttl}: {address}"),
+                  "data": RingBuffer(self.max_data_points), "time": RingBuffer(self.max_data_points)}
+        self.hop_series[ttl] = series
+        return series
+
+    def update_ping_graph(self, samples, dns_samples=(), hop_samples=None):
+        """Add batches of (timestamp, ms) ping and DNS lookup samples to the graph history.
+
+        hop_samples maps a hop's ttl to (timestamp, ms, address) samples from
+        path probing. Nothing is drawn here; redraw_graph() picks the samples
+        up on its next tick.
+        """
+        for times, data, batch in ((self.time_data, self.ping_data, samples),
+                                   (self.dns_time_data, self.dns_data, dns_samples)):
+            if batch:
+                times.extend([timestamp for timestamp, _ in batch])
+                data.extend([response_time for _, response_time in batch])
+        for ttl, batch in (hop_samples or {}).items():
+            series = self.hop_series.get(ttl)
+            if series is None:
+                series = self.add_hop_series(ttl, batch[-1][2])
+                series["plot"].setVisible(self.graph_mode == "line" and not self.graph_span and self.graph_follow)
+            series["time"].extend([sample[0] for sample in batch])
+            series["data"].extend([sample[1] for sample in batch])
+        self.graph_dirty = True
+
+    def redraw_graph(self):
+        """Graph refresh tick: redraw only if something changed since the last one"""
+        if not self.graph_follow:
+            tiles_arrived = self.history_tiles is not None and self.history_tiles.version != self.drawn_tiles_version
+            if self.browse_dirty or tiles_arrived or time.time() - self.last_rollup_draw >= 1.0:
+                self.draw_browse_graph()
+        elif self.graph_span or self.graph_mode != "line":
+            if time.time() - self.last_rollup_draw >= 1.0:  # The finest rollup tier is one second
+                self.draw_rollup_graph()
+        elif self.graph_dirty:
+            self.draw_live_graph()
+
+    def browse_graph(self, *args):
+        """The user panned or zoomed: stop following the latest data and draw the visible range"""
+        if self.graph_follow:
+            self.graph_follow = False
+            self.graph_latest_btn.setVisible(True)
+            self.show_graph_items()
+        self.browse_dirty = True
+
+    def follow_latest(self):
+        """Leave history browsing and show the selected range up to now again"""
+        self.graph_follow = True
+        self.graph_latest_btn.setVisible(False)
+        self.change_graph_span(self.graph_span_combo.currentIndex())
+
+    def graph_history(self):
+        """TileCache over the recorded history for browsing, or None when history recording is off"""
+        if not HISTORY_DIR:
+            return None
+        source = (HISTORY_DIR, HISTORY_BACKEND)
+        if self.history_tiles is None or self.history_tiles_source != source:
+            if self.history_tiles is not None:
+                self.history_tiles.close()
+            self.history_tiles = TileCache(open_history(HISTORY_DIR, HISTORY_BACKEND))
+            self.history_tiles_source = source
+        return self.history_tiles
+
+    def draw_browse_graph(self):
+        """Draw the range the user panned or zoomed to, from history tiles at a matching level of detail"""
+        self.browse_dirty = False
+        self.last_rollup_draw = time.time()
+        start, end = self.graphWidget.viewRange()[0]
+        history = self.graph_history()
+        if self.graph_mode == "heatmap":
+            self.draw_heatmap(start, end)  # Needs the rollup sketches, which cover 90 days
+            return
+        if history is None:
+            # Without recorded history the rollups are all there is
+            if self.graph_mode == "envelope":
+                self.draw_envelope(start, end)
+            else:
+                self.draw_rollup_lines(start, end)
+            return
 
-            # Update plot
-            self.plot.setData(relative_times, self.ping_data)
+        self.drawn_tiles_version = history.version
+        width = tile_width(end - start, self.graph_pixels())
+        values = []
+        if self.graph_mode == "envelope":
+            data = history.series(target_key(self.ping_thread.primary_target), start, end, width)
+            self.envelope_fill.setPath(envelope_path(data["time"], data["min"], data["max"]))
+            self.envelope_median.setData(data["time"], data["median"], connect="finite")
+            values += [data["min"], data["max"]]
+        else:
+            for plot, target in ((self.plot, self.ping_thread.primary_target),
+                                 (self.dns_plot, self.ping_thread.dns_target)):
+                if target is None:
+                    plot.setData([], [])
+                    continue
+                data = history.series(target_key(target), start, end, width)
+                # A vertical stroke from min to max per bucket keeps every spike visible
+                plot.setData(np.repeat(data["time"], 2), np.column_stack((data["min"], data["max"])).ravel(),
+                             connect="finite")
+                values += [data["min"], data["max"]]
+        values = np.concatenate(values) if values else np.empty(0)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.graphWidget.setYRange(max(0, values.min() - 5), max(100, values.max() + 5))
+
+    def graph_pixels(self):
+        """Width of the plot area in pixels, the most points worth drawing across it"""
+        return max(1, int(self.graphWidget.getPlotItem().getViewBox().width()))
+
+    def draw_live_graph(self):
+        """Draw the buffered samples, clipped to the view and reduced to min/max per pixel"""
+        self.graph_dirty = False
+        curves = [(self.plot, self.time_data, self.ping_data), (self.dns_plot, self.dns_time_data, self.dns_data)]
+        curves += [(series["plot"], series["time"], series["data"]) for series in self.hop_series.values()]
+        curves = [(plot, times.view(), data.view()) for plot, times, data in curves if len(times)]
+        if not curves:
+            return
 
-            # Auto-scale Y axis
-            min_y = max(0, min(self.ping_data) - 5)
-            max_y = max(100, max(self.ping_data) + 5)
-            self.graphWidget.setYRange(min_y, max_y)
+        # Show the buffered window, at least a minute wide
+        start = min(times[0] for _, times, _ in curves)
+        end = max(max(times[-1] for _, times, _ in curves) + 5, start + 60)
+        pixels = self.graph_pixels()
+        low, high = [], []
+        for plot, times, data in curves:
+            first, last = visible_slice(times, start, end)
+            times, data = peak_downsample(times[first:last], data[first:last], start, end, pixels)
+            plot.setData(times, data)
+            if len(data):
+                low.append(data.min())
+                high.append(data.max())
+
+        # Auto-scale Y axis
+        if low:
+            self.graphWidget.setYRange(max(0, min(low) - 5), max(100, max(high) + 5))
+        self.graphWidget.setXRange(start, end)
+
+    def draw_rollup_graph(self):
+        """Draw the selected range from the rollup tier that fits it, at most a few thousand points"""
+        self.last_rollup_draw = end = time.time()
+        start = end - (self.graph_span or ROLLUP_LIVE_SPAN)
+        if self.graph_mode == "envelope":
+            self.draw_envelope(start, end)
+        elif self.graph_mode == "heatmap":
+            self.draw_heatmap(start, end)
+        else:
+            self.draw_rollup_lines(start, end)
+        self.graphWidget.setXRange(start, end)
+
+    def draw_rollup_lines(self, start, end):
+        """Mean RTT per rollup bucket of the server and the DNS lookups"""
+        values = []
+        for plot, target in ((self.plot, self.ping_thread.primary_target), (self.dns_plot, self.ping_thread.dns_target)):
+            data = self.ping_thread.rollups.series(target, start, end) if target else None
+            if data is None or not len(data["time"]):
+                plot.setData([], [])
+                continue
+            # Buckets where every probe was lost have no mean and leave a gap
+            times, means = peak_downsample(data["time"] + data["width"] / 2, data["mean"], start, end,
+                                           self.graph_pixels())
+            plot.setData(times, means, connect="finite")
+            values.append(means[~np.isnan(means)])
+        values = np.concatenate(values) if values else np.empty(0)
+        if len(values):
+            self.graphWidget.setYRange(max(0, values.min() - 5), max(100, values.max() + 5))
+
+    def draw_envelope(self, start, end):
+        """Min-max band and median of the server's RTT per rollup bucket"""
+        data = self.ping_thread.rollups.series(self.ping_thread.primary_target, start, end, quantiles=(0.5,),
+                                               max_points=self.graph_pixels())
+        if data is None or not len(data["time"]):
+            self.envelope_fill.setPath(QPainterPath())
+            self.envelope_median.setData([], [])
+            return
+        times = data["time"] + data["width"] / 2
+        self.envelope_fill.setPath(envelope_path(times, data["min"], data["max"]))
+        self.envelope_median.setData(times, data["p50"], connect="finite")
+        answered = ~np.isnan(data["min"])
+        if answered.any():
+            self.graphWidget.setYRange(max(0, data["min"][answered].min() - 5),
+                                       max(100, data["max"][answered].max() + 5))
+
+    def draw_heatmap(self, start, end):
+        """How the server's RTTs are spread over latency, per time column, as an image"""
+        rollups = self.ping_thread.rollups
+        target = self.ping_thread.primary_target
+        # Rows reach a little above the 99th percentile so one outlier does not squash the picture
+        p99 = rollups.summary(target, end - start, end).quantile(0.99)
+        top = max(100.0, (p99 or 0.0) * 1.25)
+        image = rollups.heatmap(target, start, end, np.linspace(0.0, top, HEATMAP_ROWS + 1), self.graph_pixels())
+        if image is None:
+            return
+        totals = image.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shares = np.where(totals > 0, image / totals, 0.0)
+        self.heatmap_image.setImage(shares, levels=(0.0, max(shares.max(), 1e-9)))
+        self.heatmap_image.setRect(QRectF(start, 0.0, end - start, top))
+        self.graphWidget.setYRange(0, top)
+
+    def heatmap_lookup_table(self):
+        """Viridis colors, with the lowest level transparent so empty cells show the background"""
+        table = pg.colormap.get("viridis").getLookupTable(nPts=256, alpha=True)
+        table[0, 3] = 0
+        return table
+
+    def style_graph_modes(self, colors):
+        """Theme colors of the envelope items"""
+        band = QColor(colors['accent_blue'])
+        band.setAlpha(70)
+        self.envelope_fill.setBrush(pg.mkBrush(band))
+        self.envelope_median.setPen(pg.mkPen(color=colors['accent_blue'], width=2))
+
+    def show_graph_items(self):
+        """Show the plot items used by the current graph mode and range, hide the rest"""
+        mode = self.graph_mode
+        self.plot.setVisible(mode == "line")
+        self.dns_plot.setVisible(mode == "line")
+        for series in self.hop_series.values():
+            series["plot"].setVisible(mode == "line" and not self.graph_span and self.graph_follow)
+        for item in (self.envelope_fill, self.envelope_median):
+            item.setVisible(mode == "envelope")
+        self.heatmap_image.setVisible(mode == "heatmap")
+
+    def graph_span_label(self, span):
+        """Localized name of a GRAPH_SPANS entry"""
+        texts = TEXTS["en" if english_language else "az"]
+        if not span:
+            return texts["graph_live"]
+        if span < 3600:
+            return texts["span_minutes"].format(span // 60)
+        if span < 86400:
+            return texts["span_hours"].format(span // 3600)
+        return texts["span_days"].format(span // 86400)
+
+    def change_graph_span(self, index):
+        """Switch the graph between live samples and a rollup range"""
+        self.graph_span = GRAPH_SPANS[index]
+        self.show_graph_items()
+        if not self.graph_follow:
+            self.draw_browse_graph()
+        elif self.graph_span or self.graph_mode != "line":
+            self.draw_rollup_graph()
+        else:
+            self.draw_live_graph()
 
-            # Set X axis range
-            self.graphWidget.setXRange(0, max(60, relative_times[-1] + 5))
+    def change_graph_mode(self, index):
+        """Switch between the line, envelope and heatmap graphs"""
+        self.graph_mode = GRAPH_MODES[index]
+        self.change_graph_span(self.graph_span_combo.currentIndex())
 
     def create_tray_icon(self):
         """Create system tray icon"""
@@ -1279,11 +1743,17 @@ class PingApp(QWidget):
         self.save_alarms_data()
         self.ping_thread.stop()
         self.alarm_thread.stop()
+        if self.history_tiles is not None:
+            self.history_tiles.close()
+        self.sound_manager.close()
         self.tray_icon.hide()
 
     def load_config(self):
         """Load settings from config file"""
-        global DNS_SERVER, PING_TIMEOUT, PING_INTERVAL, dark_mode, english_language
+        global DNS_SERVER, PING_TIMEOUT, PING_INTERVAL, PING_PIPELINE, DNS_PROBE_NAMES, PING_TARGETS, PATH_PROBE, PATH_MAX_HOPS
+        global PING_ADAPTIVE, PING_BURST_INTERVAL, PING_BUDGET, GRAPH_HISTORY_POINTS, HISTORY_DIR, HISTORY_RETENTION_DAYS
+        global PING_LOG_RETENTION, HISTORY_BACKEND, TIMEZONE, SOUND_REPEAT_INTERVAL
+        global dark_mode, english_language
         try:
             if os.path.exists(CONFIG_FILE):
                 with open(CONFIG_FILE, 'r') as f:
@@ -1291,10 +1761,31 @@ class PingApp(QWidget):
                 DNS_SERVER = config.get('dns_server', DNS_SERVER)
                 PING_TIMEOUT = config.get('ping_timeout', PING_TIMEOUT)
                 PING_INTERVAL = config.get('ping_interval', PING_INTERVAL)
+                PING_PIPELINE = config.get('ping_pipeline', PING_PIPELINE)
+                PING_ADAPTIVE = config.get('ping_adaptive', PING_ADAPTIVE)
+                PING_BURST_INTERVAL = config.get('ping_burst_interval', PING_BURST_INTERVAL)
+                PING_BUDGET = config.get('ping_budget', PING_BUDGET)
+                DNS_PROBE_NAMES = config.get('dns_probe_names', DNS_PROBE_NAMES)
+                PING_TARGETS = config.get('ping_targets', PING_TARGETS)
+                PATH_PROBE = config.get('path_probe', PATH_PROBE)
+                PATH_MAX_HOPS = config.get('path_max_hops', PATH_MAX_HOPS)
+                GRAPH_HISTORY_POINTS = config.get('graph_history_points', GRAPH_HISTORY_POINTS)
+                PING_LOG_RETENTION = config.get('ping_log_retention', PING_LOG_RETENTION)
+                HISTORY_DIR = config.get('history_dir', HISTORY_DIR)
+                HISTORY_RETENTION_DAYS = config.get('history_retention_days', HISTORY_RETENTION_DAYS)
+                HISTORY_BACKEND = config.get('history_backend', HISTORY_BACKEND)
+                TIMEZONE = config.get('timezone', TIMEZONE)
+                try:
+                    get_timezone(TIMEZONE)
+                except ValueError as e:
+                    print(f"{e} The clock and alarms follow local time.")
+                    TIMEZONE = "local"
                 dark_mode = config.get('dark_mode', dark_mode)
                 english_language = config.get('english_language', english_language)
                 self.sound_manager.error_sound = config.get('error_sound_file', ERROR_SOUND_FILE)
                 self.sound_manager.alarm_sound = config.get('alarm_sound_file', ALARM_SOUND_FILE)
+                SOUND_REPEAT_INTERVAL = config.get('sound_repeat_interval', SOUND_REPEAT_INTERVAL)
+                self.sound_manager.repeat_interval = SOUND_REPEAT_INTERVAL
         except Exception as e:
             print(f"Error loading config: {e}")
 
@@ -1304,10 +1795,25 @@ class PingApp(QWidget):
             'dns_server': DNS_SERVER,
             'ping_timeout': PING_TIMEOUT,
             'ping_interval': PING_INTERVAL,
+            'ping_pipeline': PING_PIPELINE,
+            'ping_adaptive': PING_ADAPTIVE,
+            'ping_burst_interval': PING_BURST_INTERVAL,
+            'ping_budget': PING_BUDGET,
+            'dns_probe_names': DNS_PROBE_NAMES,
+            'ping_targets': PING_TARGETS,
+            'path_probe': PATH_PROBE,
+            'path_max_hops': PATH_MAX_HOPS,
+            'graph_history_points': GRAPH_HISTORY_POINTS,
+            'ping_log_retention': PING_LOG_RETENTION,
+            'history_dir': HISTORY_DIR,
+            'history_retention_days': HISTORY_RETENTION_DAYS,
+            'history_backend': HISTORY_BACKEND,
+            'timezone': TIMEZONE,
             'dark_mode': dark_mode,
             'english_language': english_language,
             'error_sound_file': self.sound_manager.error_sound,
             'alarm_sound_file': self.sound_manager.alarm_sound,
+            'sound_repeat_interval': SOUND_REPEAT_INTERVAL,
         }
         try:
             with open(CONFIG_FILE, 'w') as f:
@@ -1381,11 +1887,10 @@ class PingApp(QWidget):
         self.apply_theme()
         # Restart ping thread with new settings
         self.ping_thread.stop()
-        self.ping_thread = PingThread(self.sound_manager)
-        self.ping_thread.update_signal.connect(self.update_ping_display)
-        self.ping_thread.status_signal.connect(self.update_connection_status)
-        self.ping_thread.ping_result_signal.connect(self.update_ping_graph)
+        self.ping_thread = PingThread(self.sound_manager, self.ping_queue, self.rollups)
         self.ping_thread.start()
+        self.reschedule_all_alarms()  # The timezone may have changed
+        self.update_clock()
         self.save_config()
 
     def update_texts(self, lang=None):
@@ -1398,6 +1903,8 @@ class PingApp(QWidget):
         # Ping panel
         self.title_label.setText(TEXTS[lang]["ping_monitor_title"])
         self.connection_status.setText(TEXTS[lang]["searching"])
+        self.update_latency_stats()
+        self.ping_result_list.viewport().update()  # Rows are formatted when painted, in the new language
 
         # Alarm panel
         self.daily_alarms_title.setText(TEXTS[lang]["alarm_management"])
@@ -1411,6 +1918,11 @@ class PingApp(QWidget):
         # Graph panel title
         if hasattr(self, 'graph_title'):
             self.graph_title.setText(TEXTS[lang]["ping_graph_title"])
+            for index, span in enumerate(GRAPH_SPANS):
+                self.graph_span_combo.setItemText(index, self.graph_span_label(span))
+            for index, mode in enumerate(GRAPH_MODES):
+                self.graph_mode_combo.setItemText(index, TEXTS[lang][f"graph_mode_{mode}"])
+            self.graph_latest_btn.setText(TEXTS[lang]["graph_latest"])
 
         # Menu bar
         if self.layout() and self.layout().menuBar():
@@ -1454,8 +1966,8 @@ class PingApp(QWidget):
                 margin-bottom: 10px;
             }}
 
-            /* List widgets */
-            QListWidget {{
+            /* List views */
+            QListView {{
                 background-color: {colors['tertiary']};
                 border: 1px solid {colors['border']};
                 border-radius: 8px;
@@ -1463,31 +1975,20 @@ class PingApp(QWidget):
                 outline: 0;
             }}
 
-            QListWidget::item {{
+            QListView::item {{
                 padding: 8px;
                 border-radius: 4px;
             }}
 
-            QListWidget::item:hover {{
+            QListView::item:hover {{
                 background-color: {colors['hover']};
             }}
 
-            QListWidget::item:selected {{
+            QListView::item:selected {{
                 background-color: {colors['accent_blue']};
                 color: white;
             }}
 
-            /* Ping result list specific */
-            #PingResultList::item[success="true"] {{
-                background-color: {colors['success_bg']};
-                color: {colors['accent_green']};
-            }}
-
-            #PingResultList::item[success="false"] {{
-                background-color: {colors['error_bg']};
-                color: {colors['accent_red']};
-            }}
-
             /* Connection status labels */
             #ConnectionStatus.status-good {{
                 color: {colors['accent_green']};
@@ -1498,6 +1999,10 @@ class PingApp(QWidget):
                 font-weight: bold;
             }}
 
+            #LatencyStats {{
+                color: {colors['text_secondary']};
+            }}
+
             /* Alarm status */
             #AlarmStatus[ringing="true"] {{
                 color: {colors['accent_red']};
@@ -1616,15 +2121,15 @@ class PingApp(QWidget):
         if hasattr(self, 'graphWidget'):
             self.graphWidget.setBackground(colors['tertiary'])
             self.plot.setPen(pg.mkPen(color=colors['accent_blue'], width=2))
+            self.dns_plot.setPen(pg.mkPen(color=colors['accent_orange'], width=2))
+            self.style_graph_modes(colors)
             self.graphWidget.getAxis('bottom').setPen(pg.mkPen(color=colors['text_muted']))
             self.graphWidget.getAxis('left').setPen(pg.mkPen(color=colors['text_muted']))
 
     def update_clock(self):
         """Update clock display with current time"""
         try:
-            # Azerbaijan timezone (UTC+4)
-            timezone = pytz.timezone('Asia/Baku')
-            current_time = datetime.now(timezone)
+            current_time = datetime.now(get_timezone(TIMEZONE))  # Cached lookup; None gives local time
 
             # Update time
             time_str = current_time.strftime("%H:%M:%S")
@@ -1642,19 +2147,6 @@ class PingApp(QWidget):
             self.current_time_label.setText(datetime.now().strftime("%H:%M:%S"))
             self.current_date_label.setText(datetime.now().strftime('%d %B %Y, %A'))
 
-    def update_ping_display(self, message, is_success):
-        """Add new ping result to display"""
-        item = QListWidgetItem(message)
-        item.setData(Qt.UserRole + 1, "true" if is_success else "false")
-
-        if is_success:
-            item.setForeground(QColor(COLORS['dark']['accent_green'] if dark_mode else COLORS['light']['accent_green']))
-        else:
-            item.setForeground(QColor(COLORS['dark']['accent_red'] if dark_mode else COLORS['light']['accent_red']))
-
-        self.ping_result_list.addItem(item)
-        self.ping_result_list.scrollToBottom()
-
     def update_connection_status(self, message, css_class):
         """Update connection status label"""
         self.connection_status.setText(message)
@@ -1719,13 +2211,24 @@ class PingApp(QWidget):
         time_edit.setFont(QFont("Segoe UI", 24))
         ok_button = QPushButton(TEXTS["en" if english_language else "az"]["ok"])
         ok_button.clicked.connect(time_dialog.accept)
+        # Weekday mask; leaving every day ticked keeps a plain daily alarm
+        day_layout = QHBoxLayout()
+        day_checks = []
+        for day_name in TEXTS["en" if english_language else "az"]["weekdays_short"]:
+            check = QCheckBox(day_name)
+            check.setChecked(True)
+            day_checks.append(check)
+            day_layout.addWidget(check)
         time_layout.addWidget(QLabel(TEXTS["en" if english_language else "az"]["select_time"]))
         time_layout.addWidget(time_edit)
+        time_layout.addWidget(QLabel(TEXTS["en" if english_language else "az"]["repeat_days"]))
+        time_layout.addLayout(day_layout)
         time_layout.addWidget(ok_button)
 
         if time_dialog.exec_() == QDialog.Accepted:
             selected_time = time_edit.time()
-            new_alarm = Alarm(selected_time.hour(), selected_time.minute(), True, text)
+            days = [day for day, check in enumerate(day_checks) if check.isChecked()] or None
+            new_alarm = Alarm(selected_time.hour(), selected_time.minute(), True, text, days=days)
 
             if new_alarm not in self.managed_alarms:
                 self.managed_alarms.append(new_alarm)
@@ -1773,18 +2276,12 @@ class PingApp(QWidget):
             self.reschedule_all_alarms()
 
     def reschedule_all_alarms(self):
-        """Recalculate alarm timestamps"""
-        global active_alarm_timestamps
-        active_alarm_timestamps.clear()
-        now = datetime.now()
-        for alarm in self.managed_alarms:
-            if alarm.enabled:
-                alarm_dt_today = now.replace(hour=alarm.hour, minute=alarm.minute, second=0, microsecond=0)
-                if alarm_dt_today <= now:
-                    alarm_dt_today += timedelta(days=1)
-                active_alarm_timestamps.append(alarm_dt_today.timestamp())
-
-        active_alarm_timestamps.sort()
+        """Hand the current alarms to the alarm thread, which wakes to recompute its next deadline"""
+        try:
+            self.alarm_thread.monitor.schedule(self.managed_alarms, timezone=TIMEZONE)
+        except ValueError as e:
+            print(f"{e} Alarms follow local time.")
+            self.alarm_thread.monitor.schedule(self.managed_alarms)
 if __name__ == "__main__":
     app = QApplication(sys.argv)
 
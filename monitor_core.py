@@ -0,0 +1,398 @@
+"""Qt-free monitoring core shared by the desktop app and the headless daemon"""
+import heapq
+import json
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+
+from probe_engine import ProbeEngine, ThreadedProbeBackend
+from icmp_backend import IcmpSocketBackend
+from ping_stream import StreamingPingBackend
+from dns_probe import DnsProbeBackend
+from path_probe import HopProbeBackend
+from adaptive_rate import AdaptiveRateController
+from audio_engine import AudioEngine
+from alarm_rules import parse_days, parse_date, parse_cron, format_days, next_daily_time, get_timezone
+
+# Conditional imports for platform-specific features
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+try:
+    import ping3
+except ImportError:
+    ping3 = None
+    print("Warning: 'ping3' library not found. Falling back to subprocess ping.")
+
+ERROR_SOUND_FILE = "error.wav"
+ALARM_SOUND_FILE = "alarm.wav"
+PING_SOUND_FILE = "ping.wav"
+SOUND_PRIORITIES = {"alarm": 0, "error": 1, "ping": 2}  # Lower plays first and cuts short higher
+DEFAULT_SOUND_REPEAT_INTERVAL = 3.0  # Least seconds between two error (or ping) sounds
+ALARM_GRACE = 60.0       # Seconds after its deadline that an alarm still rings, e.g. after the machine wakes up
+MAX_ALARM_SLEEP = 60.0   # Longest sleep between deadline checks, so wall clock changes are noticed
+DEFAULT_TIMEZONE = "Asia/Baku"  # IANA zone of alarms without their own; "local" uses the system's
+
+
+def load_config_file(path):
+    """Read a JSON config file, returning an empty dict if it does not exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Alarm:
+    """Represents a single alarm with time, status and name.
+
+    By default it rings every day at hour:minute. days limits it to some
+    weekdays (Monday = 0), interval repeats it every that many minutes from
+    hour:minute until midnight, on_date makes it ring once on that date, and
+    cron replaces all of these with a five-field cron expression. timezone
+    names the IANA zone whose clock it follows; without one it follows the
+    scheduler's zone.
+    """
+    def __init__(self, hour, minute, enabled=True, name="Alarm", days=None, interval=None, on_date=None, cron=None,
+                 timezone=None):
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError("Invalid hour or minute for alarm.")
+        if interval is not None and not (isinstance(interval, int) and 1 <= interval < 1440):
+            raise ValueError("Invalid repeat interval for alarm.")
+        self.hour = hour
+        self.minute = minute
+        self.enabled = enabled
+        self.name = name
+        self.days = parse_days(days)
+        self.interval = interval or None
+        self.on_date = parse_date(on_date)
+        self.cron = parse_cron(" ".join(cron.split())) if cron else None
+        self.timezone = timezone or None
+        get_timezone(self.timezone)  # Unknown names raise ValueError here rather than when scheduling
+
+    def next_time(self, after, tz=None):
+        """Unix time of the first occurrence strictly after the unix time `after`, or None if there is none.
+
+        tz is the scheduler's zone (None: local time), used unless the alarm has its own.
+        """
+        if self.timezone:
+            tz = get_timezone(self.timezone)
+        if self.cron:
+            return self.cron.next_time(after, tz)
+        return next_daily_time(after, self.hour, self.minute, self.days, self.interval, self.on_date, tz)
+
+    def to_dict(self):
+        """Serialize alarm to dictionary for saving; rule keys are only written when set"""
+        data = {
+            "hour": self.hour,
+            "minute": self.minute,
+            "enabled": self.enabled,
+            "name": self.name
+        }
+        if self.days is not None:
+            data["days"] = sorted(self.days)
+        if self.interval:
+            data["interval"] = self.interval
+        if self.on_date:
+            data["date"] = self.on_date.isoformat()
+        if self.cron:
+            data["cron"] = self.cron.expression
+        if self.timezone:
+            data["timezone"] = self.timezone
+        return data
+
+    @staticmethod
+    def from_dict(data):
+        """Create Alarm object from dictionary"""
+        return Alarm(data.get("hour", 0), data.get("minute", 0),
+                   data.get("enabled", True), data.get("name", "Alarm"),
+                   data.get("days"), data.get("interval"), data.get("date"), data.get("cron"),
+                   data.get("timezone"))
+
+    def _rule(self):
+        return (self.hour, self.minute, self.days, self.interval, self.on_date,
+                self.cron.expression if self.cron else None, self.timezone)
+
+    def __eq__(self, other):
+        """Compare alarms by schedule and name"""
+        if not isinstance(other, Alarm):
+            return NotImplemented
+        return self._rule() == other._rule() and self.name == other.name
+
+    def __hash__(self):
+        """Hash for set operations"""
+        return hash((self._rule(), self.name))
+
+    def __str__(self):
+        """String representation for display"""
+        status = " (Enabled)" if self.enabled else " (Disabled)"
+        if self.cron:
+            when = f"cron {self.cron.expression}"
+        else:
+            when = f"{self.hour:02d}:{self.minute:02d}"
+            if self.interval:
+                when += f" every {self.interval} min"
+            if self.on_date:
+                when += f" on {self.on_date.isoformat()}"
+            elif self.days is not None:
+                when += f" {format_days(self.days)}"
+        if self.timezone:
+            when += f" ({self.timezone})"
+        return f"{when} - {self.name}{status}"
+
+def ping_host(host, timeout=1):
+    """Ping a host and return response time in ms or None if failed"""
+    if ping3:
+        try:
+            response = ping3.ping(host, timeout=timeout, unit='ms')
+            if isinstance(response, (int, float)) and response > 0:
+                return response
+        except Exception:
+            pass
+
+    # Fallback to subprocess ping
+    try:
+        param = '-n' if platform.system().lower() == 'windows' else '-c'
+        timeout_param = '-w' if platform.system().lower() == 'windows' else '-W'
+        timeout_val = int(timeout * 1000) if platform.system().lower() == 'windows' else int(timeout)
+        command = ['ping', param, '1', timeout_param, str(timeout_val), host]
+
+        result = subprocess.run(command, capture_output=True, text=True, check=False)
+
+        if result.returncode == 0:
+            if platform.system().lower() == "windows":
+                match = re.search(r'time[=<](\d+\.?\d*)ms', result.stdout)
+            else:
+                match = re.search(r'time=(\d+\.?\d*)\s*ms', result.stdout)
+
+            if match:
+                return float(match.group(1))
+            return 1.0
+        else:
+            return None
+    except Exception:
+        return None
+
+
+class SoundManager:
+    """Plays sound effects through one AudioEngine; every sound is decoded once when it is set.
+
+    Error and ping sounds asked for within repeat_interval seconds of the
+    last one are coalesced into it, so a long outage does not queue a sound
+    per failed probe. The alarm takes precedence over both.
+    """
+    def __init__(self, engine=None, repeat_interval=DEFAULT_SOUND_REPEAT_INTERVAL):
+        self.engine = engine or AudioEngine()
+        self.repeat_interval = repeat_interval
+        self._files = {}
+        self.error_sound = ERROR_SOUND_FILE
+        self.alarm_sound = ALARM_SOUND_FILE
+        self.ping_sound = PING_SOUND_FILE
+
+    def _set_sound(self, sound_type, path):
+        self._files[sound_type] = path
+        self.engine.load(sound_type, path)
+
+    @property
+    def error_sound(self): return self._files["error"]
+    @error_sound.setter
+    def error_sound(self, value): self._set_sound("error", value)
+
+    @property
+    def alarm_sound(self): return self._files["alarm"]
+    @alarm_sound.setter
+    def alarm_sound(self, value): self._set_sound("alarm", value)
+
+    @property
+    def ping_sound(self): return self._files["ping"]
+    @ping_sound.setter
+    def ping_sound(self, value): self._set_sound("ping", value)
+
+    def play(self, sound_type):
+        """Queue a sound by type ("error", "alarm" or "ping"); the alarm repeats until stop_alarm()"""
+        if not self.engine.loaded(sound_type) and winsound:
+            winsound.PlaySound("SystemAsterisk", winsound.SND_ALIAS | winsound.SND_ASYNC)
+            return
+        alarm = sound_type == "alarm"
+        self.engine.play(sound_type, loop=alarm, priority=SOUND_PRIORITIES.get(sound_type, len(SOUND_PRIORITIES)),
+                         spacing=0 if alarm else self.repeat_interval)
+
+    def stop_alarm(self):
+        """Stop the looping alarm sound"""
+        self.engine.stop_loop()
+
+    def close(self):
+        self.engine.close()
+
+
+def create_icmp_backend():
+    """Prefer one shared ICMP socket, then long-running ping processes, then ping_host"""
+    try:
+        return IcmpSocketBackend()
+    except OSError as e:
+        print(f"ICMP sockets unavailable ({e}). Falling back to streaming ping processes.")
+    try:
+        return StreamingPingBackend()
+    except OSError as e:
+        print(f"Streaming ping unavailable ({e}). Falling back to ping3/subprocess ping.")
+        return ThreadedProbeBackend(ping_host)
+
+
+def create_probe_engine():
+    """ProbeEngine with backends for ICMP, DNS and, when ICMP sockets are allowed, hop targets.
+
+    Targets marked adaptive get their probe rate managed by an AdaptiveRateController.
+    """
+    engine = ProbeEngine()
+    AdaptiveRateController().attach(engine)
+    engine.register_backend(create_icmp_backend())
+    engine.register_backend(DnsProbeBackend())
+    try:
+        engine.register_backend(HopProbeBackend())
+    except OSError as e:
+        print(f"Path probing unavailable ({e}).")
+    return engine
+
+
+class ConnectionTracker:
+    """Counts consecutive failures per target to decide when a connection is poor"""
+    def __init__(self, targets, max_errors_before_alert=3):
+        now = time.time()
+        self.max_errors_before_alert = max_errors_before_alert
+        self.last_success_time = {target: now for target in targets}
+        self.consecutive_errors = {target: 0 for target in targets}
+
+    def update(self, result):
+        """Record a result; return (seconds since last success, whether to alert)"""
+        target = result.target
+        now = time.time()
+        if result.ok:
+            self.consecutive_errors[target] = 0
+            self.last_success_time[target] = now
+        else:
+            self.consecutive_errors[target] = self.consecutive_errors.get(target, 0) + 1
+        since_success = now - self.last_success_time.setdefault(target, now)
+        return since_success, self.consecutive_errors[target] >= self.max_errors_before_alert
+
+
+class SystemClock:
+    """Real time for AlarmMonitor"""
+    max_sleep = MAX_ALARM_SLEEP  # The wall clock can be changed while the monitor sleeps
+
+    def time(self):
+        return time.time()
+
+    def wait(self, condition, timeout):
+        """Block on condition (held by the caller) for up to timeout seconds"""
+        condition.wait(timeout)
+
+
+class SimulatedClock:
+    """Virtual time for running AlarmMonitor through days or years at full speed.
+
+    wait() returns at once with the time moved on by the whole timeout, as
+    if nothing had woken the sleeper early. Once the time reaches `until`,
+    on_end is called (typically the monitor's stop).
+    """
+    max_sleep = None  # Nothing changes simulated time behind the monitor's back
+
+    def __init__(self, start, until=None, on_end=None):
+        self.now = start
+        self.until = until
+        self.on_end = on_end
+
+    def time(self):
+        return self.now
+
+    def wait(self, condition, timeout):
+        self.now += timeout
+        if self.until is not None and self.now >= self.until and self.on_end:
+            self.on_end()
+
+
+class AlarmMonitor:
+    """Rings alarms at their next-fire times; the Qt-free core of AlarmThread.
+
+    Deadlines are kept in a min-heap, and run() sleeps until the earliest
+    one instead of polling, so a quiet evening costs a wakeup a minute
+    however many alarms there are. schedule() replaces the alarms and wakes
+    the loop at once. on_ring is called with the list of alarms that are due
+    together. timezone is the IANA zone for alarms without their own (None
+    or "local": the system's), and clock can be a SimulatedClock.
+    """
+    def __init__(self, alarms, on_ring, timezone=None, clock=None):
+        self.on_ring = on_ring
+        self.clock = clock or SystemClock()
+        self._heap = []  # (next-fire unix time, position, Alarm)
+        self._tz = None
+        self._changed = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self.schedule(alarms, timezone=timezone)
+
+    def schedule(self, alarms, now=None, timezone=None):
+        """Replace the scheduled alarms with the enabled ones among alarms, in the given default timezone"""
+        now = self.clock.time() if now is None else now
+        tz = get_timezone(timezone)
+        heap = [(alarm.next_time(now, tz), position, alarm) for position, alarm in enumerate(alarms) if alarm.enabled]
+        heap = [entry for entry in heap if entry[0] is not None]  # One-shot alarms that have passed
+        heapq.heapify(heap)
+        with self._condition:
+            self._heap = heap
+            self._tz = tz
+            self._changed = True
+            self._condition.notify()
+
+    @property
+    def next_deadline(self):
+        """Unix time of the earliest scheduled alarm, or None"""
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def check(self, now=None):
+        """Ring the alarms whose deadline has come and move each to its next occurrence.
+
+        Alarms more than ALARM_GRACE seconds overdue are skipped silently.
+        Returns the next deadline, or None if nothing is scheduled.
+        """
+        now = self.clock.time() if now is None else now
+        due = []
+        with self._condition:
+            self._changed = False
+            while self._heap and self._heap[0][0] <= now:
+                deadline, position, alarm = self._heap[0]
+                if now - deadline < ALARM_GRACE:
+                    due.append(alarm)
+                deadline = alarm.next_time(now, self._tz)
+                if deadline is None:
+                    heapq.heappop(self._heap)
+                else:
+                    heapq.heapreplace(self._heap, (deadline, position, alarm))
+            deadline = self._heap[0][0] if self._heap else None
+        if due:
+            self.on_ring(due)
+        return deadline
+
+    def run(self):
+        """Sleep until the next deadline or schedule(), ring what is due, until stop() is called"""
+        while True:
+            deadline = self.check()
+            with self._condition:
+                if self._stopped:
+                    return
+                if not self._changed:
+                    timeout = MAX_ALARM_SLEEP if deadline is None else max(deadline - self.clock.time(), 0)
+                    if self.clock.max_sleep:
+                        timeout = min(timeout, self.clock.max_sleep)
+                    self.clock.wait(self._condition, timeout)
+                if self._stopped:
+                    return
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
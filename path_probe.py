@@ -0,0 +1,256 @@
+"""Hop-by-hop (mtr-style) path probing with TTL-limited ICMP echo requests"""
+import math
+import os
+import socket
+import struct
+import time
+
+from probe_engine import ProbeTarget, STATUS_LATE, STATUS_DUPLICATE
+from icmp_backend import (
+    IcmpSocketBackend, _IcmpSocket, parse_icmp, parse_quoted_echo, HEADER,
+    ICMP_ECHO_REPLY, ICMPV6_ECHO_REPLY, ICMP_DEST_UNREACHABLE, ICMPV6_DEST_UNREACHABLE,
+    ICMP_TIME_EXCEEDED, ICMPV6_TIME_EXCEEDED
+)
+
+DEFAULT_MAX_HOPS = 30
+
+# Linux values; the socket module does not export them
+IP_RECVERR = 11
+IPV6_RECVERR = 25
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+EXTENDED_ERR = struct.Struct("=IBBBBII")  # errno, origin, type, code, pad, info, data
+
+ECHO_REPLIES = (ICMP_ECHO_REPLY, ICMPV6_ECHO_REPLY)
+UNREACHABLE = (ICMP_DEST_UNREACHABLE, ICMPV6_DEST_UNREACHABLE)
+ERROR_TYPES = {
+    socket.AF_INET: (ICMP_TIME_EXCEEDED, ICMP_DEST_UNREACHABLE),
+    socket.AF_INET6: (ICMPV6_TIME_EXCEEDED, ICMPV6_DEST_UNREACHABLE)
+}
+
+
+def parse_offender(data, family):
+    """Address of the router that sent an error, from the sockaddr after sock_extended_err"""
+    if family == socket.AF_INET and len(data) >= 8:
+        return socket.inet_ntop(family, data[4:8])
+    if family == socket.AF_INET6 and len(data) >= 24:
+        return socket.inet_ntop(family, data[8:24])
+    return None
+
+
+class HopProbeBackend(IcmpSocketBackend):
+    """Sends TTL-limited echo requests for kind="hop" targets.
+
+    The routers along the way answer with Time Exceeded, which is matched
+    back to the probe through the echo request it quotes; the destination
+    answers with an ordinary echo reply. Raw sockets receive those errors
+    directly, unprivileged datagram sockets through the kernel error queue.
+    Results carry the ICMP type as code and the answering router as source.
+    Own sockets are used so changing the hop limit never affects ordinary
+    pings.
+    """
+    kind = "hop"
+
+    def __init__(self):
+        self._hop_limits = {}  # family -> hop limit currently set on its socket
+        super().__init__()
+
+    def _new_socket(self, family):
+        # A different identifier from IcmpSocketBackend so two raw sockets can tell their probes apart
+        icmp_sock = _IcmpSocket(family, identifier=os.getpid() ^ 0x8000)
+        if not icmp_sock.raw:
+            if family == socket.AF_INET:
+                icmp_sock.sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            else:
+                icmp_sock.sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+        return icmp_sock
+
+    def send(self, target, seq):
+        family, _ = self._resolve(target)
+        icmp_sock = self._socket_for(family)
+        if self._hop_limits.get(family) != target.ttl:
+            if family == socket.AF_INET:
+                icmp_sock.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, target.ttl)
+            else:
+                icmp_sock.sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, target.ttl)
+            self._hop_limits[family] = target.ttl
+        super().send(target, seq)
+
+    def _read(self, icmp_sock):
+        family = icmp_sock.family
+        if not icmp_sock.raw:
+            self._read_errors(icmp_sock)
+        while True:
+            try:
+                packet, source = icmp_sock.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # Error reported ahead of its error queue entry, read on the next wakeup
+            received_at = time.monotonic()
+            parsed = parse_icmp(packet, family)
+            if parsed is None:
+                continue
+            icmp_type, _, identifier, wire_seq, message = parsed
+            if icmp_type == icmp_sock.reply_type:
+                if identifier == icmp_sock.identifier:
+                    self._hop_reply(family, wire_seq, icmp_type, source[0], source[0], received_at)
+            elif icmp_type in ERROR_TYPES[family]:
+                quoted = parse_quoted_echo(message, family)
+                if quoted is not None and quoted[0] == icmp_sock.identifier:
+                    self._hop_reply(family, quoted[1], icmp_type, source[0], quoted[2], received_at)
+
+    def _read_errors(self, icmp_sock):
+        """Drain the Time Exceeded and unreachable reports queued on a datagram socket"""
+        while True:
+            try:
+                data, ancdata, _, address = icmp_sock.sock.recvmsg(2048, 512, socket.MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                return
+            received_at = time.monotonic()
+            if len(data) < HEADER.size:
+                continue
+            wire_seq = HEADER.unpack_from(data)[4]
+            for level, _, cmsg in ancdata:
+                if level not in (socket.IPPROTO_IP, socket.IPPROTO_IPV6) or len(cmsg) < EXTENDED_ERR.size:
+                    continue
+                _, origin, icmp_type, _, _, _, _ = EXTENDED_ERR.unpack_from(cmsg)
+                if origin in (SO_EE_ORIGIN_ICMP, SO_EE_ORIGIN_ICMP6):
+                    source = parse_offender(cmsg[EXTENDED_ERR.size:], icmp_sock.family)
+                    self._hop_reply(icmp_sock.family, wire_seq, icmp_type, source, address[0], received_at)
+
+    def _hop_reply(self, family, wire_seq, icmp_type, source, destination, received_at):
+        entry = self._in_flight.get((family, wire_seq))
+        if entry is None or entry[2] != destination:
+            return
+        self.engine.reply(entry[0], entry[1], received_at=received_at, code=icmp_type,
+                          failed=icmp_type in UNREACHABLE, source=source)
+
+
+class HopStats:
+    """Running loss and latency for one hop, like a row in mtr"""
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.sent = 0
+        self.received = 0
+        self.last = None
+        self.best = None
+        self.worst = None
+        self.mean = 0.0
+        self._m2 = 0.0         # Sum of squared deviations (Welford)
+        self.addresses = {}    # Answering address -> replies; several when the route load-balances
+
+    def add(self, result):
+        """Count one probe result for this hop"""
+        if result.status in (STATUS_LATE, STATUS_DUPLICATE):
+            return
+        self.sent += 1
+        if result.rtt is None:
+            return
+        rtt = result.rtt
+        self.received += 1
+        self.last = rtt
+        self.best = rtt if self.best is None else min(self.best, rtt)
+        self.worst = rtt if self.worst is None else max(self.worst, rtt)
+        delta = rtt - self.mean
+        self.mean += delta / self.received
+        self._m2 += delta * (rtt - self.mean)
+        if result.source:
+            self.addresses[result.source] = self.addresses.get(result.source, 0) + 1
+
+    @property
+    def loss(self):
+        """Lost probes in percent"""
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / self.received) if self.received else 0.0
+
+    @property
+    def address(self):
+        """Address that answered most often, or None if the hop never answered"""
+        return max(self.addresses, key=self.addresses.get) if self.addresses else None
+
+    def to_dict(self):
+        return {
+            "ttl": self.ttl,
+            "address": self.address,
+            "sent": self.sent,
+            "loss": round(self.loss, 1),
+            "last": self.last,
+            "best": self.best,
+            "mean": round(self.mean, 3) if self.received else None,
+            "worst": self.worst,
+            "stdev": round(self.stdev, 3)
+        }
+
+    def __str__(self):
+        if not self.received:
+            return f"{self.ttl} ??? {self.loss:.0f}%"
+        return f"{self.ttl} {self.address} {self.loss:.0f}% {self.mean:.1f}ms"
+
+
+class PathMonitor:
+    """Probes every hop towards a host at once and keeps per-hop statistics.
+
+    Each hop is an ordinary engine target with kind="hop" and its own ttl, so
+    all hops run concurrently on the engine's fixed-rate grid instead of one
+    traceroute pass at a time. Once the destination answers, hops beyond it
+    are no longer probed.
+    """
+    def __init__(self, host, interval=1, timeout=1, max_hops=DEFAULT_MAX_HOPS, pipeline=False, name=None):
+        self.host = host
+        self.name = name or host
+        self.hops = [ProbeTarget(host, interval, timeout, f"{self.name} hop {ttl}", kind="hop",
+                                 pipeline=pipeline, ttl=ttl)
+                     for ttl in range(1, max_hops + 1)]
+        self.stats = {target: HopStats(target.ttl) for target in self.hops}
+        self.path_length = None  # Hop count to the destination once it has answered
+        self.engine = None
+
+    def attach(self, engine):
+        """Start probing every hop; False if the engine cannot send TTL-limited probes"""
+        if not engine.supports("hop"):
+            print(f"Path probing to {self.host} is unavailable without ICMP socket access.")
+            return False
+        self.engine = engine
+        for target in self.hops:
+            engine.add_target(target)
+        return True
+
+    def detach(self):
+        if self.engine is not None:
+            for target in self.hops:
+                self.engine.remove_target(target)
+            self.engine = None
+
+    def update(self, result):
+        """Count a result; return the HopStats it belongs to, or None if it is not one of our hops"""
+        stats = self.stats.get(result.target)
+        if stats is None:
+            return None
+        stats.add(result)
+        if result.code in ECHO_REPLIES and result.rtt is not None:
+            if self.path_length is None or stats.ttl < self.path_length:
+                self._trim(stats.ttl)
+        return stats
+
+    def _trim(self, length):
+        """Stop probing hops past the destination"""
+        self.path_length = length
+        for target in self.hops[length:]:
+            if self.engine is not None:
+                self.engine.remove_target(target)
+        self.hops = self.hops[:length]
+
+    def rows(self):
+        """HopStats for every hop still on the path, nearest first"""
+        return [self.stats[target] for target in self.hops]
+
+    def summary(self):
+        """One-line mtr-style view of the path, e.g. for logging when a connection degrades"""
+        rows = self.rows()
+        while rows and not rows[-1].sent:
+            rows.pop()
+        return ", ".join(str(row) for row in rows)
@@ -0,0 +1,193 @@
+"""Fallback backend that streams results from one long-running ping process per target"""
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+
+from probe_engine import ProbeBackend, STATUS_OK, STATUS_TIMEOUT, STATUS_ERROR, STATUS_LATE, STATUS_DUPLICATE
+
+IS_WINDOWS = platform.system().lower() == "windows"
+IS_LINUX = platform.system().lower() == "linux"
+
+MIN_UNPRIVILEGED_INTERVAL = 0.2  # iputils refuses shorter intervals for normal users
+RESTART_DELAY_MIN = 1.0
+RESTART_DELAY_MAX = 30.0
+
+REPLY_RE = re.compile(r'icmp_seq=(\d+).*?time[=<]\s*(\d+\.?\d*)\s*ms')
+WINDOWS_REPLY_RE = re.compile(r'time[=<](\d+\.?\d*)\s*ms', re.IGNORECASE)
+NO_ANSWER_RE = re.compile(r'no answer yet for icmp_seq=(\d+)|Request timeout for icmp_seq (\d+)')
+ICMP_ERROR_RE = re.compile(r'^From \S+.*icmp_seq=(\d+)')
+WINDOWS_FAILURE_RE = re.compile(r'Request timed out|unreachable|General failure', re.IGNORECASE)
+
+
+def build_ping_command(host, interval, timeout):
+    """Return the argv for a ping process that runs until it is killed"""
+    if IS_WINDOWS:
+        # Windows ping always sends once per second
+        return ['ping', '-t', '-w', str(int(timeout * 1000)), host]
+    if IS_LINUX:
+        if hasattr(os, "geteuid") and os.geteuid() != 0:
+            interval = max(interval, MIN_UNPRIVILEGED_INTERVAL)
+        # -O prints "no answer yet" lines so losses show up as they happen
+        return ['ping', '-n', '-O', '-i', f"{interval:g}", '-W', f"{max(1, round(timeout))}", host]
+    return ['ping', '-n', '-i', f"{max(interval, MIN_UNPRIVILEGED_INTERVAL):g}", host]
+
+
+def parse_ping_line(line):
+    """Parse one line of ping output into (status, icmp_seq or None, rtt or None).
+
+    Returns None for lines that carry no result (banner, statistics).
+    """
+    match = REPLY_RE.search(line)
+    if match:
+        status = STATUS_DUPLICATE if "DUP!" in line else STATUS_OK
+        return status, int(match.group(1)), float(match.group(2))
+    match = NO_ANSWER_RE.search(line)
+    if match:
+        return STATUS_TIMEOUT, int(match.group(1) or match.group(2)), None
+    match = ICMP_ERROR_RE.search(line)
+    if match:
+        return STATUS_ERROR, int(match.group(1)), None
+    if IS_WINDOWS:
+        match = WINDOWS_REPLY_RE.search(line)
+        if match:
+            return STATUS_OK, None, float(match.group(1))
+        if WINDOWS_FAILURE_RE.search(line):
+            return STATUS_TIMEOUT, None, None
+    return None
+
+
+class _PingProcess:
+    """A running ping process and the line parsing state for its target"""
+    def __init__(self, target):
+        self.target = target
+        self.process = None
+        self.buffer = b""
+        self.timed_out = set()  # icmp_seq values already reported as lost
+        self.next_seq = 0       # Used when the platform's ping prints no icmp_seq
+        self.restart_delay = RESTART_DELAY_MIN
+        self.closed = False
+
+
+class StreamingPingBackend(ProbeBackend):
+    """Runs `ping -i <interval>` once per target and turns its stdout into results.
+
+    Used when neither datagram nor raw ICMP sockets are allowed. The process
+    owns the send schedule, so the engine does not tick these targets; a
+    process that exits is restarted with exponential backoff.
+    """
+    kind = "icmp"
+    self_scheduled = True
+
+    def __init__(self):
+        super().__init__()
+        if shutil.which("ping") is None:
+            raise OSError("No ping executable found on PATH.")
+        self._processes = {}
+
+    def add_target(self, target):
+        proc = _PingProcess(target)
+        self._processes[target] = proc
+        self._start(proc)
+
+    def remove_target(self, target):
+        proc = self._processes.pop(target, None)
+        if proc is not None:
+            self._kill(proc)
+
+    def close(self):
+        for proc in self._processes.values():
+            self._kill(proc)
+        self._processes.clear()
+
+    def _start(self, proc):
+        if proc.closed:
+            return
+        target = proc.target
+        command = build_ping_command(target.host, target.interval, target.timeout)
+        env = None if IS_WINDOWS else dict(os.environ, LC_ALL="C")
+        try:
+            proc.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                            stdin=subprocess.DEVNULL, env=env, bufsize=0)
+        except OSError as e:
+            print(f"Could not start ping for {target.host}: {e}")
+            self._schedule_restart(proc)
+            return
+        proc.buffer = b""
+        proc.timed_out.clear()
+        if IS_WINDOWS:
+            # Pipes cannot be polled with select() on Windows
+            threading.Thread(target=self._read_blocking, args=(proc, proc.process), daemon=True).start()
+        else:
+            os.set_blocking(proc.process.stdout.fileno(), False)
+            self.engine.register_fd(proc.process.stdout, lambda: self._read(proc))
+
+    def _read(self, proc):
+        try:
+            chunk = os.read(proc.process.stdout.fileno(), 65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        if not chunk:
+            self.engine.unregister_fd(proc.process.stdout)
+            self._on_exit(proc, proc.process)
+            return
+        self._feed(proc, chunk)
+
+    def _read_blocking(self, proc, process):
+        for chunk in iter(lambda: process.stdout.readline(), b""):
+            self.engine.call_soon_threadsafe(self._feed, proc, chunk)
+        self.engine.call_soon_threadsafe(self._on_exit, proc, process)
+
+    def _feed(self, proc, chunk):
+        proc.buffer += chunk
+        *lines, proc.buffer = proc.buffer.split(b"\n")
+        for line in lines:
+            self._handle_line(proc, line.decode("utf-8", errors="replace"))
+
+    def _handle_line(self, proc, line):
+        parsed = parse_ping_line(line)
+        if parsed is None:
+            return
+        status, icmp_seq, rtt = parsed
+        if icmp_seq is None:
+            icmp_seq = proc.next_seq
+            proc.next_seq += 1
+        if status == STATUS_OK:
+            proc.restart_delay = RESTART_DELAY_MIN
+            if icmp_seq in proc.timed_out:
+                proc.timed_out.discard(icmp_seq)
+                status = STATUS_LATE
+        elif status == STATUS_TIMEOUT:
+            proc.timed_out.add(icmp_seq)
+            if len(proc.timed_out) > 4096:
+                proc.timed_out.discard(min(proc.timed_out))
+        self.engine.report(proc.target, icmp_seq & 0xFFFF, status, rtt)
+
+    def _on_exit(self, proc, process):
+        if process is not proc.process or proc.closed:
+            return
+        process.stdout.close()
+        returncode = process.wait()
+        print(f"ping for {proc.target.host} exited with code {returncode}, restarting in {proc.restart_delay:g}s")
+        self.engine.report(proc.target, proc.next_seq & 0xFFFF, STATUS_ERROR)
+        self._schedule_restart(proc)
+
+    def _schedule_restart(self, proc):
+        self.engine.call_later(proc.restart_delay, self._start, proc)
+        proc.restart_delay = min(proc.restart_delay * 2, RESTART_DELAY_MAX)
+
+    def _kill(self, proc):
+        proc.closed = True
+        process = proc.process
+        if process is None or process.poll() is not None:
+            return
+        if not IS_WINDOWS:
+            self.engine.unregister_fd(process.stdout)
+        process.terminate()
+        try:
+            process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        process.stdout.close()
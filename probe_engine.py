@@ -0,0 +1,647 @@
+"""Probe engine that keeps many ping targets in flight from a single thread"""
+import collections
+import heapq
+import itertools
+import math
+import queue
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+STATUS_LATE = "late"            # Reply to a probe already reported as timed out
+STATUS_DUPLICATE = "duplicate"  # Second reply to an already answered probe
+
+MIN_PROBE_INTERVAL = 0.01  # 10 ms
+TIMER_SLACK = 0.002        # Probes this close to their timeout count as expired
+LATE_REPLY_WINDOW = 10.0   # Seconds after the timeout during which late replies are still recognised
+RESOLVE_RETRY_MIN = 1.0    # Seconds before retrying a failed host lookup, doubled after each failure
+RESOLVE_RETRY_MAX = 60.0
+
+
+class ProbeTarget:
+    """A host probed by the engine with its own interval and timeout"""
+    def __init__(self, host, interval=1, timeout=1, name=None, kind="icmp", pipeline=False, queries=None, ttl=None,
+                 adaptive=False, burst_interval=None, budget=None):
+        if interval < MIN_PROBE_INTERVAL or timeout <= 0:
+            raise ValueError(f"Probe interval must be at least {MIN_PROBE_INTERVAL}s and timeout positive.")
+        if burst_interval is not None and not MIN_PROBE_INTERVAL <= burst_interval <= interval:
+            raise ValueError(f"Burst interval must be between {MIN_PROBE_INTERVAL}s and the probe interval.")
+        self.host = host
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        self.name = name or host
+        self.kind = kind
+        self.pipeline = pipeline
+        self.queries = list(queries or [])  # Names to resolve for kind="dns"
+        self.ttl = ttl                      # Hop limit for kind="hop" path probes
+        # Adaptive targets probe every `interval` while healthy and every
+        # `burst_interval` while degraded, averaging at most `budget` probes/s
+        self.adaptive = adaptive
+        self.burst_interval = float(burst_interval or max(MIN_PROBE_INTERVAL, self.interval / 10))
+        self.budget = max(float(budget or 2.0 / self.interval), 1.0 / self.interval)
+
+    @property
+    def max_outstanding(self):
+        """Probes allowed in flight at once: one, or enough to cover the timeout when pipelined.
+
+        Adaptive targets are always pipelined at their burst rate, otherwise a
+        burst would stall behind the first probe that times out.
+        """
+        if self.adaptive:
+            return math.ceil(self.timeout / self.burst_interval) + 1
+        if not self.pipeline:
+            return 1
+        return math.ceil(self.timeout / self.interval) + 1
+
+    def to_dict(self):
+        """Serialize target to dictionary for saving"""
+        return {
+            "host": self.host,
+            "interval": self.interval,
+            "timeout": self.timeout,
+            "name": self.name,
+            "kind": self.kind,
+            "pipeline": self.pipeline,
+            "queries": self.queries,
+            "ttl": self.ttl,
+            "adaptive": self.adaptive,
+            "burst_interval": self.burst_interval,
+            "budget": self.budget
+        }
+
+    @staticmethod
+    def from_dict(data, interval=1, timeout=1):
+        """Create ProbeTarget from dictionary, using defaults for missing values"""
+        return ProbeTarget(data["host"], data.get("interval", interval), data.get("timeout", timeout),
+                           data.get("name"), data.get("kind", "icmp"), data.get("pipeline", False),
+                           data.get("queries"), data.get("ttl"), data.get("adaptive", False),
+                           data.get("burst_interval"), data.get("budget"))
+
+    def __repr__(self):
+        return f"ProbeTarget({self.kind}:{self.host}, every {self.interval:g}s)"
+
+
+class ProbeResult:
+    """Outcome of a single probe sent to a target"""
+    __slots__ = ("target", "seq", "timestamp", "rtt", "status", "drift", "code", "source")
+
+    def __init__(self, target, seq, timestamp, rtt, status, drift=0.0, code=None, source=None):
+        self.target = target
+        self.seq = seq
+        self.timestamp = timestamp  # Wall-clock send time
+        self.rtt = rtt              # Round trip in ms, None when the probe failed
+        self.status = status
+        self.drift = drift          # How late the probe left versus its schedule, in ms
+        self.code = code            # Protocol response code, e.g. the DNS rcode
+        self.source = source        # Address that answered when it is not the target, e.g. a router
+
+    @property
+    def ok(self):
+        return self.status == STATUS_OK
+
+    def __repr__(self):
+        return f"ProbeResult({self.target.name} #{self.seq} {self.status} {self.rtt})"
+
+
+class ResultQueue:
+    """Bounded hand-off of records from the engine thread to a consumer polling in batches.
+
+    put() never blocks; if the consumer falls behind the oldest records are
+    dropped and counted instead of growing without limit.
+    """
+    def __init__(self, maxlen=100000):
+        self._items = collections.deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._lock:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+
+    def drain(self):
+        """Remove and return everything queued so far, oldest first"""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ProbeBackend:
+    """Base class for probe transports driven by ProbeEngine.
+
+    Backends are called from the engine thread only. They report replies with
+    engine.reply() and failures with engine.fail(); anything running on
+    another thread must go through engine.call_soon_threadsafe(). Backends
+    that decide when probes go out themselves set self_scheduled and hand
+    finished results to engine.report() instead; the engine never calls
+    send() on them.
+    """
+    kind = "icmp"
+    self_scheduled = False
+
+    def __init__(self):
+        self.engine = None
+
+    def attach(self, engine):
+        self.engine = engine
+
+    def add_target(self, target):
+        pass
+
+    def remove_target(self, target):
+        pass
+
+    def ready(self, target):
+        """False if target cannot be probed yet (e.g. its address is being looked up); the slot is skipped"""
+        return True
+
+    def send(self, target, seq):
+        raise NotImplementedError
+
+    def cancel(self, target, seq):
+        """Forget seq; the engine no longer wants late or duplicate replies to it"""
+        pass
+
+    def close(self):
+        pass
+
+
+class ThreadedProbeBackend(ProbeBackend):
+    """Runs a blocking probe function such as ping_host on a bounded worker pool"""
+    def __init__(self, probe_func, max_workers=16, kind="icmp"):
+        super().__init__()
+        self.kind = kind
+        self._probe_func = probe_func
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+
+    def send(self, target, seq):
+        self._pool.submit(self._probe, target, seq)
+
+    def _probe(self, target, seq):
+        try:
+            rtt = self._probe_func(target.host, timeout=target.timeout)
+        except Exception:
+            rtt = None
+        self.engine.call_soon_threadsafe(self._finish, target, seq, rtt)
+
+    def _finish(self, target, seq, rtt):
+        if rtt is None:
+            self.engine.fail(target, seq, STATUS_ERROR)
+        else:
+            self.engine.reply(target, seq, rtt=rtt)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+class AddressResolver:
+    """Looks up target hosts on worker threads for backends with non-blocking sockets.
+
+    lookup(host, flags) is the blocking getaddrinfo call, returning (family,
+    sockaddr). Addresses are kept per host, so targets sharing one (such as
+    the hops of a path) share a single lookup, and literal addresses are
+    taken at once without a worker. Failed lookups are retried no sooner
+    than RESOLVE_RETRY_MIN seconds later, doubling up to RESOLVE_RETRY_MAX.
+    """
+    def __init__(self, engine, lookup, max_workers=4):
+        self.engine = engine
+        self._lookup = lookup
+        self._addresses = {}  # host -> (family, sockaddr)
+        self._retries = {}    # host -> (failed lookups in a row, time.monotonic() of the next try)
+        self._pending = set()
+        self._users = {}      # host -> targets using it
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resolve")
+
+    def ready(self, target):
+        """False while the first lookup of target's host is still running, so its probes wait.
+
+        Once a lookup has failed this is True again and address() raises, so
+        a name that does not resolve shows up as failed probes.
+        """
+        if target.host in self._addresses:
+            return True
+        self.resolve(target)
+        return target.host in self._addresses or target.host in self._retries
+
+    def address(self, target):
+        """(family, sockaddr) of target; raises OSError while it is unknown"""
+        if target.host not in self._addresses:
+            self.resolve(target)  # Literal addresses are known straight away
+        address = self._addresses.get(target.host)
+        if address is None:
+            raise OSError(f"{target.host} is not resolved")
+        return address
+
+    def resolve(self, target):
+        """Start a lookup of target's host unless one is running or it failed too recently.
+
+        A host with an address keeps using it until the new one arrives.
+        """
+        host = target.host
+        self._users.setdefault(host, set()).add(target)
+        retry = self._retries.get(host)
+        if host in self._pending or (retry is not None and time.monotonic() < retry[1]):
+            return
+        if host not in self._addresses:
+            try:
+                self._addresses[host] = self._lookup(host, socket.AI_NUMERICHOST)
+                return
+            except (OSError, UnicodeError):
+                pass  # A name, not an address: look it up on a worker
+        self._pending.add(host)
+        self._pool.submit(self._run, host)
+
+    def forget(self, target):
+        users = self._users.get(target.host)
+        if users is not None:
+            users.discard(target)
+            if users:
+                return
+        self._users.pop(target.host, None)
+        self._addresses.pop(target.host, None)
+        self._retries.pop(target.host, None)
+        self._pending.discard(target.host)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _run(self, host):
+        try:
+            address, error = self._lookup(host, 0), None
+        except (OSError, UnicodeError) as e:
+            address, error = None, e
+        self.engine.call_soon_threadsafe(self._done, host, address, error)
+
+    def _done(self, host, address, error):
+        if host not in self._pending:
+            return  # Forgotten while the lookup ran
+        self._pending.discard(host)
+        if address is not None:
+            self._addresses[host] = address
+            self._retries.pop(host, None)
+        elif host not in self._addresses:
+            failures = self._retries.get(host, (0, 0.0))[0] + 1
+            delay = min(RESOLVE_RETRY_MAX, RESOLVE_RETRY_MIN * 2 ** (failures - 1))
+            self._retries[host] = (failures, time.monotonic() + delay)
+            print(f"Could not resolve {host}: {error}. Retrying in {delay:.0f} s.")
+
+
+class _TargetState:
+    """Per-target bookkeeping owned by the engine thread"""
+    __slots__ = ("target", "backend", "next_seq", "outstanding", "expired", "answered",
+                 "highest_answered", "active", "interval", "next_due", "generation", "sent", "skipped",
+                 "drift_total", "drift_max", "late", "duplicates", "reordered")
+
+    def __init__(self, target, backend):
+        self.target = target
+        self.backend = backend
+        self.next_seq = 0
+        self.outstanding = {}  # seq -> (monotonic send time, wall-clock send time, drift ms)
+        self.expired = {}      # Timed out probes that may still get a late reply, same layout
+        self.answered = {}     # Answered probes, kept to recognise duplicate replies
+        self.highest_answered = None
+        self.active = True
+        self.interval = target.interval  # Current spacing of the schedule grid, see set_interval()
+        self.next_due = time.monotonic()
+        self.generation = 0              # Bumped when the grid is rebuilt so stale ticks are ignored
+        self.sent = 0
+        self.skipped = 0       # Schedule slots with no probe sent
+        self.drift_total = 0.0
+        self.drift_max = 0.0
+        self.late = 0
+        self.duplicates = 0
+        self.reordered = 0     # Replies that arrived after a reply to a later probe
+
+
+def seq_before(a, b):
+    """True if 16-bit sequence number a comes before b, allowing for wrap-around"""
+    return a != b and ((b - a) & 0xFFFF) < 0x8000
+
+
+class ProbeEngine:
+    """Schedules probes for many targets and multiplexes their replies.
+
+    Everything runs on the thread that calls run(): sends and timeouts come
+    from a deadline heap and replies from a selector, so a host that never
+    answers only ever costs its own timeout. Probes fire on a fixed-rate grid
+    of monotonic deadlines (start + n * interval), independent of how long
+    replies take, so the probe rate never drifts.
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeups)
+        self._pending_calls = queue.SimpleQueue()
+        self._timers = []
+        self._timer_ids = itertools.count()
+        self._backends = {}
+        self._states = {}
+        self._subscribers = []
+        self._running = False
+
+    # --- Configuration ---
+
+    def register_backend(self, backend):
+        """Use backend for all targets of its kind"""
+        backend.attach(self)
+        self._backends[backend.kind] = backend
+
+    def subscribe(self, callback):
+        """Call callback(result) on the engine thread for every probe result"""
+        self._subscribers.append(callback)
+
+    def add_target(self, target):
+        """Start probing target (thread-safe)"""
+        self.call_soon_threadsafe(self._add_target, target)
+
+    def remove_target(self, target):
+        """Stop probing target (thread-safe)"""
+        self.call_soon_threadsafe(self._remove_target, target)
+
+    def set_interval(self, target, interval):
+        """Change how often target is probed from now on (thread-safe)"""
+        self.call_soon_threadsafe(self._set_interval, target, max(MIN_PROBE_INTERVAL, interval))
+
+    def supports(self, kind):
+        """True if a backend is registered for targets of this kind"""
+        return kind in self._backends
+
+    @property
+    def targets(self):
+        return [state.target for state in self._states.values()]
+
+    def stats(self, target):
+        """Return send/reply counters and schedule drift (ms) for target, or None if unknown"""
+        state = self._states.get(target)
+        if state is None:
+            return None
+        return {
+            "interval": state.interval,
+            "sent": state.sent,
+            "skipped": state.skipped,
+            "mean_drift": state.drift_total / state.sent if state.sent else 0.0,
+            "max_drift": state.drift_max,
+            "in_flight": len(state.outstanding),
+            "late": state.late,
+            "duplicates": state.duplicates,
+            "reordered": state.reordered
+        }
+
+    # --- Services for backends ---
+
+    def register_fd(self, fileobj, callback):
+        """Call callback() whenever fileobj becomes readable"""
+        self._selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def unregister_fd(self, fileobj):
+        try:
+            self._selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) on the engine thread after delay seconds"""
+        self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_at(self, deadline, callback, *args):
+        """Run callback(*args) on the engine thread at a time.monotonic() deadline"""
+        heapq.heappush(self._timers, (deadline, next(self._timer_ids), callback, args))
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Queue callback(*args) for the engine thread from any thread"""
+        self._pending_calls.put((callback, args))
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Wakeup pipe already full, the loop will drain the queue anyway
+
+    def reply(self, target, seq, rtt=None, received_at=None, code=None, failed=False, source=None):
+        """Record a reply; rtt defaults to the time since the probe was sent.
+
+        Replies to probes that already timed out are reported as STATUS_LATE
+        and repeated replies as STATUS_DUPLICATE rather than being dropped.
+        A reply that is itself an error (failed=True, e.g. DNS SERVFAIL) is
+        reported as STATUS_ERROR with its rtt kept.
+        """
+        state = self._states.get(target)
+        if state is None:
+            return
+        if seq in state.outstanding:
+            sent = state.outstanding.pop(seq)
+            status = STATUS_ERROR if failed else STATUS_OK
+            if state.highest_answered is not None and seq_before(seq, state.highest_answered):
+                state.reordered += 1
+            else:
+                state.highest_answered = seq
+        elif seq in state.expired:
+            sent = state.expired.pop(seq)
+            status = STATUS_LATE
+            state.late += 1
+        elif seq in state.answered:
+            sent = state.answered[seq]
+            status = STATUS_DUPLICATE
+            state.duplicates += 1
+        else:
+            return
+        state.answered[seq] = sent
+        sent_mono, sent_wall, drift = sent
+        if rtt is None:
+            rtt = ((received_at or time.monotonic()) - sent_mono) * 1000.0
+        self._finish(state, ProbeResult(target, seq, sent_wall, rtt, status, drift, code, source))
+
+    def fail(self, target, seq, status=STATUS_ERROR):
+        """Record a probe that failed before its timeout"""
+        state = self._states.get(target)
+        if state is None or seq not in state.outstanding:
+            return
+        _, sent_wall, drift = state.outstanding.pop(seq)
+        self._finish(state, ProbeResult(target, seq, sent_wall, None, status, drift))
+
+    def report(self, target, seq, status, rtt=None, timestamp=None):
+        """Deliver a result measured entirely by a self-scheduled backend"""
+        state = self._states.get(target)
+        if state is None:
+            return
+        if status == STATUS_LATE:
+            state.late += 1
+        elif status == STATUS_DUPLICATE:
+            state.duplicates += 1
+        else:
+            state.sent += 1
+        if timestamp is None:
+            timestamp = time.time() - (rtt or 0.0) / 1000.0
+        self._finish(state, ProbeResult(target, seq, timestamp, rtt, status))
+
+    # --- Loop ---
+
+    def run(self):
+        """Run the engine loop on the calling thread until stop() is called"""
+        self._running = True
+        try:
+            while self._running:
+                self._selector_wait()
+                self._run_due_timers()
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        """Ask the loop to exit (thread-safe)"""
+        self.call_soon_threadsafe(self._stop)
+
+    def _stop(self):
+        self._running = False
+
+    def _selector_wait(self):
+        timeout = None
+        if self._timers:
+            timeout = max(0.0, self._timers[0][0] - time.monotonic())
+        for key, _ in self._selector.select(timeout):
+            try:
+                key.data()
+            except Exception as e:
+                print(f"Probe engine I/O error: {e}")
+
+    def _run_due_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback, args = heapq.heappop(self._timers)
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Probe engine error: {e}")
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while True:
+            try:
+                callback, args = self._pending_calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Probe engine error: {e}")
+
+    def _shutdown(self):
+        for state in self._states.values():
+            state.active = False
+        for backend in self._backends.values():
+            try:
+                backend.close()
+            except Exception as e:
+                print(f"Probe backend close error: {e}")
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    # --- Per-target scheduling ---
+
+    def _add_target(self, target):
+        if target in self._states:
+            return
+        backend = self._backends.get(target.kind)
+        if backend is None:
+            print(f"No probe backend for target kind '{target.kind}', ignoring {target.host}")
+            return
+        state = _TargetState(target, backend)
+        self._states[target] = state
+        backend.add_target(target)
+        if not backend.self_scheduled:
+            self.call_at(state.next_due, self._tick, state, state.generation)
+
+    def _remove_target(self, target):
+        state = self._states.pop(target, None)
+        if state is not None:
+            state.active = False
+            state.backend.remove_target(target)
+
+    def _set_interval(self, target, interval):
+        state = self._states.get(target)
+        if state is None or state.backend.self_scheduled or interval == state.interval:
+            return
+        due = state.next_due - state.interval + interval
+        state.interval = interval
+        if due < state.next_due:
+            # Pull the next probe in; a longer interval simply applies after the pending slot
+            state.next_due = max(due, time.monotonic())
+            state.generation += 1
+            self.call_at(state.next_due, self._tick, state, state.generation)
+
+    def _tick(self, state, generation):
+        """Fire the probe due at state.next_due and schedule the next grid slot"""
+        if not state.active or generation != state.generation:
+            return
+        interval = state.interval
+        now = time.monotonic()
+        for seq, (sent_mono, _, _) in list(state.outstanding.items()):
+            if now - sent_mono >= state.target.timeout - TIMER_SLACK:
+                self._expire(state, seq)
+
+        if len(state.outstanding) >= state.target.max_outstanding:
+            state.skipped += 1  # Earlier probes still waiting for their replies
+        elif not state.backend.ready(state.target):
+            state.skipped += 1  # Nothing to send to yet
+        else:
+            self._send(state)
+
+        state.next_due += interval
+        now = time.monotonic()
+        if state.next_due <= now:
+            # The loop stalled (suspend, heavy load): drop the missed slots
+            # instead of bursting to catch up
+            missed = int((now - state.next_due) / interval) + 1
+            state.skipped += missed
+            state.next_due += missed * interval
+        self.call_at(state.next_due, self._tick, state, generation)
+
+    def _send(self, state):
+        seq = state.next_seq
+        state.next_seq = (seq + 1) & 0xFFFF
+        sent_mono = time.monotonic()
+        drift = max(0.0, (sent_mono - state.next_due) * 1000.0)
+        state.sent += 1
+        state.drift_total += drift
+        state.drift_max = max(state.drift_max, drift)
+        state.outstanding[seq] = (sent_mono, time.time(), drift)
+        try:
+            state.backend.send(state.target, seq)
+        except OSError:
+            self.fail(state.target, seq, STATUS_ERROR)
+            return
+        self.call_at(sent_mono + state.target.timeout, self._expire, state, seq)
+        self.call_at(sent_mono + state.target.timeout + LATE_REPLY_WINDOW, self._forget, state, seq)
+
+    def _expire(self, state, seq):
+        if seq in state.outstanding:
+            sent = state.outstanding.pop(seq)
+            state.expired[seq] = sent
+            self._finish(state, ProbeResult(state.target, seq, sent[1], None, STATUS_TIMEOUT, sent[2]))
+
+    def _forget(self, state, seq):
+        """Stop listening for late or duplicate replies to seq"""
+        state.expired.pop(seq, None)
+        state.answered.pop(seq, None)
+        state.backend.cancel(state.target, seq)
+
+    def _finish(self, state, result):
+        for callback in self._subscribers:
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Probe subscriber error: {e}")
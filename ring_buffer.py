@@ -0,0 +1,58 @@
+"""Fixed-capacity ring buffer backed by a preallocated NumPy array"""
+import numpy as np
+
+
+class RingBuffer:
+    """Keeps the newest `capacity` values with O(1) appends and copy-free views.
+
+    Every value is written twice, at i and i + capacity, so the stored values
+    are always one contiguous slice of the backing array. view() can
+    therefore hand them to NumPy or pyqtgraph in order without copying,
+    however often the buffer has wrapped.
+    """
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1.")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._next = 0  # Slot of the next write, always < capacity
+        self._size = 0
+
+    def append(self, value):
+        """Add one value, dropping the oldest when full"""
+        i = self._next
+        self._data[i] = self._data[i + self.capacity] = value
+        self._next = i + 1 if i + 1 < self.capacity else 0
+        if self._size < self.capacity:
+            self._size += 1
+
+    def extend(self, values):
+        """Add a batch of values with at most four slice copies"""
+        values = np.asarray(values, dtype=self._data.dtype)[-self.capacity:]
+        count = len(values)
+        if not count:
+            return
+        head = min(count, self.capacity - self._next)
+        for start, chunk in ((self._next, values[:head]), (0, values[head:])):
+            end = start + len(chunk)
+            self._data[start:end] = chunk
+            self._data[start + self.capacity:end + self.capacity] = chunk
+        self._next = (self._next + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+
+    def view(self):
+        """The stored values, oldest first, as a read-only view into the buffer.
+
+        The view is only valid until the next append or extend.
+        """
+        end = self._next + self.capacity if self._size == self.capacity else self._next
+        view = self._data[end - self._size:end]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,319 @@
+"""Multi-resolution (1 s / 1 min / 1 h) rollups of probe results, maintained as samples arrive"""
+import threading
+import time
+
+import numpy as np
+
+from probe_engine import STATUS_LATE, STATUS_DUPLICATE
+from sample_store import STATUS_INDEX
+from latency_stats import (
+    LatencyStats, JitterEstimator, SKETCH_BINS, SKETCH_MIN_MS, SKETCH_GAMMA, sketch_bin, sketch_quantiles
+)
+
+TIERS = ((1, 600), (60, 2880), (3600, 2160))  # (bucket seconds, buckets kept): 10 minutes, 2 days, 90 days
+MAX_GRAPH_POINTS = 3000
+JITTER_WARMUP = 32  # Newest past RTTs replayed into a target's running jitter estimate
+
+
+def sketch_rows(edges):
+    """Matrix spreading each sketch bin's count over latency rows bounded by edges (ms).
+
+    A bin's count is shared between the rows its RTT range overlaps, in
+    proportion to the overlap; bins above the last edge go to the top row.
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    low = SKETCH_MIN_MS * SKETCH_GAMMA ** np.arange(SKETCH_BINS)
+    low[0] = 0.0  # The first bin also holds everything below SKETCH_MIN_MS
+    high = SKETCH_MIN_MS * SKETCH_GAMMA ** np.arange(1, SKETCH_BINS + 1)
+    overlap = np.minimum(high[:, None], edges[None, 1:]) - np.maximum(low[:, None], edges[None, :-1])
+    matrix = np.maximum(overlap, 0.0) / (high - low)[:, None]
+    matrix[:, -1] += np.clip((high - np.maximum(low, edges[-1])) / (high - low), 0.0, 1.0)
+    return matrix
+
+
+class RollupTier:
+    """Fixed number of time buckets of one width, reused round-robin as time moves on.
+
+    Each bucket holds the probe count, losses, min, max and sum of RTTs, the
+    sum of jitter deltas and a percentile sketch, all updated in place as
+    samples arrive. Buckets merge by adding them up, so any span can be
+    summarised later as a LatencyStats.
+    """
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.index = np.full(capacity, -1, dtype=np.int64)  # Absolute bucket number held by each slot
+        self.count = np.zeros(capacity, dtype=np.uint32)
+        self.lost = np.zeros(capacity, dtype=np.uint32)
+        self.min = np.full(capacity, np.inf)
+        self.max = np.full(capacity, -np.inf)
+        self.sum = np.zeros(capacity)
+        self.delta_sum = np.zeros(capacity)  # |D| of consecutive RTTs, see JitterEstimator
+        self.delta_count = np.zeros(capacity, dtype=np.uint32)
+        self.sketch = np.zeros((capacity, SKETCH_BINS), dtype=np.uint32)
+        self.newest = -1
+
+    def _reset(self, slots, indices):
+        self.index[slots] = indices
+        self.count[slots] = 0
+        self.lost[slots] = 0
+        self.min[slots] = np.inf
+        self.max[slots] = -np.inf
+        self.sum[slots] = 0.0
+        self.delta_sum[slots] = 0.0
+        self.delta_count[slots] = 0
+        self.sketch[slots] = 0
+
+    def add(self, timestamp, rtt, delta=None):
+        """Count one probe; rtt is None when it was lost, delta its jitter |D| if known"""
+        index = int(timestamp // self.width)
+        if index <= self.newest - self.capacity:
+            return  # Older than anything this tier still keeps
+        slot = index % self.capacity
+        if self.index[slot] != index:
+            self._reset(slot, index)
+        self.newest = max(self.newest, index)
+        self.count[slot] += 1
+        if rtt is None:
+            self.lost[slot] += 1
+            return
+        self.min[slot] = min(self.min[slot], rtt)
+        self.max[slot] = max(self.max[slot], rtt)
+        self.sum[slot] += rtt
+        self.sketch[slot, sketch_bin(rtt)] += 1
+        if delta is not None:
+            self.delta_sum[slot] += delta
+            self.delta_count[slot] += 1
+
+    def add_many(self, timestamps, rtts, deltas=None):
+        """Vectorised add() for a batch; NaN rtts are losses and NaN deltas unknown"""
+        indices = (np.asarray(timestamps) // self.width).astype(np.int64)
+        rtts = np.asarray(rtts, dtype=np.float64)
+        deltas = np.full(len(rtts), np.nan) if deltas is None else np.asarray(deltas, dtype=np.float64)
+        if not len(indices):
+            return
+        self.newest = max(self.newest, int(indices.max()))
+        keep = indices > self.newest - self.capacity
+        indices, rtts, deltas = indices[keep], rtts[keep], deltas[keep]
+        slots = indices % self.capacity
+        unique_indices = np.unique(indices)
+        stale = self.index[unique_indices % self.capacity] != unique_indices
+        self._reset(unique_indices[stale] % self.capacity, unique_indices[stale])
+        np.add.at(self.count, slots, 1)
+        lost = np.isnan(rtts)
+        np.add.at(self.lost, slots[lost], 1)
+        slots, rtts, deltas = slots[~lost], rtts[~lost], deltas[~lost]
+        np.minimum.at(self.min, slots, rtts)
+        np.maximum.at(self.max, slots, rtts)
+        np.add.at(self.sum, slots, rtts)
+        np.add.at(self.sketch, (slots, sketch_bin(rtts)), 1)
+        known = ~np.isnan(deltas)
+        np.add.at(self.delta_sum, slots[known], deltas[known])
+        np.add.at(self.delta_count, slots[known], 1)
+
+    def _slots(self, start, end):
+        """Slots of the non-empty buckets overlapping [start, end) and their bucket numbers"""
+        first = max(int(start // self.width), self.newest - self.capacity + 1)
+        indices = np.arange(first, int(end // self.width) + 1, dtype=np.int64)
+        slots = indices % self.capacity
+        valid = (self.index[slots] == indices) & (self.count[slots] > 0)
+        return slots[valid], indices[valid]
+
+    def series(self, start, end, quantiles=()):
+        """Buckets overlapping [start, end), oldest first, as a dict of arrays.
+
+        Keys: time (bucket start), count, loss (percent), min, max, mean,
+        jitter and one "p<nn>" array per requested quantile. Empty buckets are
+        skipped.
+        """
+        slots, indices = self._slots(start, end)
+        count = self.count[slots].astype(np.float64)
+        received = count - self.lost[slots]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            data = {
+                "time": indices * float(self.width),
+                "count": count,
+                "loss": 100.0 * self.lost[slots] / count,
+                "min": np.where(received > 0, self.min[slots], np.nan),
+                "max": np.where(received > 0, self.max[slots], np.nan),
+                "mean": self.sum[slots] / received,
+                "jitter": self.delta_sum[slots] / self.delta_count[slots]
+            }
+        if quantiles:
+            values = sketch_quantiles(self.sketch[slots], quantiles)
+            for column, quantile in enumerate(quantiles):
+                data[f"p{round(quantile * 100)}"] = values[:, column]
+        return data
+
+    def heatmap(self, start, end, columns, edges):
+        """Probe counts per (time column, latency row) over [start, end), built from the bucket sketches.
+
+        The range is split into `columns` equal time columns and latency into
+        the rows bounded by edges (ms); lost probes are not counted.
+        """
+        slots, indices = self._slots(start, end)
+        image = np.zeros((columns, SKETCH_BINS))
+        column = ((indices * self.width - start) * (columns / (end - start))).astype(np.int64)
+        np.add.at(image, np.clip(column, 0, columns - 1), self.sketch[slots])
+        return image @ sketch_rows(edges)
+
+    def summary(self, start, end):
+        """LatencyStats merged from every bucket overlapping [start, end)"""
+        slots, _ = self._slots(start, end)
+        stats = LatencyStats()
+        if not len(slots):
+            return stats
+        stats.sent = int(self.count[slots].sum())
+        stats.lost = int(self.lost[slots].sum())
+        stats.rtt_sum = float(self.sum[slots].sum())
+        stats.min = float(self.min[slots].min())
+        stats.max = float(self.max[slots].max())
+        stats.delta_sum = float(self.delta_sum[slots].sum())
+        stats.delta_count = int(self.delta_count[slots].sum())
+        stats.sketch = self.sketch[slots].sum(axis=0, dtype=np.uint64)
+        return stats
+
+
+class TargetRollups:
+    """The 1 s, 1 min and 1 h tiers of one target, plus its running RFC 3550 jitter"""
+    def __init__(self, tiers=TIERS):
+        self.tiers = [RollupTier(width, capacity) for width, capacity in tiers]
+        self.jitter = JitterEstimator()
+
+    def add(self, timestamp, rtt):
+        delta = None if rtt is None else self.jitter.update(rtt)
+        for tier in self.tiers:
+            tier.add(timestamp, rtt, delta)
+
+    def add_many(self, timestamps, rtts, previous=None):
+        """Add a batch of past probes; previous is the answered RTT just before it, if known.
+
+        Returns the batch's last answered RTT (or previous), to pass on with
+        the next batch so jitter deltas carry across batches.
+        """
+        rtts = np.asarray(rtts, dtype=np.float64)
+        deltas = np.full(len(rtts), np.nan)
+        answered = ~np.isnan(rtts)
+        if answered.any():
+            before = np.concatenate(([np.nan if previous is None else previous], rtts[answered][:-1]))
+            deltas[answered] = np.abs(rtts[answered] - before)
+            previous = float(rtts[answered][-1])
+        for tier in self.tiers:
+            tier.add_many(timestamps, rtts, deltas)
+        return previous
+
+    def warm_jitter(self, rtts):
+        """Start the running jitter estimate from past RTTs, unless live samples already have"""
+        if self.jitter.last_rtt is None:
+            for rtt in rtts:
+                self.jitter.update(float(rtt))
+
+    def tier_for(self, span, max_points=MAX_GRAPH_POINTS):
+        """Finest tier that covers span seconds in at most max_points buckets"""
+        for tier in self.tiers:
+            if span / tier.width <= max_points and span <= tier.width * tier.capacity:
+                return tier
+        return self.tiers[-1]
+
+
+class RollupManager:
+    """Engine subscriber keeping TargetRollups for the targets it is asked to track.
+
+    Targets are filed under key_func(target), so a target recreated with the
+    same settings (when the engine restarts) finds its rollups again.
+    update() runs on the engine thread and series() on any other, so both
+    take a lock; reads copy at most MAX_GRAPH_POINTS buckets.
+    """
+    def __init__(self, tiers=TIERS, key_func=None):
+        self._tiers = tiers
+        self._key = key_func if key_func is not None else (lambda target: target)
+        self._rollups = {}        # Key -> TargetRollups
+        self._backfilled = set()  # Keys already handed to backfill()
+        self._lock = threading.Lock()
+
+    def track(self, target):
+        with self._lock:
+            self._rollups.setdefault(self._key(target), TargetRollups(self._tiers))
+
+    def _get(self, target):
+        return self._rollups.get(self._key(target))
+
+    def update(self, result):
+        rollups = self._get(result.target)
+        if rollups is None or result.status in (STATUS_LATE, STATUS_DUPLICATE):
+            return
+        with self._lock:
+            rollups.add(result.timestamp, result.rtt)
+
+    def series(self, target, start, end, quantiles=(), max_points=MAX_GRAPH_POINTS):
+        """Rollup buckets for target over [start, end) from the tier that fits the span, or None"""
+        rollups = self._get(target)
+        if rollups is None:
+            return None
+        with self._lock:
+            tier = rollups.tier_for(end - start, max_points)
+            data = tier.series(start, end, quantiles)
+        data["width"] = tier.width
+        return data
+
+    def heatmap(self, target, start, end, edges, max_columns=MAX_GRAPH_POINTS):
+        """heatmap() of target over [start, end) at the finest tier fitting max_columns, or None.
+
+        There is one column per bucket of that tier, at most max_columns.
+        """
+        rollups = self._get(target)
+        if rollups is None:
+            return None
+        with self._lock:
+            tier = rollups.tier_for(end - start, max_columns)
+            columns = max(1, min(max_columns, int(np.ceil((end - start) / tier.width))))
+            return tier.heatmap(start, end, columns, edges)
+
+    def summary(self, targets, seconds=60, now=None):
+        """LatencyStats for the last `seconds`, merged over one target or a list of them"""
+        if not isinstance(targets, (list, tuple)):
+            targets = [targets]
+        end = time.time() if now is None else now
+        with self._lock:
+            return LatencyStats.merged(
+                self._get(target).tier_for(seconds).summary(end - seconds, end)
+                for target in targets if self._get(target) is not None
+            )
+
+    def jitter(self, target):
+        """Running RFC 3550 jitter estimate of target in ms, or None if it is not tracked"""
+        rollups = self._get(target)
+        return rollups.jitter.jitter if rollups is not None else None
+
+    def backfill(self, store, end=None):
+        """Rebuild the tiers of tracked targets from a SampleStore, so long ranges survive restarts.
+
+        Each key is rebuilt once, however often this is called. The store is
+        read chunk by chunk, so memory stays bounded, and the lock is only
+        held per chunk, so update() can run alongside; end should be when
+        live updates began, so no probe is counted twice.
+        """
+        end = time.time() if end is None else end
+        longest = max(width * capacity for width, capacity in self._tiers)
+        entries = {entry["key"]: entry["id"] for entry in store.targets().values()}
+        with self._lock:
+            keys = [key for key in self._rollups if key not in self._backfilled]
+            self._backfilled.update(keys)
+        ids = {entries[key]: self._rollups[key] for key in keys if key in entries}
+        if not ids:
+            return
+        previous = dict.fromkeys(ids)
+        recent = {target_id: np.empty(0) for target_id in ids}  # Newest answered RTTs, to warm the jitter up
+        skipped = [STATUS_INDEX[STATUS_LATE], STATUS_INDEX[STATUS_DUPLICATE]]
+        for records in store.query(end - longest, end, list(ids)):
+            # Late and duplicate replies are in the store too but must not be counted twice
+            records = records[~np.isin(records["status"], skipped)]
+            with self._lock:
+                for target_id in np.unique(records["target"]):
+                    mine = records[records["target"] == target_id]
+                    previous[target_id] = ids[target_id].add_many(mine["timestamp"], mine["rtt"], previous[target_id])
+                    answered = mine["rtt"][~np.isnan(mine["rtt"])]
+                    recent[target_id] = np.concatenate((recent[target_id], answered))[-JITTER_WARMUP:]
+        with self._lock:
+            for target_id, rollups in ids.items():
+                rollups.warm_jitter(recent[target_id])
@@ -0,0 +1,262 @@
+"""Append-only on-disk history of every probe result, in fixed-size binary records.
+
+A store is a directory of segment files named after the wall-clock
+millisecond they were started, plus targets.json mapping the target ids
+used in records to hosts and names. Each segment is a 16-byte header
+followed by packed RECORD_DTYPE records. The writer only ever appends,
+and it starts a new segment on startup, when a segment reaches its size
+or age limit, and never touches old ones, so a crash can at worst leave a
+partial record at the end of the newest file. Readers memory-map segments
+and filter them with NumPy instead of loading history into RAM.
+"""
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from probe_engine import ResultQueue, STATUS_OK, STATUS_TIMEOUT, STATUS_ERROR, STATUS_LATE, STATUS_DUPLICATE
+
+MAGIC = b"GPINGSEG"
+VERSION = 1
+SEGMENT_HEADER = struct.Struct("<8sHHI")  # magic, version, record size, reserved
+SEGMENT_SUFFIX = ".seg"
+TARGETS_FILE = "targets.json"
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),  # Wall-clock send time
+    ("rtt", "<f4"),        # Milliseconds, NaN when the probe got no answer
+    ("target", "<u2"),     # Id from targets.json
+    ("status", "u1"),      # Index into STATUSES
+    ("code", "u1")         # Protocol response code, NO_CODE when there is none
+])
+STATUSES = [STATUS_OK, STATUS_TIMEOUT, STATUS_ERROR, STATUS_LATE, STATUS_DUPLICATE]
+STATUS_INDEX = {status: index for index, status in enumerate(STATUSES)}
+NO_CODE = 255
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024  # About a million records
+DEFAULT_SEGMENT_AGE = 3600.0              # Seconds before a new segment is started anyway
+DEFAULT_RETENTION_DAYS = 90
+SEGMENT_SLACK = 120.0  # Results are written when they finish, so a segment can hold sends from before it started
+QUERY_CHUNK_RECORDS = 65536  # Records filtered and copied at a time by SampleStore.query(), about 1 MB
+
+
+def target_key(target):
+    return f"{target.kind}:{target.name}"
+
+
+class SampleWriter(threading.Thread):
+    """Background thread appending probe results to the store in batches.
+
+    add() is an engine subscriber: it only queues the result, so a slow disk
+    never delays probing. Results are written every flush_interval seconds.
+    """
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES, segment_age=DEFAULT_SEGMENT_AGE,
+                 retention_days=DEFAULT_RETENTION_DAYS, flush_interval=1.0):
+        super().__init__(name="sample-writer", daemon=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_age = segment_age
+        self.retention = retention_days * 86400 if retention_days else None
+        self.flush_interval = flush_interval
+        self._queue = ResultQueue()
+        self._stop_requested = threading.Event()
+        self._target_ids = {}   # target_key() -> id
+        self._targets = []      # targets.json entries, index == id
+        self._file = None
+        self._file_started = 0.0
+
+    @property
+    def dropped(self):
+        """Results discarded because the writer fell too far behind"""
+        return self._queue.dropped
+
+    def add(self, result):
+        """Queue a ProbeResult for writing (thread-safe, never blocks)"""
+        self._queue.put(result)
+
+    def close(self):
+        """Write everything queued so far and stop the thread"""
+        self._stop_requested.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_targets()
+        self._prune()
+        try:
+            while not self._stop_requested.wait(self.flush_interval):
+                self._write_batch()
+            self._write_batch()
+        finally:
+            self._close_segment()
+
+    def _write_batch(self):
+        results = self._queue.drain()
+        if not results:
+            return
+        records = np.empty(len(results), dtype=RECORD_DTYPE)
+        records["timestamp"] = [result.timestamp for result in results]
+        records["rtt"] = [np.nan if result.rtt is None else result.rtt for result in results]
+        records["target"] = [self._target_id(result.target) for result in results]
+        records["status"] = [STATUS_INDEX.get(result.status, STATUS_INDEX[STATUS_ERROR]) for result in results]
+        records["code"] = [NO_CODE if result.code is None else result.code & 0xFF for result in results]
+        try:
+            if self._file is None or self._file.tell() >= self.segment_bytes \
+                    or time.time() - self._file_started >= self.segment_age:
+                self._rotate()
+            self._file.write(records.tobytes())
+            self._file.flush()
+        except OSError as e:
+            print(f"Error writing probe history: {e}")
+            self._close_segment()
+
+    def _rotate(self):
+        self._close_segment()
+        started = time.time()
+        path = os.path.join(self.directory, f"{int(started * 1000):013d}{SEGMENT_SUFFIX}")
+        while os.path.exists(path):
+            started += 0.001
+            path = os.path.join(self.directory, f"{int(started * 1000):013d}{SEGMENT_SUFFIX}")
+        self._file = open(path, "xb")
+        self._file.write(SEGMENT_HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, 0))
+        self._file_started = started
+        self._prune()
+
+    def _close_segment(self):
+        if self._file is not None:
+            try:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+            except OSError as e:
+                print(f"Error closing probe history segment: {e}")
+            self._file = None
+
+    def _prune(self):
+        """Delete segments whose newest record is older than the retention period"""
+        if not self.retention:
+            return
+        cutoff = time.time() - self.retention
+        for _, path in list_segments(self.directory)[:-1]:
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError as e:
+                print(f"Error removing old probe history {path}: {e}")
+
+    def _load_targets(self):
+        self._targets = load_targets(self.directory)
+        self._target_ids = {entry["key"]: entry["id"] for entry in self._targets}
+
+    def _target_id(self, target):
+        key = target_key(target)
+        target_id = self._target_ids.get(key)
+        if target_id is None:
+            target_id = len(self._targets)
+            self._targets.append({"id": target_id, "key": key, "name": target.name, "host": target.host,
+                                  "kind": target.kind, "ttl": target.ttl})
+            self._target_ids[key] = target_id
+            path = os.path.join(self.directory, TARGETS_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump(self._targets, f, indent=4)
+            os.replace(path + ".tmp", path)
+        return target_id
+
+
+def list_segments(directory):
+    """(start time, path) of every segment in the store, oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    segments = []
+    for name in names:
+        if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit():
+            segments.append((int(name[:-len(SEGMENT_SUFFIX)]) / 1000.0, os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def load_targets(directory):
+    """targets.json entries of a store; the list index is the target id"""
+    try:
+        with open(os.path.join(directory, TARGETS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def map_segment(path):
+    """Memory-map the complete records of a segment, or return None if it has none"""
+    with open(path, "rb") as f:
+        header = f.read(SEGMENT_HEADER.size)
+    if len(header) < SEGMENT_HEADER.size:
+        return None
+    magic, version, record_size, _ = SEGMENT_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        print(f"Skipping unrecognised probe history segment {path}")
+        return None
+    count = (os.path.getsize(path) - SEGMENT_HEADER.size) // RECORD_DTYPE.itemsize
+    if count <= 0:
+        return None
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=SEGMENT_HEADER.size, shape=(count,))
+
+
+class SampleStore:
+    """Read access to a store written by SampleWriter, possibly while it is still being written"""
+    def __init__(self, directory):
+        self.directory = directory
+
+    def targets(self):
+        """Target id -> targets.json entry"""
+        return {entry["id"]: entry for entry in load_targets(self.directory)}
+
+    def target_ids(self, name):
+        """Ids of every target recorded under this name, host or target_key()"""
+        return [entry["id"] for entry in load_targets(self.directory)
+                if name in (entry["name"], entry["host"], entry["key"])]
+
+    def scan(self, start=None, end=None):
+        """Yield memory-mapped record arrays of the segments that may hold [start, end)"""
+        segments = list_segments(self.directory)
+        for index, (segment_start, path) in enumerate(segments):
+            if end is not None and segment_start - SEGMENT_SLACK >= end:
+                break
+            next_start = segments[index + 1][0] if index + 1 < len(segments) else None
+            if start is not None and next_start is not None and next_start < start:
+                continue
+            records = map_segment(path)
+            if records is not None:
+                yield records
+
+    def query(self, start=None, end=None, targets=None, chunk_records=QUERY_CHUNK_RECORDS):
+        """Yield records with start <= timestamp < end, optionally only for some target ids, in arrays.
+
+        Segments are filtered chunk_records at a time, so memory use stays
+        bounded however much history matches. Records come in the order they
+        were written, which is only roughly time order.
+        """
+        if targets is not None:
+            targets = np.fromiter(targets, dtype=RECORD_DTYPE["target"])
+        for records in self.scan(start, end):
+            for offset in range(0, len(records), chunk_records):
+                chunk = records[offset:offset + chunk_records]
+                mask = np.ones(len(chunk), dtype=bool)
+                if start is not None:
+                    mask &= chunk["timestamp"] >= start
+                if end is not None:
+                    mask &= chunk["timestamp"] < end
+                if targets is not None:
+                    mask &= np.isin(chunk["target"], targets)
+                if mask.any():
+                    yield np.array(chunk[mask])
+
+    def read(self, start=None, end=None, targets=None):
+        """Records with start <= timestamp < end, optionally only for some target ids, as one array"""
+        chunks = list(self.query(start, end, targets))
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(chunks)
@@ -0,0 +1,253 @@
+"""Optional SQLite history backend for probe and speed-test results.
+
+Everything lives in one WAL-mode database, DB_FILE inside the history
+directory. Probe rows are indexed by (target, ts), so range queries for a
+target read only the rows they return. SqliteStore has the same read
+interface as SampleStore, so rollup backfill and history export work
+with either backend.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from probe_engine import ResultQueue, STATUS_ERROR
+from sample_store import (
+    SampleStore, SampleWriter, target_key, RECORD_DTYPE, STATUS_INDEX, NO_CODE, DEFAULT_RETENTION_DAYS,
+    QUERY_CHUNK_RECORDS
+)
+
+DB_FILE = "history.db"
+BACKENDS = ("segments", "sqlite")
+PRUNE_INTERVAL = 3600.0  # Seconds between deletions of rows past the retention period
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT,
+    host TEXT,
+    kind TEXT,
+    ttl INTEGER
+);
+CREATE TABLE IF NOT EXISTS probes (
+    target INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    rtt REAL,
+    status INTEGER NOT NULL,
+    code INTEGER
+);
+CREATE INDEX IF NOT EXISTS probes_target_ts ON probes (target, ts);
+CREATE TABLE IF NOT EXISTS speed_tests (
+    ts REAL NOT NULL,
+    download_mbps REAL,
+    upload_mbps REAL
+);
+CREATE INDEX IF NOT EXISTS speed_tests_ts ON speed_tests (ts);
+"""
+
+
+def connect(path):
+    """Open the history database in WAL mode, creating the schema if needed"""
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # With WAL, commits are durable against crashes without an fsync each
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def insert_probe_rows(conn, rows):
+    """Insert (target, ts, rtt, status, code) rows in one transaction"""
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO probes (target, ts, rtt, status, code) VALUES (?, ?, ?, ?, ?)", rows)
+
+
+class SpeedTestResult:
+    """Finished speed test queued for the history writer"""
+    __slots__ = ("timestamp", "download_mbps", "upload_mbps")
+
+    def __init__(self, download_mbps, upload_mbps, timestamp=None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.download_mbps = download_mbps
+        self.upload_mbps = upload_mbps
+
+
+class SqliteWriter(threading.Thread):
+    """Background thread inserting probe and speed-test results into the database in batches.
+
+    add() is an engine subscriber that only queues the result; every
+    flush_interval seconds the queued rows are committed in one
+    transaction, so the probe thread never waits on the disk.
+    """
+    def __init__(self, directory, retention_days=DEFAULT_RETENTION_DAYS, flush_interval=1.0):
+        super().__init__(name="sqlite-writer", daemon=True)
+        self.directory = directory
+        self.retention = retention_days * 86400 if retention_days else None
+        self.flush_interval = flush_interval
+        self._queue = ResultQueue()
+        self._stop_requested = threading.Event()
+        self._target_ids = {}  # target_key() -> id
+        self._conn = None
+        self._pruned_at = 0.0
+
+    @property
+    def dropped(self):
+        """Results discarded because the writer fell too far behind"""
+        return self._queue.dropped
+
+    def add(self, result):
+        """Queue a ProbeResult for writing (thread-safe, never blocks)"""
+        self._queue.put(result)
+
+    def add_speed_test(self, download_mbps, upload_mbps, timestamp=None):
+        """Queue a finished speed test for writing"""
+        self._queue.put(SpeedTestResult(download_mbps, upload_mbps, timestamp))
+
+    def close(self):
+        """Write everything queued so far and stop the thread"""
+        self._stop_requested.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = connect(os.path.join(self.directory, DB_FILE))
+            self._target_ids = {key: target_id for target_id, key in self._conn.execute("SELECT id, key FROM targets")}
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error opening probe history database: {e}")
+            return
+        try:
+            while not self._stop_requested.wait(self.flush_interval):
+                self._write_batch()
+                self._prune()
+            self._write_batch()
+        finally:
+            self._conn.close()
+
+    def _write_batch(self):
+        items = self._queue.drain()
+        if not items:
+            return
+        tests = [item for item in items if isinstance(item, SpeedTestResult)]
+        try:
+            rows = [(self._target_id(result.target), result.timestamp, result.rtt,
+                     STATUS_INDEX.get(result.status, STATUS_INDEX[STATUS_ERROR]), result.code)
+                    for result in items if not isinstance(result, SpeedTestResult)]
+            insert_probe_rows(self._conn, rows)
+            if tests:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany("INSERT INTO speed_tests (ts, download_mbps, upload_mbps) VALUES (?, ?, ?)",
+                                           [(test.timestamp, test.download_mbps, test.upload_mbps) for test in tests])
+        except sqlite3.Error as e:
+            print(f"Error writing probe history: {e}")
+
+    def _prune(self):
+        """Delete rows older than the retention period, at most once per PRUNE_INTERVAL"""
+        now = time.time()
+        if not self.retention or now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        cutoff = now - self.retention
+        try:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM probes WHERE target IN (SELECT id FROM targets) AND ts < ?", (cutoff,))
+                self._conn.execute("DELETE FROM speed_tests WHERE ts < ?", (cutoff,))
+        except sqlite3.Error as e:
+            print(f"Error removing old probe history: {e}")
+
+    def _target_id(self, target):
+        key = target_key(target)
+        target_id = self._target_ids.get(key)
+        if target_id is None:
+            cursor = self._conn.execute("INSERT INTO targets (key, name, host, kind, ttl) VALUES (?, ?, ?, ?, ?)",
+                                        (key, target.name, target.host, target.kind, target.ttl))
+            target_id = self._target_ids[key] = cursor.lastrowid
+        return target_id
+
+
+class SqliteStore:
+    """Read access to a history database, possibly while SqliteWriter is still writing it"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, DB_FILE)
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def targets(self):
+        """Target id -> entry with the same fields as a SampleStore targets.json entry"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, key, name, host, kind, ttl FROM targets").fetchall()
+        finally:
+            conn.close()
+        return {row[0]: dict(zip(("id", "key", "name", "host", "kind", "ttl"), row)) for row in rows}
+
+    def target_ids(self, name):
+        """Ids of every target recorded under this name, host or target_key()"""
+        return [target_id for target_id, entry in self.targets().items()
+                if name in (entry["name"], entry["host"], entry["key"])]
+
+    def query(self, start=None, end=None, targets=None, chunk_records=QUERY_CHUNK_RECORDS):
+        """Yield RECORD_DTYPE arrays of probes with start <= ts < end, target by target in time order"""
+        targets = list(self.targets()) if targets is None else [int(target_id) for target_id in targets]
+        if not targets:
+            return
+        # Always naming the targets lets SQLite answer from the (target, ts) index
+        sql = (f"SELECT ts, rtt, target, status, IFNULL(code, {NO_CODE}) FROM probes "
+               f"WHERE target IN ({','.join('?' * len(targets))}) AND ts >= ? AND ts < ? ORDER BY target, ts")
+        params = targets + [-np.inf if start is None else start, np.inf if end is None else end]
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_records)
+                if not rows:
+                    break
+                records = np.empty(len(rows), dtype=RECORD_DTYPE)
+                for name, column in zip(RECORD_DTYPE.names, zip(*rows)):
+                    records[name] = np.array(column, dtype=np.float64 if name == "rtt" else RECORD_DTYPE[name])
+                yield records
+        finally:
+            conn.close()
+
+    def read(self, start=None, end=None, targets=None):
+        """Probes with start <= ts < end, optionally only for some target ids, as one array"""
+        chunks = list(self.query(start, end, targets))
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(chunks)
+
+    def speed_tests(self, start=None, end=None):
+        """(timestamp, download Mbps, upload Mbps) of the speed tests in [start, end), oldest first"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT ts, download_mbps, upload_mbps FROM speed_tests WHERE ts >= ? AND ts < ? "
+                                "ORDER BY ts", (-np.inf if start is None else start,
+                                                np.inf if end is None else end)).fetchall()
+        finally:
+            conn.close()
+
+
+def create_history_writer(directory, backend="segments", retention_days=DEFAULT_RETENTION_DAYS):
+    """Unstarted writer for the configured history backend"""
+    if backend == "sqlite":
+        return SqliteWriter(directory, retention_days=retention_days)
+    if backend != "segments":
+        print(f"Unknown history backend {backend}, using segments")
+    return SampleWriter(directory, retention_days=retention_days)
+
+
+def open_history(directory, backend=None):
+    """Reader for a history directory; without a backend, SqliteStore if it holds a database"""
+    if backend is None:
+        backend = "sqlite" if os.path.exists(os.path.join(directory, DB_FILE)) else "segments"
+    return SqliteStore(directory) if backend == "sqlite" else SampleStore(directory)
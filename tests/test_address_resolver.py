@@ -0,0 +1,110 @@
+"""AddressResolver and the engine's handling of targets whose address is still being looked up"""
+import socket
+import threading
+import time
+import unittest
+
+from probe_engine import ProbeEngine, ProbeBackend, ProbeTarget, AddressResolver, STATUS_OK, STATUS_ERROR
+
+
+class EchoBackend(ProbeBackend):
+    """Answers every probe 1 ms after it is sent, once the target's address is known"""
+    kind = "echo"
+
+    def __init__(self, delay=0.0, fail=False):
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+        self.lookups = []
+
+    def attach(self, engine):
+        super().attach(engine)
+        self._resolver = AddressResolver(engine, self._lookup)
+
+    def _lookup(self, host, flags):
+        if flags & socket.AI_NUMERICHOST:
+            return socket.getaddrinfo(host, None, type=socket.SOCK_DGRAM, flags=flags)[0][::4]
+        self.lookups.append(host)
+        time.sleep(self.delay)
+        if self.fail:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return socket.AF_INET, ("192.0.2.1", 0)
+
+    def add_target(self, target):
+        self._resolver.resolve(target)
+
+    def ready(self, target):
+        return self._resolver.ready(target)
+
+    def send(self, target, seq):
+        self._resolver.address(target)
+        self.engine.call_later(0.001, self.engine.reply, target, seq)
+
+    def close(self):
+        self._resolver.close()
+
+
+def run_engine(backend, targets, seconds):
+    engine = ProbeEngine()
+    engine.register_backend(backend)
+    results = []
+    engine.subscribe(results.append)
+    for target in targets:
+        engine.add_target(target)
+    thread = threading.Thread(target=engine.run)
+    thread.start()
+    time.sleep(seconds)
+    engine.stop()
+    thread.join()
+    return engine, results
+
+
+class AddressResolverTest(unittest.TestCase):
+    def test_slow_lookup_skips_instead_of_failing(self):
+        backend = EchoBackend(delay=0.3)
+        target = ProbeTarget("slow.example", 0.05, 1, kind="echo")
+        engine, results = run_engine(backend, [target], 0.8)
+        statuses = [result.status for result in results]
+        self.assertNotIn(STATUS_ERROR, statuses)
+        self.assertGreater(statuses.count(STATUS_OK), 5)
+        self.assertGreater(engine.stats(target)["skipped"], 0)
+        self.assertEqual(backend.lookups, ["slow.example"])
+
+    def test_literal_address_needs_no_lookup(self):
+        backend = EchoBackend(delay=0.3)
+        target = ProbeTarget("127.0.0.1", 0.05, 1, kind="echo")
+        engine, results = run_engine(backend, [target], 0.3)
+        self.assertEqual(results[0].status, STATUS_OK)
+        self.assertEqual(engine.stats(target)["skipped"], 0)
+        self.assertEqual(backend.lookups, [])
+
+    def test_failed_lookup_reports_errors_and_backs_off(self):
+        backend = EchoBackend(delay=0.05, fail=True)
+        target = ProbeTarget("bad.invalid", 0.05, 1, kind="echo")
+        _, results = run_engine(backend, [target], 1.5)
+        self.assertTrue(results)
+        self.assertTrue(all(result.status == STATUS_ERROR for result in results))
+        self.assertEqual(len(backend.lookups), 2)  # Right away and once after RESOLVE_RETRY_MIN
+
+    def test_targets_sharing_a_host_share_one_lookup(self):
+        backend = EchoBackend(delay=0.2)
+        hops = [ProbeTarget("path.example", 0.05, 1, f"hop {ttl}", kind="echo") for ttl in range(1, 31)]
+        engine, results = run_engine(backend, hops, 0.6)
+        self.assertEqual(backend.lookups, ["path.example"])
+        self.assertNotIn(STATUS_ERROR, [result.status for result in results])
+        self.assertTrue(all(any(result.target is hop for result in results) for hop in hops))
+
+    def test_forgetting_one_target_keeps_the_host_for_the_others(self):
+        backend = EchoBackend()
+        backend.attach(ProbeEngine())
+        first, second = ProbeTarget("127.0.0.1", kind="echo"), ProbeTarget("127.0.0.1", kind="echo")
+        backend.add_target(first)
+        backend.add_target(second)
+        backend._resolver.forget(first)
+        self.assertTrue(backend.ready(second))
+        backend._resolver.forget(second)
+        self.assertNotIn("127.0.0.1", backend._resolver._addresses)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""DnsProbeBackend against a local UDP responder, with a slow lookup of the server's name"""
+import socket
+import threading
+import time
+import unittest
+
+from dns_probe import DnsProbeBackend, HEADER
+from probe_engine import ProbeEngine, ProbeTarget, STATUS_OK, STATUS_ERROR
+
+
+class Responder:
+    """Answers every query with NOERROR and an empty answer section"""
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                packet, address = self.sock.recvfrom(512)
+            except OSError:
+                return
+            query_id = HEADER.unpack_from(packet)[0]
+            self.sock.sendto(HEADER.pack(query_id, 0x8180, 1, 0, 0, 0) + packet[HEADER.size:], address)
+
+    def close(self):
+        self.sock.close()
+
+
+class SlowLookupBackend(DnsProbeBackend):
+    """Resolves the name "dns.test" to the responder after a delay"""
+    def __init__(self, port, delay):
+        super().__init__()
+        self.port = port
+        self.delay = delay
+
+    def _lookup(self, host, flags):
+        if host.startswith("dns.test"):
+            if flags & socket.AI_NUMERICHOST:
+                raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+            time.sleep(self.delay)
+            return socket.AF_INET, ("127.0.0.1", self.port)
+        return DnsProbeBackend._lookup(host, flags)
+
+
+class DnsProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.responder = Responder()
+        self.addCleanup(self.responder.close)
+
+    def run_engine(self, backend, target, seconds):
+        engine = ProbeEngine()
+        engine.register_backend(backend)
+        results = []
+        engine.subscribe(results.append)
+        engine.add_target(target)
+        thread = threading.Thread(target=engine.run)
+        thread.start()
+        time.sleep(seconds)
+        engine.stop()
+        thread.join()
+        return engine, results
+
+    def test_slow_lookup_does_not_fail_first_queries(self):
+        target = ProbeTarget("dns.test", 0.05, 1, kind="dns", queries=["example.com"])
+        engine, results = self.run_engine(SlowLookupBackend(self.responder.port, 0.3), target, 0.8)
+        statuses = [result.status for result in results]
+        self.assertNotIn(STATUS_ERROR, statuses)
+        self.assertGreater(statuses.count(STATUS_OK), 5)
+        self.assertGreater(engine.stats(target)["skipped"], 0)
+
+    def test_literal_server_answers_first_query(self):
+        target = ProbeTarget(f"127.0.0.1:{self.responder.port}", 0.05, 1, kind="dns", queries=["example.com"])
+        engine, results = self.run_engine(DnsProbeBackend(), target, 0.3)
+        self.assertEqual(results[0].status, STATUS_OK)
+        self.assertEqual(engine.stats(target)["skipped"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
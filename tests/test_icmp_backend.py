@@ -0,0 +1,109 @@
+"""IcmpSocketBackend wire sequence allocation, with an in-memory socket in place of a real one"""
+import socket
+import unittest
+
+from icmp_backend import IcmpSocketBackend, HEADER, ICMP_ECHO_REPLY
+
+
+class FakeSocket:
+    """Records sent packets and hands back queued replies"""
+    def __init__(self):
+        self.sent = []
+        self.replies = []
+
+    def sendto(self, packet, address):
+        self.sent.append((packet, address))
+
+    def recvfrom(self, size):
+        if not self.replies:
+            raise BlockingIOError
+        return self.replies.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeIcmpSocket:
+    def __init__(self, family):
+        self.sock = FakeSocket()
+        self.family = family
+        self.raw = False
+        self.reply_type = ICMP_ECHO_REPLY
+        self.identifier = 4242
+
+    def close(self):
+        pass
+
+
+class FakeEngine:
+    def __init__(self):
+        self.replies = []
+
+    def register_fd(self, fileobj, callback):
+        pass
+
+    def unregister_fd(self, fileobj):
+        pass
+
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+    def reply(self, target, seq, received_at=None):
+        self.replies.append((target, seq))
+
+
+class FakeBackend(IcmpSocketBackend):
+    def _new_socket(self, family):
+        return FakeIcmpSocket(family)
+
+
+class Target:
+    def __init__(self, host):
+        self.host = host
+
+
+class WireSequenceTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = FakeEngine()
+        self.backend = FakeBackend()
+        self.backend.attach(self.engine)
+        self.icmp_sock = self.backend._sockets[socket.AF_INET]
+
+    def target(self, host):
+        target = Target(host)
+        self.backend.add_target(target)
+        return target
+
+    def last_wire_seq(self):
+        return HEADER.unpack_from(self.icmp_sock.sock.sent[-1][0])[4]
+
+    def answer(self, host, wire_seq):
+        self.icmp_sock.sock.replies.append((HEADER.pack(ICMP_ECHO_REPLY, 0, 0, 4242, wire_seq), (host, 0)))
+        self.backend._read(self.icmp_sock)
+
+    def test_wraparound_skips_live_sequence_numbers(self):
+        old, new = self.target("192.0.2.1"), self.target("192.0.2.1")
+        self.backend._wire_seq = 0xFFFF
+        self.backend.send(old, 7)
+        self.assertEqual(self.last_wire_seq(), 0xFFFF)
+        self.backend._wire_seq = 0xFFFF  # The counter comes round while old may still get a late reply
+        self.backend.send(new, 1)
+        self.assertEqual(self.last_wire_seq(), 0)
+        self.backend.cancel(old, 7)
+        self.answer("192.0.2.1", 0)
+        self.assertEqual(self.engine.replies, [(new, 1)])
+
+    def test_exhausted_sequence_space_refuses_the_probe(self):
+        target = self.target("192.0.2.1")
+        for seq in range(0x10000):
+            self.backend.send(target, seq)
+        other = self.target("192.0.2.2")
+        with self.assertRaises(OSError):
+            self.backend.send(other, 0)
+        self.backend.cancel(target, 5)
+        self.backend.send(other, 0)
+        self.assertEqual(self.last_wire_seq(), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()